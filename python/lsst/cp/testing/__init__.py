@@ -19,6 +19,42 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import importlib
+
 from .version import *  # Generated by sconsUtils
-from .isr import *
-from .cp import *
+from .instrumentation import *
+
+# The task modules pull in ip_isr and cp_pipe, which are slow to import.
+# Their contents are loaded on first access, so that loading a single task
+# (as pipetask does for each label) does not import the others.
+_LAZY_MODULES = {
+    "isr": ["CptCrosstalkTask", "CptIsrTask", "CptIsrTaskConfig", "CptOverscanTask", "CptOverscanTaskConfig",
+            "makeExposureSelectionQuery"],
+    "fusedIsr": ["CptFusedIsrTask", "CptFusedIsrTaskConfig", "CptIsrBranchConfig"],
+    "batchedIsr": ["CptBatchedIsrTask", "CptBatchedIsrTaskConfig"],
+    "covariance": ["computeCovariancesFft"],
+    "linearity": ["evaluateAkimaBatched", "fitLinesBatched", "fitSplinesBatched"],
+    "kernel": ["solvePoisson"],
+    "cp": ["CptExtractPtcTask", "CptExtractPtcTaskConfig", "CptSolvePtcTask", "CptSolvePtcTaskConfig",
+           "CptBrighterFatterKernelSolveTask", "CptBrighterFatterKernelSolveConfig",
+           "CptLinearitySolveTask", "CptLinearitySolveConfig",
+           "CptPhotodiodeCorrectionTask", "CptPhotodiodeCorrectionConfig"],
+    "combine": ["CptCalibCombineTask", "CptCalibCombineConfig",
+                "CptCalibCombineByFilterTask", "CptCalibCombineByFilterConfig"],
+    "defects": ["CptMergeDefectsCombinedTask", "CptMergeDefectsCombinedConfig",
+                "boxesToRuns", "mergeRuns", "runsToBoxes"],
+    "summary": ["CptExposureSummaryTask", "CptExposureSummaryConfig"],
+}
+_LAZY_ATTRIBUTES = {name: module for module, names in _LAZY_MODULES.items() for name in names}
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
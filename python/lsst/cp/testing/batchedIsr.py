@@ -0,0 +1,210 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["CptBatchedIsrTask", "CptBatchedIsrTaskConfig"]
+
+import dataclasses
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import lsst.pex.config as pexConfig
+import lsst.pipe.base as pipeBase
+
+from .isr import CptIsrTask, CptIsrTaskConfig, CptIsrTaskConnections
+
+
+def _refDetector(ref):
+    """Return the detector of a dataset reference, or None if the dataset
+    does not have a detector dimension.
+    """
+    if "detector" in ref.dataId.dimensions.names:
+        return ref.dataId["detector"]
+    return None
+
+
+class CptBatchedIsrTaskConnections(CptIsrTaskConnections,
+                                   dimensions=("instrument", "exposure")):
+    def __init__(self, *, config=None):
+        super().__init__(config=config)
+
+        # Each per-detector connection of the parent task becomes a
+        # multiple connection, covering every detector of the exposure.
+        self.batchedConnections = set()
+        for name in self.inputs | self.outputs:
+            connection = getattr(self, name)
+            if "detector" in connection.dimensions and not connection.multiple:
+                setattr(self, name, dataclasses.replace(connection, multiple=True))
+                self.batchedConnections.add(name)
+
+
+class CptBatchedIsrTaskConfig(CptIsrTaskConfig,
+                              pipelineConnections=CptBatchedIsrTaskConnections):
+    """Configuration for ISR processing all detectors of an exposure.
+    """
+
+    numThreads = pexConfig.RangeField(
+        dtype=int,
+        doc="Number of detectors to process concurrently.",
+        default=1,
+        min=1,
+    )
+
+
+class _SharedInputQuantumContext:
+    """Wrapper around a quantum context that reads datasets without a
+    detector dimension only once.
+
+    Parameters
+    ----------
+    butlerQC : `lsst.pipe.base.QuantumContext`
+        Quantum context to wrap.
+    """
+
+    def __init__(self, butlerQC):
+        self._butlerQC = butlerQC
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._butlerQC, name)
+
+    def get(self, dataset):
+        if isinstance(dataset, pipeBase.InputQuantizedConnection):
+            result = {}
+            for name, refs in dataset:
+                if refs is not None:
+                    result[name] = self.get(refs)
+            return result
+        if isinstance(dataset, list) or _refDetector(dataset) is not None:
+            return self._butlerQC.get(dataset)
+        with self._lock:
+            if dataset.id not in self._cache:
+                self._cache[dataset.id] = self._butlerQC.get(dataset)
+            return self._cache[dataset.id]
+
+
+class CptBatchedIsrTask(CptIsrTask):
+    """ISR processing all detectors of an exposure in one quantum.
+
+    Each detector is processed as it would be by `CptIsrTask`, but the
+    task startup is paid once per exposure, and the instrument-level
+    inputs (the camera, ``bfKernel``, and the optics and atmosphere
+    transmission curves) are read once and shared between detectors.
+    """
+
+    ConfigClass = CptBatchedIsrTaskConfig
+    _DefaultName = "cptBatchedIsrTask"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # The parent task only keeps weak references to its subtasks.
+        self._detectorTasks = {}
+
+    def getDetectorTask(self, detector):
+        """Return the task processing one detector.
+
+        Each detector is processed by its own task instance, as IsrTask
+        is not re-entrant.  The per-detector tasks are subtasks of this
+        task, so their metadata is kept separately in the full metadata.
+
+        Parameters
+        ----------
+        detector : `int`
+            Detector to process.
+
+        Returns
+        -------
+        task : `CptIsrTask`
+            Task for the detector, created on first use.
+        """
+        if detector not in self._detectorTasks:
+            self._detectorTasks[detector] = CptIsrTask(config=self.config, name=f"detector{detector}",
+                                                       parentTask=self)
+        return self._detectorTasks[detector]
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        connections = self.config.connections.ConnectionsClass(config=self.config)
+        butlerQC = _SharedInputQuantumContext(butlerQC)
+
+        detectors = sorted(_refDetector(ref) for ref in inputRefs.ccdExposure)
+        detectorRefs = []
+        for detector in detectors:
+            detectorInputRefs = self._selectDetector(inputRefs, pipeBase.InputQuantizedConnection(),
+                                                     detector, connections.batchedConnections)
+            detectorOutputRefs = self._selectDetector(outputRefs, pipeBase.OutputQuantizedConnection(),
+                                                      detector, connections.batchedConnections)
+            if detectorInputRefs is None or detectorOutputRefs is None:
+                self.log.warning("Skipping detector %d, which is missing an input or output.", detector)
+                continue
+            detectorRefs.append((detector, detectorInputRefs, detectorOutputRefs))
+
+        self.log.info("Processing %d detectors with %d threads.", len(detectorRefs), self.config.numThreads)
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.config.numThreads) as executor:
+            futures = {}
+            for detector, detectorInputRefs, detectorOutputRefs in detectorRefs:
+                task = self.getDetectorTask(detector)
+                futures[detector] = executor.submit(task.runQuantum, butlerQC,
+                                                    detectorInputRefs, detectorOutputRefs)
+            for detector, future in futures.items():
+                try:
+                    future.result()
+                except pipeBase.NoWorkFound as e:
+                    self.log.info("No work found for detector %d: %s", detector, e)
+                except Exception as e:
+                    self.log.exception("Processing failed for detector %d.", detector)
+                    failed.append((detector, e))
+
+        # A failed detector does not prevent the others from being
+        # written, unless every detector failed.
+        self.metadata["failedDetectors"] = [detector for detector, _ in failed]
+        if failed and len(failed) == len(futures):
+            raise RuntimeError("Processing failed for every detector.") from failed[0][1]
+
+    @staticmethod
+    def _selectDetector(quantizedRefs, detectorRefs, detector, batchedConnections):
+        """Select the dataset references for a single detector.
+
+        Parameters
+        ----------
+        quantizedRefs : `lsst.pipe.base.QuantizedConnection`
+            References for all detectors.
+        detectorRefs : `lsst.pipe.base.QuantizedConnection`
+            Empty connection to populate.
+        detector : `int`
+            Detector to select.
+        batchedConnections : `set` [`str`]
+            Connections that are single datasets in `CptIsrTask`.
+
+        Returns
+        -------
+        detectorRefs : `lsst.pipe.base.QuantizedConnection` or `None`
+            References for this detector, or `None` if one of the batched
+            connections has no dataset for the detector.
+        """
+        for name, refs in quantizedRefs:
+            if name in batchedConnections:
+                selected = [ref for ref in refs if _refDetector(ref) == detector]
+                if len(selected) != 1:
+                    return None
+                refs = selected[0]
+            setattr(detectorRefs, name, refs)
+        return detectorRefs
@@ -0,0 +1,442 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["makeSyntheticRepo", "runBenchmark", "main"]
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import resource
+import time
+
+import astropy.time
+import numpy as np
+
+import lsst.afw.image as afwImage
+import lsst.geom as geom
+import lsst.utils
+from lsst.daf.butler import Butler, CollectionType, DatasetType, Timespan
+from lsst.pipe.base import Pipeline
+
+from .query import makePipelineExposureQuery
+
+
+SUBSETS = ("summary", "bias", "dark", "flat", "defects", "ptc", "postPtc")
+"""Pipeline subsets to benchmark, in execution order."""
+
+RAW_RUN = "LSSTCam/raw/synthetic"
+"""Run collection holding the synthetic raw exposures."""
+
+CONFIG_OVERRIDES = {
+    "cptExposureSummary": {"doPhotodiode": False},
+    "cptLinearitySolve": {"usePhotodiode": False, "applyPhotodiodeCorrection": False},
+}
+"""Configuration overrides for each label.  The synthetic data have no
+photodiode readings, so the linearity is measured against exposure time.
+"""
+
+
+def _makeSmallCamera(camera, detectors, nAmp=2, ampSize=(64, 64), prescan=4, overscan=16,
+                     parallelOverscan=8, gain=1.0, readNoise=5.0, saturation=100000.0):
+    """Construct a camera in which the selected detectors have a few small
+    amplifiers.
+
+    Parameters
+    ----------
+    camera : `lsst.afw.cameraGeom.Camera`
+        Camera to modify.
+    detectors : `list` [`int`]
+        Detectors to reduce.  Other detectors are left unchanged.
+    nAmp : `int`, optional
+        Number of amplifiers, laid out in a single row.
+    ampSize : `tuple` [`int`, `int`], optional
+        Width and height of the imaging region of each amplifier.
+    prescan : `int`, optional
+        Width of the serial prescan.
+    overscan : `int`, optional
+        Width of the serial overscan.
+    parallelOverscan : `int`, optional
+        Height of the parallel overscan.
+    gain : `float`, optional
+        Gain, in electrons per ADU.
+    readNoise : `float`, optional
+        Read noise, in electrons.
+    saturation : `float`, optional
+        Saturation level, in ADU.
+
+    Returns
+    -------
+    camera : `lsst.afw.cameraGeom.Camera`
+        Modified camera.
+    """
+    width, height = ampSize
+    rawWidth = prescan + width + overscan
+    cameraBuilder = camera.rebuild()
+    for detectorId in detectors:
+        template = camera[detectorId]
+        detectorBuilder = cameraBuilder[detectorId]
+        detectorBuilder.clear()
+        for i, amp in enumerate(list(template)[:nAmp]):
+            x0 = i*rawWidth
+            ampBuilder = amp.rebuild()
+            ampBuilder.setBBox(geom.Box2I(geom.Point2I(i*width, 0), geom.Extent2I(width, height)))
+            ampBuilder.setRawBBox(geom.Box2I(geom.Point2I(x0, 0),
+                                             geom.Extent2I(rawWidth, height + parallelOverscan)))
+            ampBuilder.setRawPrescanBBox(geom.Box2I(geom.Point2I(x0, 0), geom.Extent2I(prescan, height)))
+            ampBuilder.setRawDataBBox(geom.Box2I(geom.Point2I(x0 + prescan, 0), geom.Extent2I(width, height)))
+            ampBuilder.setRawHorizontalOverscanBBox(geom.Box2I(geom.Point2I(x0 + prescan + width, 0),
+                                                               geom.Extent2I(overscan, height)))
+            ampBuilder.setRawVerticalOverscanBBox(geom.Box2I(geom.Point2I(x0 + prescan, height),
+                                                             geom.Extent2I(width, parallelOverscan)))
+            ampBuilder.setRawXYOffset(geom.Extent2I(0, 0))
+            ampBuilder.setRawFlipX(False)
+            ampBuilder.setRawFlipY(False)
+            ampBuilder.setGain(gain)
+            ampBuilder.setReadNoise(readNoise)
+            ampBuilder.setSaturation(saturation)
+            detectorBuilder.append(ampBuilder)
+        detectorBuilder.setBBox(geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(nAmp*width, height)))
+        detectorBuilder.unsetCrosstalk()
+    return cameraBuilder.finish()
+
+
+def _writeCamera(butler, instrument, camera):
+    """Write a camera to the instrument's calibration collection.
+
+    Parameters
+    ----------
+    butler : `lsst.daf.butler.Butler`
+        Writeable butler.
+    instrument : `lsst.pipe.base.Instrument`
+        Instrument the camera belongs to.
+    camera : `lsst.afw.cameraGeom.Camera`
+        Camera to write.
+    """
+    calibCollection = instrument.makeCalibrationCollectionName()
+    run = instrument.makeUnboundedCalibrationRunName()
+    butler.registry.registerCollection(calibCollection, type=CollectionType.CALIBRATION)
+    butler.registry.registerRun(run)
+    datasetType = DatasetType("camera", ("instrument", ), "Camera", isCalibration=True,
+                              universe=butler.dimensions)
+    butler.registry.registerDatasetType(datasetType)
+    ref = butler.put(camera, datasetType, {"instrument": instrument.getName()}, run=run)
+    butler.registry.certify(calibCollection, [ref], Timespan(None, None))
+
+
+def _makeRawImage(detector, rng, signal, biasLevel=1000.0, readNoise=5.0, gain=1.0):
+    """Construct a synthetic untrimmed raw image for one detector.
+
+    Parameters
+    ----------
+    detector : `lsst.afw.cameraGeom.Detector`
+        Detector to simulate.
+    rng : `numpy.random.Generator`
+        Random number generator.
+    signal : `float`
+        Mean signal in the imaging region, in electrons.
+    biasLevel : `float`, optional
+        Bias level, in ADU.
+    readNoise : `float`, optional
+        Read noise, in ADU.
+    gain : `float`, optional
+        Gain, in electrons per ADU.
+
+    Returns
+    -------
+    exposure : `lsst.afw.image.ExposureF`
+        Synthetic raw exposure.
+    """
+    bbox = geom.Box2I()
+    for amp in detector:
+        bbox.include(amp.getRawBBox())
+    exposure = afwImage.ExposureF(bbox)
+    image = exposure.image
+    image.array[:, :] = rng.normal(biasLevel, readNoise, image.array.shape)
+    for amp in detector:
+        dataRegion = image[amp.getRawDataBBox()].array
+        if signal > 0:
+            dataRegion += rng.poisson(signal, dataRegion.shape)/gain
+    exposure.setDetector(detector)
+    return exposure
+
+
+def makeSyntheticRepo(root, detectors=(0, 1), nBias=5, nDark=5, nFlat=5, nPtcPairs=5, nAmp=2, seed=42):
+    """Construct a butler repository with synthetic protocolB data.
+
+    The LSSTCam instrument is used, so the pipeline can be run
+    unmodified, but the selected detectors are reduced to a few small
+    amplifiers, and that camera is written to the repository.
+
+    Parameters
+    ----------
+    root : `str`
+        Directory for the new repository.
+    detectors : `list` [`int`], optional
+        Detectors to simulate.
+    nBias : `int`, optional
+        Number of bias exposures.
+    nDark : `int`, optional
+        Number of dark exposures.
+    nFlat : `int`, optional
+        Number of flat exposures used for the flat calibration.
+    nPtcPairs : `int`, optional
+        Number of flat pairs in the PTC ramp.
+    nAmp : `int`, optional
+        Number of amplifiers of each detector.
+    seed : `int`, optional
+        Seed for the random number generator.
+
+    Returns
+    -------
+    butler : `lsst.daf.butler.Butler`
+        Writeable butler for the new repository.
+    """
+    from lsst.obs.lsst import LsstCam
+
+    Butler.makeRepo(root)
+    butler = Butler(root, writeable=True)
+    instrument = LsstCam()
+    instrument.register(butler.registry)
+    camera = _makeSmallCamera(instrument.getCamera(), detectors, nAmp=nAmp)
+    _writeCamera(butler, instrument, camera)
+
+    rawType = DatasetType("raw", ("instrument", "exposure", "detector"), "Exposure",
+                          universe=butler.dimensions)
+    butler.registry.registerDatasetType(rawType)
+    butler.registry.registerRun(RAW_RUN)
+
+    # Exposure sequence: (observation_type, exposure time, signal).
+    sequence = [("bias", 0.0, 0.0)]*nBias
+    sequence += [("dark", 30.0, 0.0)]*nDark
+    sequence += [("flat", 10.0, 10000.0)]*nFlat
+    for level in np.geomspace(100.0, 50000.0, nPtcPairs):
+        sequence += [("flat", level/1000.0, level)]*2
+
+    physicalFilter = next(iter(butler.registry.queryDimensionRecords(
+        "physical_filter", instrument=instrument.getName()))).name
+    dimensions = butler.dimensions.getStaticElements().names
+    dayObs = 20240101
+    start = astropy.time.Time("2024-01-01T12:00:00", scale="tai")
+    if "day_obs" in dimensions:
+        butler.registry.syncDimensionData(
+            "day_obs", {"instrument": instrument.getName(), "id": dayObs})
+
+    rng = np.random.default_rng(seed)
+    for seqNum, (observationType, exposureTime, signal) in enumerate(sequence, start=1):
+        exposureId = dayObs*100000 + seqNum
+        begin = start + datetime.timedelta(seconds=60*seqNum)
+        end = begin + datetime.timedelta(seconds=exposureTime)
+        group = f"{observationType}-{seqNum}"
+        record = {
+            "instrument": instrument.getName(),
+            "id": exposureId,
+            "obs_id": f"MC_C_{dayObs}_{seqNum:06d}",
+            "physical_filter": physicalFilter,
+            "exposure_time": exposureTime,
+            "dark_time": exposureTime,
+            "observation_type": observationType,
+            "observation_reason": observationType,
+            "day_obs": dayObs,
+            "seq_num": seqNum,
+            "timespan": Timespan(begin, end),
+        }
+        if "group" in dimensions:
+            butler.registry.syncDimensionData(
+                "group", {"instrument": instrument.getName(), "name": group})
+            record["group"] = group
+        else:
+            record["group_name"] = group
+            record["group_id"] = seqNum
+        butler.registry.insertDimensionData("exposure", record)
+
+        for detectorId in detectors:
+            exposure = _makeRawImage(camera[detectorId], rng, signal)
+            butler.put(exposure, "raw", run=RAW_RUN,
+                       instrument=instrument.getName(), exposure=exposureId, detector=detectorId)
+
+    return butler
+
+
+def _quantumStatistics(butler, collection, label):
+    """Read the per-quantum timing and memory of a task.
+
+    Parameters
+    ----------
+    butler : `lsst.daf.butler.Butler`
+        Butler to read the metadata with.
+    collection : `str`
+        Output collection of the run.
+    label : `str`
+        Task label.
+
+    Returns
+    -------
+    statistics : `list` [`dict`]
+        Wall time and CPU time of each quantum, and the peak RSS of the
+        subset's process at the end of the quantum, which includes the
+        quanta run before it.
+    """
+    statistics = []
+    refs = butler.registry.queryDatasets(f"{label}_metadata", collections=collection, findFirst=True)
+    for ref in refs:
+        quantum = butler.get(ref)["quantum"]
+        start = astropy.time.Time(quantum["startUtc"].replace("+00:00", ""), scale="utc")
+        end = astropy.time.Time(quantum["endUtc"].replace("+00:00", ""), scale="utc")
+        statistics.append({
+            "dataId": {key: value for key, value in ref.dataId.required.items()},
+            "wallTime": (end - start).sec,
+            "cpuTime": quantum["endCpuTime"] - quantum["startCpuTime"],
+            "processMaxRss": quantum["endMaxResidentSetSize"],
+        })
+    return statistics
+
+
+def _runSubset(root, inputs, output, pipelineFile, subset, where):
+    """Run a single pipeline subset.
+
+    This is run in a new process for each subset, so that the peak RSS
+    of the process is that of the subset alone.
+
+    Parameters
+    ----------
+    root : `str`
+        Butler repository containing the synthetic data.
+    inputs : `list` [`str`]
+        Input collections.
+    output : `str`
+        Output collection.
+    pipelineFile : `str`
+        Pipeline to run.
+    subset : `str`
+        Pipeline subset to run.
+    where : `str`
+        Data query restricting the instrument and detectors.
+
+    Returns
+    -------
+    result : `dict`
+        Performance of the subset.
+    """
+    from lsst.ctrl.mpexec import SimplePipelineExecutor
+
+    butler = SimplePipelineExecutor.prep_butler(root, inputs=inputs, output=output)
+    pipeline = Pipeline.fromFile(f"{pipelineFile}#{subset}")
+    labels = [task.label for task in pipeline.to_graph().tasks.values()]
+    for label, overrides in CONFIG_OVERRIDES.items():
+        if label in labels:
+            for key, value in overrides.items():
+                pipeline.addConfigOverride(label, key, value)
+
+    subsetWhere = where
+    if exposureQuery := makePipelineExposureQuery(pipeline.to_graph()):
+        subsetWhere = f"{where} AND ({exposureQuery})"
+
+    startGraph = time.perf_counter()
+    executor = SimplePipelineExecutor.from_pipeline(pipeline, where=subsetWhere, butler=butler)
+    graphTime = time.perf_counter() - startGraph
+
+    startRun = time.perf_counter()
+    quanta = executor.run(register_dataset_types=True)
+    runTime = time.perf_counter() - startRun
+
+    return {
+        "graphBuildTime": graphTime,
+        "runTime": runTime,
+        "nQuanta": len(quanta),
+        "maxRss": 1024*resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "quanta": {label: _quantumStatistics(butler, butler.run, label) for label in labels},
+    }
+
+
+def runBenchmark(root, detectors=(0, 1), subsets=SUBSETS, pipelineFile=None):
+    """Run each pipeline subset in turn and record its performance.
+
+    Each subset is run in a new process, so the reported ``maxRss`` is
+    the peak RSS of that subset alone.
+
+    Parameters
+    ----------
+    root : `str`
+        Butler repository containing the synthetic data.
+    detectors : `list` [`int`], optional
+        Detectors to process.
+    subsets : `list` [`str`], optional
+        Pipeline subsets to run, in order.  The outputs of each subset
+        are available to those that follow.
+    pipelineFile : `str`, optional
+        Pipeline to benchmark.  Defaults to the protocolB pipeline.
+
+    Returns
+    -------
+    results : `dict`
+        Benchmark results, keyed by subset.
+    """
+    if pipelineFile is None:
+        pipelineFile = os.path.join(lsst.utils.getPackageDir("cp_testing"), "pipelines", "protocolB.yaml")
+
+    where = f"instrument = 'LSSTCam' AND detector IN ({', '.join(str(d) for d in detectors)})"
+    inputs = [RAW_RUN, "LSSTCam/calib"]
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for subset in subsets:
+        output = f"benchmark/{subset}"
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[subset] = pool.submit(_runSubset, root, inputs, output, pipelineFile, subset,
+                                          where).result()
+        inputs = [output] + inputs
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the protocolB pipeline on synthetic data.",
+    )
+    parser.add_argument("root", help="Directory for the synthetic butler repository.")
+    parser.add_argument("output", help="JSON file to write the results to.")
+    parser.add_argument("--detectors", type=int, nargs="+", default=[0, 1], help="Detectors to simulate.")
+    parser.add_argument("--nBias", type=int, default=5, help="Number of bias exposures.")
+    parser.add_argument("--nDark", type=int, default=5, help="Number of dark exposures.")
+    parser.add_argument("--nFlat", type=int, default=5, help="Number of flat exposures.")
+    parser.add_argument("--nPtcPairs", type=int, default=5, help="Number of PTC flat pairs.")
+    parser.add_argument("--nAmp", type=int, default=2, help="Number of amplifiers of each detector.")
+    parser.add_argument("--subsets", nargs="+", default=list(SUBSETS), help="Pipeline subsets to run.")
+    parser.add_argument("--reuse", action="store_true",
+                        help="Reuse an existing synthetic repository rather than creating one.")
+    args = parser.parse_args()
+
+    startRepo = time.perf_counter()
+    if not args.reuse:
+        makeSyntheticRepo(args.root, detectors=args.detectors, nBias=args.nBias, nDark=args.nDark,
+                          nFlat=args.nFlat, nPtcPairs=args.nPtcPairs, nAmp=args.nAmp)
+    repoTime = time.perf_counter() - startRepo
+
+    results = runBenchmark(args.root, detectors=args.detectors, subsets=args.subsets)
+    summary = {
+        "configuration": vars(args),
+        "repoCreationTime": repoTime,
+        "subsets": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(summary, f, indent=2, default=str)
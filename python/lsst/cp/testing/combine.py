@@ -0,0 +1,135 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["CptCalibCombineTask", "CptCalibCombineConfig",
+           "CptCalibCombineByFilterTask", "CptCalibCombineByFilterConfig",
+           ]
+
+import lsst.cp.pipe as cpPipe
+import lsst.geom as geom
+import lsst.pex.config as pexConfig
+
+from .instrumentation import CptInstrumentationMixin
+
+
+# Image, mask and variance of each input subregion.
+_BYTES_PER_PIXEL = 12
+
+
+class CptCalibCombineConfig(cpPipe.cpCombine.CalibCombineConfig,
+                            pipelineConnections=cpPipe.cpCombine.CalibCombineConnections):
+    maxResidentMb = pexConfig.RangeField(
+        dtype=float,
+        doc="If non-zero, the maximum memory in MB used by the input subregions read at "
+            "once.  The number of rows of each subregion is then chosen from the number of "
+            "inputs, and the height in subregionSize is ignored.",
+        default=0.0,
+        min=0.0,
+    )
+
+
+class _CptCombineMixin:
+    """Mixin choosing the subregion rows of a combine from a memory
+    budget.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._nInputs = None
+
+    def getSubregionRows(self, width, nInputs):
+        """Return the number of rows of each subregion that fit in the
+        memory budget.
+
+        Parameters
+        ----------
+        width : `int`
+            Width of each subregion, in pixels.
+        nInputs : `int`
+            Number of inputs read for each subregion.
+
+        Returns
+        -------
+        rows : `int`
+            Number of rows, at least one.
+        """
+        budget = self.config.maxResidentMb*1024**2
+        return max(1, int(budget//(_BYTES_PER_PIXEL*width*max(nInputs, 1))))
+
+    def run(self, inputExpHandles, *args, **kwargs):
+        # Docstring inherited.
+        self._nInputs = len(inputExpHandles)
+        try:
+            return super().run(inputExpHandles, *args, **kwargs)
+        finally:
+            self._nInputs = None
+
+    def _subBBoxIter(self, bbox, subregionSize):
+        # Docstring inherited.
+        if self.config.maxResidentMb > 0.0 and self._nInputs is not None:
+            width = min(subregionSize.getX(), bbox.getWidth())
+            rows = self.getSubregionRows(width, self._nInputs)
+            self.log.info("Combining %d inputs in subregions of %d rows.", self._nInputs, rows)
+            subregionSize = geom.Extent2I(subregionSize.getX(), rows)
+        return super()._subBBoxIter(bbox, subregionSize)
+
+
+class CptCalibCombineTask(_CptCombineMixin, CptInstrumentationMixin, cpPipe.cpCombine.CalibCombineTask):
+    """Calibration combine with a memory budget and instrumented
+    combination.
+
+    The inputs are read and combined in subregions of
+    ``subregionSize``, which bounds the memory used by the inputs.  If
+    ``maxResidentMb`` is set, the number of rows of each subregion is
+    chosen so that the inputs fit in that budget.
+    """
+
+    ConfigClass = CptCalibCombineConfig
+    _DefaultName = "cptCalibCombine"
+    _instrumentedMethods = ("combine", )
+
+
+class CptCalibCombineByFilterConfig(cpPipe.cpCombine.CalibCombineByFilterConfig,
+                                    pipelineConnections=cpPipe.cpCombine.CalibCombineByFilterConnections):
+    maxResidentMb = pexConfig.RangeField(
+        dtype=float,
+        doc="If non-zero, the maximum memory in MB used by the input subregions read at "
+            "once.  The number of rows of each subregion is then chosen from the number of "
+            "inputs, and the height in subregionSize is ignored.",
+        default=0.0,
+        min=0.0,
+    )
+
+
+class CptCalibCombineByFilterTask(_CptCombineMixin, CptInstrumentationMixin,
+                                  cpPipe.cpCombine.CalibCombineByFilterTask):
+    """Calibration combine by filter with a memory budget and
+    instrumented combination.
+
+    The inputs are read and combined in subregions of
+    ``subregionSize``, which bounds the memory used by the inputs.  If
+    ``maxResidentMb`` is set, the number of rows of each subregion is
+    chosen so that the inputs fit in that budget.
+    """
+
+    ConfigClass = CptCalibCombineByFilterConfig
+    _DefaultName = "cptCalibCombineByFilter"
+    _instrumentedMethods = ("combine", )
@@ -0,0 +1,85 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["computeCovariancesFft"]
+
+import numpy as np
+import scipy.fft
+
+
+def computeCovariancesFft(diffImage, weights, maxRange, workers=1):
+    """Compute the weighted covariances of an image for all lags at once.
+
+    This computes the same quantities as
+    `lsst.cp.pipe.utils.CovFastFourierTransform.reportCovFastFourierTransform`,
+    but evaluates every lag in a single set of array operations rather
+    than one lag at a time.  The forward transforms of the image and
+    weights are computed in one batched, multi-threaded call, as are the
+    three inverse transforms.
+
+    Parameters
+    ----------
+    diffImage : `numpy.ndarray`, (N, M)
+        Difference image.
+    weights : `numpy.ndarray`, (N, M)
+        Weight image, with 1 for pixels to use and 0 otherwise.
+    maxRange : `int`
+        Maximum lag to compute.
+    workers : `int`, optional
+        Number of threads to use for the transforms.
+
+    Returns
+    -------
+    covariances : `list` [`tuple`]
+        List with tuples of the form (dx, dy, var, cov, npix), ordered
+        with ``dx`` varying fastest.
+    """
+    shape = np.array(diffImage.shape) + maxRange
+    fftShape = tuple(2**(np.log2(shape).astype(int) + 1))
+
+    tIm, tMask = scipy.fft.rfft2(np.stack([diffImage*weights, weights]), fftShape,
+                                 workers=workers)
+    # Sum of products, sum of values, and number of pixels for each lag.
+    pCov, pMean, pCount = scipy.fft.irfft2(
+        np.stack([tIm*tIm.conjugate(), tIm*tMask.conjugate(), tMask*tMask.conjugate()]),
+        fftShape, workers=workers,
+    )
+
+    dy, dx = np.mgrid[0:maxRange + 1, 0:maxRange + 1]
+
+    def _cov(dy, dx):
+        nPix = np.rint(pCount[dy, dx])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = (pCov[dy, dx] - pMean[dy, dx]*pMean[-dy, -dx]/nPix)/nPix
+        return np.where(nPix > 0, cov, 0.0), nPix
+
+    cov1, nPix1 = _cov(dy, dx)
+    cov2, nPix2 = _cov(-dy, dx)
+
+    # Lags off the axes average the (dx, dy) and (dx, -dy) estimates,
+    # as in `lsst.cp.pipe.utils.CovFastFourierTransform.cov`.
+    offAxis = (dx != 0) & (dy != 0) & (nPix2 > 0)
+    nPix = np.where(offAxis, nPix1 + nPix2, nPix1)
+    cov = np.where(offAxis, 0.5*(cov1 + cov2), cov1)
+
+    var = float(cov[0, 0])
+    return [(int(dx[j, i]), int(dy[j, i]), var, float(cov[j, i]), int(nPix[j, i]))
+            for j in range(maxRange + 1) for i in range(maxRange + 1)]
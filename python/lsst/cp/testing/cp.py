@@ -20,43 +20,544 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 __all__ = ["CptExtractPtcTask", "CptExtractPtcTaskConfig",
+           "CptSolvePtcTask", "CptSolvePtcTaskConfig",
            "CptBrighterFatterKernelSolveTask", "CptBrighterFatterKernelSolveConfig",
            "CptLinearitySolveTask", "CptLinearitySolveConfig",
            "CptPhotodiodeCorrectionTask", "CptPhotodiodeCorrectionConfig",
            ]
 
+import copy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+import numpy as np
+from astropy.stats import mad_std
+
+import lsst.afw.math as afwMath
 import lsst.cp.pipe as cpPipe
+import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
 import lsst.pipe.base.connectionTypes as cT
+from lsst.ip.isr import IsrProvenance, Linearizer, PhotodiodeCorrection, PhotonTransferCurveDataset
+
+from .covariance import computeCovariancesFft
+from .instrumentation import CptInstrumentationMixin
+from .kernel import solvePoisson
+from .linearity import fitLinesBatched, fitSplinesBatched
 
 
 class CptExtractPtcTaskConnections(cpPipe.ptc.cpPtcExtract.PhotonTransferCurveExtractConnections):
-    pass
+    inputPriorCovariances = cT.Input(
+        name="cptPtcPartialPrior",
+        doc="Previously measured partial PTC datasets to reuse.",
+        storageClass="PhotonTransferCurveDataset",
+        dimensions=("instrument", "exposure", "detector"),
+        multiple=True,
+        deferLoad=True,
+        minimum=0,
+    )
+    inputMoments = cT.Input(
+        name="cptIsrMoments",
+        doc="Per-amplifier pixel moments of the input exposures, used to skip "
+            "exposures outside the signal range without reading them.",
+        storageClass="StructuredDataDict",
+        dimensions=("instrument", "exposure", "detector"),
+        multiple=True,
+        minimum=0,
+    )
+    inputExposureSummary = cT.Input(
+        name="cptExposureSummary",
+        doc="Per-exposure summary table, used for the photodiode charge of each exposure.",
+        storageClass="ArrowAstropy",
+        dimensions=("instrument", ),
+    )
+
+    def __init__(self, *, config=None):
+        super().__init__(config=config)
+
+        if not config.doIncremental:
+            del self.inputPriorCovariances
+        if not config.doMomentsPreselection:
+            del self.inputMoments
+        if not config.doPhotoChargeFromSummary:
+            del self.inputExposureSummary
 
 
 class CptExtractPtcTaskConfig(cpPipe.PhotonTransferCurveExtractConfig,
                               pipelineConnections=CptExtractPtcTaskConnections):
-    pass
+    doVectorizedCovariance = pexConfig.Field(
+        dtype=bool,
+        doc="Compute the FFT covariances for all lags in a single vectorized step?",
+        default=False,
+    )
+    numThreads = pexConfig.RangeField(
+        dtype=int,
+        doc="Number of threads to use within each covariance transform.  The pairs and "
+            "amplifiers are still measured one at a time by the inherited extraction.",
+        default=1,
+        min=1,
+    )
+    doIncremental = pexConfig.Field(
+        dtype=bool,
+        doc="Reuse the partial PTC datasets from inputPriorCovariances for the exposures that "
+            "were measured as part of a pair, and only extract the other exposures?",
+        default=False,
+    )
 
+    doMomentsPreselection = pexConfig.Field(
+        dtype=bool,
+        doc="Use the pixel moments from inputMoments to skip exposures whose mean signal is "
+            "outside the minMeanSignal/maxMeanSignal range for every amplifier, without "
+            "reading the exposures?",
+        default=False,
+    )
+    momentsSignalMargin = pexConfig.RangeField(
+        dtype=float,
+        doc="Fractional margin by which the signal range is widened for the moments "
+            "preselection, as the moments use unclipped means.",
+        default=0.05,
+        min=0.0,
+    )
+    doPhotoChargeFromSummary = pexConfig.Field(
+        dtype=bool,
+        doc="Take the photodiode charge of each exposure pair from the photodiode_charge "
+            "column of inputExposureSummary, rather than reading the photodiode data?",
+        default=False,
+    )
 
-class CptExtractPtcTask(cpPipe.PhotonTransferCurveExtractTask):
-    configClass = CptExtractPtcTaskConfig
+    def validate(self):
+        super().validate()
+        if self.doPhotoChargeFromSummary and self.doExtractPhotodiodeData:
+            raise ValueError("Only one of doPhotoChargeFromSummary and doExtractPhotodiodeData "
+                             "may be set.")
+        if self.doVectorizedCovariance and self.covAstierRealSpace:
+            raise ValueError("Vectorized covariances are only available for the FFT method.")
+        if self.doMomentsPreselection and self.matchExposuresType != "EXPID":
+            raise ValueError("The moments preselection requires exposures to be paired by EXPID.")
+
+
+class _SummaryPhotoChargeQuantumContext:
+    """Wrapper around a quantum context setting the photodiode charges of
+    the output partial datasets from the exposure summary.
+
+    Parameters
+    ----------
+    butlerQC : `lsst.pipe.base.QuantumContext`
+        Quantum context to wrap.
+    photoCharges : `dict` [`int`, `float`]
+        Integrated photodiode charge, keyed by exposure id.
+    """
+
+    def __init__(self, butlerQC, photoCharges):
+        self._butlerQC = butlerQC
+        self._photoCharges = photoCharges
+
+    def __getattr__(self, name):
+        return getattr(self._butlerQC, name)
+
+    def put(self, values, dataset):
+        if isinstance(values, pipeBase.Struct) and hasattr(values, "outputCovariances"):
+            for partial in values.outputCovariances:
+                _setPhotoCharges(partial, self._photoCharges)
+        self._butlerQC.put(values, dataset)
+
+
+def _setPhotoCharges(partial, photoCharges):
+    """Set the photodiode charges of a partial PTC dataset.
+
+    The charge of each exposure pair is the mean of the charges of its
+    exposures, as when the photodiode data are extracted.
+
+    Parameters
+    ----------
+    partial : `lsst.ip.isr.PhotonTransferCurveDataset`
+        Partial PTC dataset to update in place.
+    photoCharges : `dict` [`int`, `float`]
+        Integrated photodiode charge, keyed by exposure id.
+    """
+    if partial.ptcFitType == "DUMMY":
+        return
+    for ampName, pairs in partial.inputExpIdPairs.items():
+        charges = []
+        for pair in pairs:
+            pairCharges = [photoCharges.get(int(expId), np.nan) for expId in np.ravel(pair)]
+            charges.append(np.nanmean(pairCharges) if np.any(np.isfinite(pairCharges)) else np.nan)
+        partial.photoCharges[ampName] = np.array(charges)
+
+
+class CptExtractPtcTask(CptInstrumentationMixin, cpPipe.PhotonTransferCurveExtractTask):
+    ConfigClass = CptExtractPtcTaskConfig
     _DefaultName = 'cptExtractPtc'
-
+    _instrumentedMethods = ("measureMeanVarCov", )
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        if self.config.doPhotoChargeFromSummary:
+            summary = butlerQC.get(inputRefs.inputExposureSummary)
+            photoCharges = {int(exposureId): float(charge)
+                            for exposureId, charge in zip(summary["exposure"], summary["photodiode_charge"])}
+            del inputRefs.inputExposureSummary
+            butlerQC = _SummaryPhotoChargeQuantumContext(butlerQC, photoCharges)
+
+        if self.config.doMomentsPreselection:
+            # Exposures are paired sequentially, so a pair is only
+            # skipped if both exposures are outside the range.
+            inRange = {ref.dataId["exposure"]: self._isSignalInRange(butlerQC.get(ref))
+                       for ref in inputRefs.inputMoments}
+            exposures = sorted(ref.dataId["exposure"] for ref in inputRefs.inputExp)
+            rejected = set()
+            for pair in zip(exposures[::2], exposures[1::2]):
+                if not any(inRange.get(expId, True) for expId in pair):
+                    rejected.update(pair)
+            del inputRefs.inputMoments
+            self._removeExposures(inputRefs, rejected)
+            self.log.info("Skipping %d exposures outside the signal range.", len(rejected))
+
+        if not self.config.doIncremental:
+            return super().runQuantum(butlerQC, inputRefs, outputRefs)
+
+        priorRefs = {ref.dataId["exposure"]: ref for ref in inputRefs.inputPriorCovariances}
+        del inputRefs.inputPriorCovariances
+        outputRefsByExposure = {ref.dataId["exposure"]: ref for ref in outputRefs.outputCovariances}
+
+        # Each pair is written to one exposure, and a dummy to the other.
+        # The prior pair datasets are copied one at a time, so that only
+        # one is held in memory, and the dummies are only copied if their
+        # exposure was paired; an unpaired exposure is extracted again,
+        # so that it can be paired with the new exposures.
+        paired = set()
+        dummies = {}
+        with self.instrumentStep("reuse"):
+            for exposure, ref in priorRefs.items():
+                if exposure not in outputRefsByExposure:
+                    continue
+                prior = butlerQC.get(ref)
+                if prior.ptcFitType == "DUMMY":
+                    dummies[exposure] = prior
+                    continue
+                for pairs in prior.inputExpIdPairs.values():
+                    paired.update(int(expId) for expId in np.ravel(pairs) if np.isfinite(expId))
+                butlerQC.put(prior, outputRefsByExposure[exposure])
+            for exposure in dummies.keys() & paired:
+                butlerQC.put(dummies[exposure], outputRefsByExposure[exposure])
+
+        reused = set(priorRefs) - (dummies.keys() - paired)
+        self._removeExposures(inputRefs, reused)
+        outputRefs.outputCovariances = [ref for ref in outputRefs.outputCovariances
+                                        if ref.dataId["exposure"] not in reused]
+        self.log.info("Reused %d prior partial PTC datasets; extracting %d exposures.",
+                      len(reused & outputRefsByExposure.keys()), len(inputRefs.inputExp))
+
+        if len(inputRefs.inputExp) == 0:
+            self.log.info("No new exposures to extract.")
+            return
+        super().runQuantum(butlerQC, inputRefs, outputRefs)
+
+    @staticmethod
+    def _removeExposures(inputRefs, exposures):
+        """Remove the references to a set of exposures from the inputs.
+
+        Parameters
+        ----------
+        inputRefs : `lsst.pipe.base.InputQuantizedConnection`
+            Input references.  Modified in place.
+        exposures : `set` [`int`]
+            Exposures to remove.
+        """
+        for connectionName, refs in inputRefs:
+            if isinstance(refs, list) and refs and "exposure" in refs[0].dataId.dimensions.names:
+                setattr(inputRefs, connectionName,
+                        [ref for ref in refs if ref.dataId["exposure"] not in exposures])
+
+    def _isSignalInRange(self, moments):
+        """Determine if any amplifier of an exposure is within the signal
+        range used for the PTC.
+
+        Parameters
+        ----------
+        moments : `dict` [`str`, `dict`]
+            Pixel moments of the exposure, as produced by
+            `lsst.cp.testing.CptIsrTask.measureMoments`.
+
+        Returns
+        -------
+        inRange : `bool`
+            True if the mean of at least one amplifier is within the
+            minMeanSignal/maxMeanSignal range.
+        """
+        for ampName, ampMoments in moments.items():
+            if ampMoments["n"] == 0:
+                continue
+            mean = ampMoments["sum"]/ampMoments["n"]
+            minSignal = self.config.minMeanSignal.get(ampName, self.config.minMeanSignal["ALL_AMPS"])
+            maxSignal = self.config.maxMeanSignal.get(ampName, self.config.maxMeanSignal["ALL_AMPS"])
+            margin = self.config.momentsSignalMargin
+            if (1.0 - margin)*minSignal <= mean <= (1.0 + margin)*maxSignal:
+                return True
+        return False
+
+    def measureMeanVarCov(self, im1Area, im2Area, imStatsCtrl, mu1, mu2):
+        """Calculate the mean of each of two amplifier images, the
+        variance of their difference, and the covariances of the
+        difference.
+
+        If ``doVectorizedCovariance`` is set, the covariances for all
+        lags are calculated at once; otherwise this defers to the parent
+        implementation.
+
+        Parameters
+        ----------
+        im1Area : `lsst.afw.image.MaskedImageF`
+            Masked image from exposure 1.
+        im2Area : `lsst.afw.image.MaskedImageF`
+            Masked image from exposure 2.
+        imStatsCtrl : `lsst.afw.math.StatisticsControl`
+            Statistics control object.
+        mu1 : `float`
+            Clipped mean of im1Area (ADU).
+        mu2 : `float`
+            Clipped mean of im2Area (ADU).
+
+        Returns
+        -------
+        mu : `float`
+            0.5*(mu1 + mu2), or NaN if the measurement failed.
+        varDiff : `float`
+            Half of the clipped variance of the difference image, or
+            NaN if the measurement failed.
+        covDiffAstier : `list` [`tuple`] or `None`
+            List with tuples of the form (dx, dy, var, cov, npix).
+        rowMeanVariance : `float`
+            Variance of the means of each row in the difference image.
+        """
+        if not self.config.doVectorizedCovariance:
+            return super().measureMeanVarCov(im1Area, im2Area, imStatsCtrl, mu1, mu2)
+
+        if not np.isfinite(mu1) or not np.isfinite(mu2):
+            self.log.warning("Mean of amp in image 1 or 2 is NaN: %f, %f.", mu1, mu2)
+            return np.nan, np.nan, None, np.nan
+
+        mu = 0.5*(mu1 + mu2)
+
+        # Take the difference of the pair, scaled to the pair mean.
+        temp = im2Area.clone()
+        temp *= mu1
+        diffIm = im1Area.clone()
+        diffIm *= mu2
+        diffIm -= temp
+        diffIm /= mu
+
+        if self.config.binSize > 1:
+            diffIm = afwMath.binImage(diffIm, self.config.binSize)
+
+        rowMeans = np.nanmean(diffIm.image.array, axis=1)
+        rowMeanVariance = mad_std(rowMeans, ignore_nan=True)**2
+
+        varClip = afwMath.makeStatistics(diffIm, afwMath.VARIANCECLIP, imStatsCtrl).getValue()
+        varDiff = 0.5*varClip
+        meanClip = afwMath.makeStatistics(diffIm, afwMath.MEANCLIP, imStatsCtrl).getValue()
+
+        # Use pixels that survive the clipping and are not masked.
+        cut = meanClip + self.config.nSigmaClipPtc*np.sqrt(varClip)
+        unmasked = np.where(np.fabs(diffIm.image.array) <= cut, 1, 0)
+        wDiff = np.where(diffIm.mask.array == 0, 1, 0)
+        w = unmasked*wDiff
+
+        if np.sum(w) < self.config.minNumberGoodPixelsForCovariance/(self.config.binSize**2):
+            self.log.warning("Number of good points for covariance calculation (%s) is less "
+                             "(than threshold %s)", np.sum(w),
+                             self.config.minNumberGoodPixelsForCovariance/(self.config.binSize**2))
+            return np.nan, np.nan, None, np.nan
+
+        covDiffAstier = computeCovariancesFft(diffIm.image.array, w,
+                                              self.config.maximumRangeCovariancesAstier,
+                                              workers=self.config.numThreads)
+
+        return mu, varDiff, covDiffAstier, rowMeanVariance
+
+
+def _ampAttributes(dataset, ampName):
+    """Return the per-amplifier attributes of a PTC dataset that have an
+    entry for one amplifier.
+
+    The attributes are found from the dataset, so that new
+    per-amplifier quantities are carried through the parallel fit.
+
+    Parameters
+    ----------
+    dataset : `lsst.ip.isr.PhotonTransferCurveDataset`
+        Dataset to inspect.
+    ampName : `str`
+        Amplifier name.
+
+    Returns
+    -------
+    attributes : `list` [`str`]
+        Names of the dictionary attributes keyed by amplifier name
+        that contain ``ampName``.
+    """
+    ampNames = set(dataset.ampNames)
+    return [name for name, values in vars(dataset).items()
+            if isinstance(values, dict) and ampName in values and set(values) <= ampNames]
+
+
+def _ampValues(dataset, attribute):
+    """Return a per-amplifier attribute of a PTC dataset, creating it if
+    needed.
+
+    Parameters
+    ----------
+    dataset : `lsst.ip.isr.PhotonTransferCurveDataset`
+        Dataset to update.
+    attribute : `str`
+        Name of the attribute.
+
+    Returns
+    -------
+    values : `dict`
+        The attribute, keyed by amplifier name.
+    """
+    values = getattr(dataset, attribute, None)
+    if not isinstance(values, dict):
+        values = {}
+        setattr(dataset, attribute, values)
+    return values
+
+
+def _sliceAmp(dataset, ampName):
+    """Construct a PTC dataset containing a single amplifier.
+
+    Every per-amplifier attribute of that amplifier is copied.
+
+    Parameters
+    ----------
+    dataset : `lsst.ip.isr.PhotonTransferCurveDataset`
+        Dataset to take the amplifier from.
+    ampName : `str`
+        Amplifier to copy.
+
+    Returns
+    -------
+    ampDataset : `lsst.ip.isr.PhotonTransferCurveDataset`
+        Dataset containing only ``ampName``.
+    """
+    ampDataset = PhotonTransferCurveDataset(ampNames=[ampName], ptcFitType=dataset.ptcFitType,
+                                            covMatrixSide=dataset.covMatrixSide)
+    for attribute in _ampAttributes(dataset, ampName):
+        _ampValues(ampDataset, attribute)[ampName] = copy.deepcopy(getattr(dataset, attribute)[ampName])
+    if ampName in dataset.badAmps:
+        ampDataset.badAmps = [ampName]
+    return ampDataset
+
+
+def _mergeAmp(dataset, ampDataset, ampName):
+    """Copy the fit results of a single amplifier into a PTC dataset.
+
+    Parameters
+    ----------
+    dataset : `lsst.ip.isr.PhotonTransferCurveDataset`
+        Dataset to update in place.
+    ampDataset : `lsst.ip.isr.PhotonTransferCurveDataset`
+        Fitted single-amplifier dataset.
+    ampName : `str`
+        Amplifier to copy.
+    """
+    for attribute in _ampAttributes(ampDataset, ampName):
+        _ampValues(dataset, attribute)[ampName] = getattr(ampDataset, attribute)[ampName]
+    if ampName in ampDataset.badAmps and ampName not in dataset.badAmps:
+        dataset.badAmps.append(ampName)
+
+
+def _fitPtcSingleAmp(config, dataset):
+    """Fit a single-amplifier PTC dataset in a worker.
+
+    Each call constructs its own task, so that workers in a thread pool
+    do not share task state.
+
+    Parameters
+    ----------
+    config : `CptSolvePtcTaskConfig`
+        Configuration for the solve.
+    dataset : `lsst.ip.isr.PhotonTransferCurveDataset`
+        Dataset containing a single amplifier.
+
+    Returns
+    -------
+    dataset : `lsst.ip.isr.PhotonTransferCurveDataset`
+        The fitted dataset.
+    """
+    task = cpPipe.PhotonTransferCurveSolveTask(config=config)
+    return task.fitPtc(dataset)
+
+
+class CptSolvePtcTaskConnections(cpPipe.ptc.cpSolvePtcTask.PhotonTransferCurveSolveConnections):
     pass
 
 
+class CptSolvePtcTaskConfig(cpPipe.PhotonTransferCurveSolveConfig,
+                            pipelineConnections=CptSolvePtcTaskConnections):
+    nWorkers = pexConfig.RangeField(
+        dtype=int,
+        doc="Number of workers used to fit the amplifiers in parallel.  A value of 1 "
+            "fits the amplifiers serially.",
+        default=1,
+        min=1,
+    )
+    workerType = pexConfig.ChoiceField(
+        dtype=str,
+        doc="Type of worker pool to use if nWorkers > 1.",
+        default="PROCESS",
+        allowed={
+            "PROCESS": "Use a pool of processes.",
+            "THREAD": "Use a pool of threads, each fitting with its own task.",
+        },
+    )
+
+
+class CptSolvePtcTask(CptInstrumentationMixin, cpPipe.PhotonTransferCurveSolveTask):
+    """PTC solve with the per-amplifier fits run in parallel.
+
+    Each amplifier is fit independently, so the results are identical
+    to the serial fit, and are gathered back in amplifier order.
+    """
+
+    ConfigClass = CptSolvePtcTaskConfig
+    _DefaultName = "cptSolvePtc"
+    _instrumentedMethods = ("fitPtc", )
+
+    def fitPtc(self, dataset):
+        """Fit the photon transfer curve of each amplifier.
+
+        Parameters
+        ----------
+        dataset : `lsst.ip.isr.PhotonTransferCurveDataset`
+            The dataset containing the means, variances and exposure
+            times.
+
+        Returns
+        -------
+        dataset : `lsst.ip.isr.PhotonTransferCurveDataset`
+            The dataset with the fit results filled in.
+        """
+        ampNames = list(dataset.ampNames)
+        if self.config.nWorkers == 1 or len(ampNames) <= 1:
+            return super().fitPtc(dataset)
+
+        ampDatasets = [_sliceAmp(dataset, ampName) for ampName in ampNames]
+
+        nWorkers = min(self.config.nWorkers, len(ampNames))
+        executorClass = ProcessPoolExecutor if self.config.workerType == "PROCESS" else ThreadPoolExecutor
+        with executorClass(max_workers=nWorkers) as pool:
+            results = list(pool.map(_fitPtcSingleAmp, [self.config]*len(ampDatasets), ampDatasets))
+
+        # Gather the per-amplifier results back in amplifier order.
+        for ampName, result in zip(ampNames, results):
+            _mergeAmp(dataset, result, ampName)
+        dataset.badAmps = [ampName for ampName in ampNames if ampName in dataset.badAmps]
+
+        return dataset
+
+
 class CptBrighterFatterKernelSolveConnections(pipeBase.PipelineTaskConnections,
                                               dimensions=("instrument", "detector")):
-    dummy = cT.Input(
-        name="raw",
-        doc="Dummy exposure.",
-        storageClass='Exposure',
-        dimensions=("instrument", "exposure", "detector"),
-        multiple=True,
-        deferLoad=True,
-    )
     camera = cT.PrerequisiteInput(
         name="camera",
         doc="Camera Geometry definition.",
@@ -83,27 +584,85 @@ class CptBrighterFatterKernelSolveConnections(pipeBase.PipelineTaskConnections,
 
 class CptBrighterFatterKernelSolveConfig(cpPipe.BrighterFatterKernelSolveConfig,
                                          pipelineConnections=CptBrighterFatterKernelSolveConnections):
-    pass
+    doFftSolve = pexConfig.Field(
+        dtype=bool,
+        doc="Solve for the kernel directly with discrete sine transforms, rather than "
+            "with successive over-relaxation?",
+        default=False,
+    )
+    numThreads = pexConfig.RangeField(
+        dtype=int,
+        doc="Number of threads to use for the kernel transforms.",
+        default=1,
+        min=1,
+    )
 
 
-class CptBrighterFatterKernelSolveTask(cpPipe.BrighterFatterKernelSolveTask):
+class CptBrighterFatterKernelSolveTask(CptInstrumentationMixin, cpPipe.BrighterFatterKernelSolveTask):
 
     ConfigClass = CptBrighterFatterKernelSolveConfig
     _DefaultName = "cptBfkTask"
-
-    pass
+    _instrumentedMethods = ("successiveOverRelax", )
+
+    def run(self, inputPtc, camera, inputDims, **kwargs):
+        """Combine covariance information from PTC into brighter-fatter
+        kernels.
+
+        The exposure metadata needed is taken from the PTC dataset, so
+        no per-exposure inputs are required.
+
+        Parameters
+        ----------
+        inputPtc : `lsst.ip.isr.PhotonTransferCurveDataset`
+            PTC data containing per-amplifier covariance measurements.
+        camera : `lsst.afw.cameraGeom.Camera`
+            Camera to use for camera geometry information.
+        inputDims : `lsst.daf.butler.DataCoordinate` or `dict`
+            DataIds to use to populate the output calibration.
+        **kwargs
+            Additional arguments passed to the parent task.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            The results struct containing:
+
+            ``outputBfk``
+                Resulting Brighter-Fatter Kernel
+                (`lsst.ip.isr.BrighterFatterKernel`).
+        """
+        return super().run(inputPtc, None, camera, inputDims, **kwargs)
+
+    def successiveOverRelax(self, source, maxIter=None, eLevel=None):
+        """Solve the Poisson equation for the kernel.
+
+        If ``doFftSolve`` is set, the equation is solved directly with
+        discrete sine transforms; otherwise this defers to the parent
+        iterative solution.
+
+        Parameters
+        ----------
+        source : `numpy.ndarray`
+            The input array.
+        maxIter : `int`, optional
+            Maximum number of iterations to attempt before aborting.
+            Unused by the direct solution.
+        eLevel : `float`, optional
+            The target error level at which we deem convergence to have
+            occurred.  Unused by the direct solution.
+
+        Returns
+        -------
+        output : `numpy.ndarray`
+            The solution.
+        """
+        if not self.config.doFftSolve:
+            return super().successiveOverRelax(source, maxIter=maxIter, eLevel=eLevel)
+        return solvePoisson(source, workers=self.config.numThreads)
 
 
 class CptLinearitySolveConnections(pipeBase.PipelineTaskConnections,
                                    dimensions=("instrument", "detector")):
-    dummy = cT.Input(
-        name="raw",
-        doc="Dummy exposure.",
-        storageClass='Exposure',
-        dimensions=("instrument", "exposure", "detector"),
-        multiple=True,
-        deferLoad=True,
-    )
     camera = cT.PrerequisiteInput(
         name="camera",
         doc="Camera Geometry definition.",
@@ -143,25 +702,190 @@ class CptLinearitySolveConnections(pipeBase.PipelineTaskConnections,
 
 class CptLinearitySolveConfig(cpPipe.LinearitySolveConfig,
                               pipelineConnections=CptLinearitySolveConnections):
-    pass
+    doBatchedSplineFit = pexConfig.Field(
+        dtype=bool,
+        doc="Fit the spline linearity of all amplifiers together with shared nodes?",
+        default=False,
+    )
+    splineFitMaxIter = pexConfig.RangeField(
+        dtype=int,
+        doc="Maximum number of sigma clipping iterations for the batched spline fit.",
+        default=5,
+        min=1,
+    )
+
+    def validate(self):
+        super().validate()
+        if self.doBatchedSplineFit:
+            if self.linearityType != "Spline":
+                raise ValueError("The batched fit is only available for Spline linearity.")
 
 
-class CptLinearitySolveTask(cpPipe.LinearitySolveTask):
+class CptLinearitySolveTask(CptInstrumentationMixin, cpPipe.LinearitySolveTask):
 
     ConfigClass = CptLinearitySolveConfig
     _DefaultName = "cptLinearityTask"
-
-    pass
+    _instrumentedMethods = ("runBatchedSpline", )
+
+    def run(self, inputPtc, camera, inputDims, **kwargs):
+        """Fit non-linearity to PTC data, returning the correct Linearizer
+        object.
+
+        The exposure metadata needed is taken from the PTC dataset, so
+        no per-exposure inputs are required.
+
+        Parameters
+        ----------
+        inputPtc : `lsst.ip.isr.PhotonTransferCurveDataset`
+            Pre-measured PTC dataset.
+        camera : `lsst.afw.cameraGeom.Camera`
+            Camera geometry.
+        inputDims : `lsst.daf.butler.DataCoordinate` or `dict`
+            DataIds to use to populate the output calibration.
+        **kwargs
+            Additional arguments, such as the photodiode correction,
+            passed to the parent task.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            The results struct containing:
+
+            ``outputLinearizer``
+                Final linearizer calibration (`lsst.ip.isr.Linearizer`).
+            ``outputProvenance``
+                Provenance data for the new calibration
+                (`lsst.ip.isr.IsrProvenance`).
+        """
+        if self.config.doBatchedSplineFit:
+            return self.runBatchedSpline(inputPtc, camera, inputDims,
+                                         inputPhotodiodeCorrection=kwargs.get("inputPhotodiodeCorrection"))
+        return super().run(inputPtc, None, camera, inputDims, **kwargs)
+
+    def runBatchedSpline(self, inputPtc, camera, inputDims, inputPhotodiodeCorrection=None):
+        """Fit spline linearity to all amplifiers at once.
+
+        The nodes are fit with the Akima spline that the ``Spline``
+        linearizer applies.
+
+        Parameters
+        ----------
+        inputPtc : `lsst.ip.isr.PhotonTransferCurveDataset`
+            Pre-measured PTC dataset.
+        camera : `lsst.afw.cameraGeom.Camera`
+            Camera geometry.
+        inputDims : `lsst.daf.butler.DataCoordinate` or `dict`
+            DataIds to use to populate the output calibration.
+        inputPhotodiodeCorrection : `lsst.ip.isr.PhotodiodeCorrection`
+            Correction to the photodiode charges, applied if
+            ``applyPhotodiodeCorrection`` is set.  May be `None`
+            otherwise.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            The results struct containing:
+
+            ``outputLinearizer``
+                Final linearizer calibration (`lsst.ip.isr.Linearizer`).
+            ``outputProvenance``
+                Provenance data for the new calibration
+                (`lsst.ip.isr.IsrProvenance`).
+        """
+        detector = camera[inputDims["detector"]]
+        ampNames = [amp.getName() for amp in detector]
+        goodAmps = [ampName for ampName in ampNames if ampName not in inputPtc.badAmps]
+
+        if self.config.usePhotodiode:
+            abscissaSource = inputPtc.photoCharges
+        else:
+            abscissaSource = inputPtc.rawExpTimes
+
+        # Stack the per-amplifier measurements, padding with masked
+        # points if the lengths differ.
+        nPoints = max([len(inputPtc.rawMeans[ampName]) for ampName in goodAmps], default=0)
+        abscissa = np.zeros((len(goodAmps), nPoints))
+        ordinate = np.zeros((len(goodAmps), nPoints))
+        mask = np.zeros((len(goodAmps), nPoints), dtype=bool)
+        for i, ampName in enumerate(goodAmps):
+            n = len(inputPtc.rawMeans[ampName])
+            abscissa[i, :n] = abscissaSource[ampName]
+            if self.config.applyPhotodiodeCorrection:
+                corrections = inputPhotodiodeCorrection.abscissaCorrections
+                for j, pair in enumerate(inputPtc.inputExpIdPairs[ampName]):
+                    abscissa[i, j] += corrections.get(_pairKey(pair), 0.0)
+            ordinate[i, :n] = inputPtc.rawMeans[ampName]
+            mask[i, :n] = np.asarray(inputPtc.expIdMask[ampName], dtype=bool)
+        mask &= np.isfinite(abscissa) & np.isfinite(ordinate)
+        abscissa = np.where(mask, abscissa, 0.0)
+        ordinate = np.where(mask, ordinate, 0.0)
+
+        linearMask = mask & (ordinate >= self.config.minLinearAdu) & (ordinate <= self.config.maxLinearAdu)
+        linearFit = fitLinesBatched(abscissa, ordinate, linearMask)
+        linearOrdinate = linearFit[:, 0:1] + linearFit[:, 1:2]*abscissa
+
+        maxNode = ordinate[mask].max() if mask.any() else self.config.maxLinearAdu
+        nodes = np.linspace(0.0, maxNode, self.config.splineKnots)
+        values, valueErrors, fitMask, fitResiduals = fitSplinesBatched(
+            ordinate, ordinate - linearOrdinate, mask, nodes,
+            nSigmaClip=self.config.nSigmaClipLinear,
+            maxIter=self.config.splineFitMaxIter,
+        )
+
+        linearizer = Linearizer(detector=detector, log=self.log)
+        for ampName in ampNames:
+            amp = detector[ampName]
+            linearizer.linearityBBox[ampName] = amp.getBBox()
+            if ampName not in goodAmps:
+                linearizer.linearityType[ampName] = "None"
+                linearizer.linearityCoeffs[ampName] = np.zeros(2*len(nodes))
+                linearizer.linearFit[ampName] = np.array([np.nan, np.nan])
+                linearizer.fitParams[ampName] = np.zeros(len(nodes))
+                linearizer.fitParamsErr[ampName] = np.full(len(nodes), np.nan)
+                linearizer.fitChiSq[ampName] = np.nan
+                linearizer.fitResiduals[ampName] = np.full(nPoints, np.nan)
+                continue
+
+            i = goodAmps.index(ampName)
+            nGood = fitMask[i].sum()
+            linearizer.linearityType[ampName] = "Spline"
+            linearizer.linearityCoeffs[ampName] = np.concatenate([nodes, values[i]])
+            linearizer.linearFit[ampName] = linearFit[i]
+            linearizer.fitParams[ampName] = values[i]
+            linearizer.fitParamsErr[ampName] = valueErrors[i]
+            linearizer.fitChiSq[ampName] = (np.sum(fitResiduals[i][fitMask[i]]**2)
+                                            / max(nGood - len(nodes), 1))
+            linearizer.fitResiduals[ampName] = np.where(mask[i], fitResiduals[i], np.nan)
+
+        linearizer.hasLinearity = True
+        linearizer.validate()
+        linearizer.updateMetadata(camera=camera, detector=detector, filterName="NONE")
+        linearizer.updateMetadata(setDate=True, setCalibId=True)
+        provenance = IsrProvenance(calibType="linearizer")
+
+        return pipeBase.Struct(
+            outputLinearizer=linearizer,
+            outputProvenance=provenance,
+        )
 
 
 class CptPhotodiodeCorrectionConnections(pipeBase.PipelineTaskConnections,
-                                         dimensions=("instrument", "detector")):
+                                         dimensions=("instrument", )):
     inputPtc = cT.Input(
         name="ptc",
-        doc="Input PTC dataset.",
+        doc="Input PTC datasets for all detectors.",
         storageClass="PhotonTransferCurveDataset",
         dimensions=("instrument", "detector"),
         isCalibration=True,
+        multiple=True,
+    )
+
+    outputPhotodiodeCorrection = cT.Output(
+        name="pdCorrection",
+        doc="Correction of photodiode systematic error.",
+        storageClass="IsrCalib",
+        dimensions=("instrument", ),
+        isCalibration=True,
     )
 
 
@@ -170,9 +894,112 @@ class CptPhotodiodeCorrectionConfig(cpPipe.PhotodiodeCorrectionConfig,
     pass
 
 
-class CptPhotodiodeCorrectionTask(cpPipe.PhotodiodeCorrectionTask):
+def _pairKey(pair):
+    """Construct the photodiode correction key for an exposure pair.
+
+    Parameters
+    ----------
+    pair : `tuple` or `list`
+        Entry of ``inputExpIdPairs`` from a PTC dataset, as read from
+        the butler.
+
+    Returns
+    -------
+    key : `str`
+        Key used in the photodiode correction.  This is the same form
+        that `lsst.cp.pipe.LinearitySolveTask` uses to look up the
+        correction for each entry, so the entry is not normalized.
+    """
+    return str(pair)
+
+
+class CptPhotodiodeCorrectionTask(CptInstrumentationMixin, cpPipe.PhotodiodeCorrectionTask):
+    """Photodiode correction measured once for the full instrument.
+
+    All of the per-detector PTC datasets are read in one quantum, and
+    the abscissa correction for each exposure pair is the median of
+    the residuals over every amplifier of every detector.
+    """
 
     ConfigClass = CptPhotodiodeCorrectionConfig
     _DefaultName = "cptPdCorrTask"
 
-    pass
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        with self.instrumentStep("read"):
+            inputs = butlerQC.get(inputRefs)
+        outputs = self.run(**inputs)
+        with self.instrumentStep("write"):
+            butlerQC.put(outputs, outputRefs)
+
+    def run(self, inputPtc):
+        """Calculate the photodiode correction from all detectors.
+
+        Parameters
+        ----------
+        inputPtc : `list` [`lsst.ip.isr.PhotonTransferCurveDataset`]
+            PTC datasets for each detector.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            The results struct containing:
+
+            ``outputPhotodiodeCorrection``
+                Final correction calibration
+                (`lsst.ip.isr.PhotodiodeCorrection`).
+        """
+        keys = []
+        corrections = []
+        for ptc in inputPtc:
+            if ptc.ptcFitType == "DUMMY":
+                continue
+            ampNames = [ampName for ampName in ptc.ampNames if ampName not in ptc.badAmps]
+            if len(ampNames) == 0:
+                continue
+            nPoints = len(ptc.rawMeans[ampNames[0]])
+            if any(len(ptc.rawMeans[ampName]) != nPoints for ampName in ampNames):
+                raise RuntimeError("PTC amplifiers have differing numbers of exposure pairs.")
+
+            abscissa = np.array([ptc.photoCharges[ampName] for ampName in ampNames], dtype=float)
+            ordinate = np.array([ptc.rawMeans[ampName] for ampName in ampNames], dtype=float)
+            mask = np.array([ptc.expIdMask[ampName] for ampName in ampNames], dtype=bool)
+            mask &= np.isfinite(abscissa) & np.isfinite(ordinate)
+            abscissa = np.where(mask, abscissa, 0.0)
+            ordinate = np.where(mask, ordinate, 0.0)
+
+            linearMask = (mask & (ordinate >= self.config.minLinearAdu)
+                          & (ordinate <= self.config.maxLinearAdu))
+            linearFit = fitLinesBatched(abscissa, ordinate, linearMask)
+
+            # The correction is the change in abscissa that places each
+            # point on the linear fit.
+            with np.errstate(divide="ignore", invalid="ignore"):
+                correction = (ordinate - linearFit[:, 0:1])/linearFit[:, 1:2] - abscissa
+            correction = np.where(mask, correction, np.nan)
+
+            for i, ampName in enumerate(ampNames):
+                keys.extend(_pairKey(pair) for pair in ptc.inputExpIdPairs[ampName])
+                corrections.append(correction[i])
+
+        photodiodeCorrection = PhotodiodeCorrection(log=self.log)
+        if len(keys) > 0:
+            corrections = np.concatenate(corrections)
+            uniqueKeys, inverse = np.unique(np.array(keys), return_inverse=True)
+            # Group the corrections by exposure pair, and take the median
+            # of each group.
+            order = np.argsort(inverse, kind="stable")
+            groups = np.split(corrections[order], np.cumsum(np.bincount(inverse))[:-1])
+            for key, group in zip(uniqueKeys, groups):
+                if np.any(np.isfinite(group)):
+                    photodiodeCorrection.abscissaCorrections[str(key)] = float(np.nanmedian(group))
+                else:
+                    photodiodeCorrection.abscissaCorrections[str(key)] = 0.0
+        self.log.info("Measured photodiode corrections for %d exposure pairs from %d detectors.",
+                      len(photodiodeCorrection.abscissaCorrections), len(inputPtc))
+
+        photodiodeCorrection.validate()
+        photodiodeCorrection.updateMetadata(setDate=True, setCalibId=True)
+
+        return pipeBase.Struct(
+            outputPhotodiodeCorrection=photodiodeCorrection,
+        )
@@ -0,0 +1,216 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["CptMergeDefectsCombinedTask", "CptMergeDefectsCombinedConfig",
+           "boxesToRuns", "mergeRuns", "runsToBoxes"]
+
+import lsst.cp.pipe as cpPipe
+import lsst.geom as geom
+import lsst.pipe.base as pipeBase
+from lsst.ip.isr import Defects
+
+from .instrumentation import CptInstrumentationMixin, _InstrumentedQuantumContext
+
+
+def _mergeIntervals(intervals):
+    """Merge overlapping or adjacent inclusive intervals.
+
+    Parameters
+    ----------
+    intervals : `list` [`tuple` [`int`, `int`]]
+        Inclusive (x0, x1) intervals.
+
+    Returns
+    -------
+    merged : `list` [`tuple` [`int`, `int`]]
+        Sorted, disjoint, non-adjacent intervals.
+    """
+    merged = []
+    for x0, x1 in sorted(intervals):
+        if merged and x0 <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], x1))
+        else:
+            merged.append((x0, x1))
+    return merged
+
+
+def boxesToRuns(boxes):
+    """Convert a list of boxes to a run-length encoded mask.
+
+    Parameters
+    ----------
+    boxes : iterable [`tuple` [`int`, `int`, `int`, `int`]]
+        Inclusive (x0, y0, x1, y1) boxes.
+
+    Returns
+    -------
+    runs : `dict` [`int`, `list` [`tuple` [`int`, `int`]]]
+        Inclusive (x0, x1) runs of masked pixels, keyed by row.
+    """
+    rows = {}
+    for x0, y0, x1, y1 in boxes:
+        for y in range(y0, y1 + 1):
+            rows.setdefault(y, []).append((x0, x1))
+    return {y: _mergeIntervals(intervals) for y, intervals in rows.items()}
+
+
+def mergeRuns(*runSets):
+    """Combine run-length encoded masks with a logical OR.
+
+    Parameters
+    ----------
+    *runSets : `dict` [`int`, `list` [`tuple` [`int`, `int`]]]
+        Run-length encoded masks to combine.
+
+    Returns
+    -------
+    runs : `dict` [`int`, `list` [`tuple` [`int`, `int`]]]
+        The combined mask.
+    """
+    rows = {}
+    for runs in runSets:
+        for y, intervals in runs.items():
+            rows.setdefault(y, []).extend(intervals)
+    return {y: _mergeIntervals(intervals) for y, intervals in rows.items()}
+
+
+def runsToBoxes(runs):
+    """Decompose a run-length encoded mask into boxes.
+
+    Starting from the lowest row, each run is extended to the following
+    rows for as long as they contain the full run, and the covered
+    pixels are removed before continuing.
+
+    Parameters
+    ----------
+    runs : `dict` [`int`, `list` [`tuple` [`int`, `int`]]]
+        Run-length encoded mask.
+
+    Returns
+    -------
+    boxes : `list` [`tuple` [`int`, `int`, `int`, `int`]]
+        Inclusive (x0, y0, x1, y1) boxes covering exactly the masked
+        pixels, without overlaps.
+    """
+    rows = {y: list(intervals) for y, intervals in runs.items() if intervals}
+    boxes = []
+    for y in sorted(rows):
+        while rows[y]:
+            x0, x1 = rows[y].pop(0)
+            yEnd = y
+            while True:
+                below = rows.get(yEnd + 1, [])
+                covering = [i for i, (b0, b1) in enumerate(below) if b0 <= x0 and b1 >= x1]
+                if not covering:
+                    break
+                # Remove the covered pixels from the row below.
+                i = covering[0]
+                b0, b1 = below.pop(i)
+                remainder = [(b0, x0 - 1)] if b0 < x0 else []
+                if b1 > x1:
+                    remainder.append((x1 + 1, b1))
+                below[i:i] = remainder
+                yEnd += 1
+            boxes.append((x0, y, x1, yEnd))
+    return boxes
+
+
+class CptMergeDefectsCombinedConfig(cpPipe.MergeDefectsCombinedConfig,
+                                    pipelineConnections=cpPipe.defects.MergeDefectsCombinedConnections):
+    pass
+
+
+class CptMergeDefectsCombinedTask(CptInstrumentationMixin, cpPipe.MergeDefectsCombinedTask):
+    """Merge defects using run-length encoded masks.
+
+    For the ``OR`` combination mode, the input defects are combined as
+    run-length encoded masks, rather than by rasterizing them onto a
+    full-size image.  Other modes use the parent implementation.
+    """
+
+    ConfigClass = CptMergeDefectsCombinedConfig
+    _DefaultName = "cptMergeDefectsCombined"
+    _instrumentedMethods = ("mergeDefectsOr", )
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        # Docstring inherited.
+        # The parent runQuantum calls MergeDefectsTask.run directly,
+        # which would bypass the run method of this task.
+        butlerQC = _InstrumentedQuantumContext(butlerQC, self)
+        inputs = butlerQC.get(inputRefs)
+
+        # As in the parent, if there are multiple inputs of one type, use
+        # the one with the most inputs.
+        inputDefects = [self.chooseBest(inputs[name])
+                        for name in ("inputFlatDefects", "inputDarkDefects", "inputBiasDefects")
+                        if name in inputs]
+        outputs = self.run(inputDefects=inputDefects, camera=inputs["camera"])
+        butlerQC.put(outputs, outputRefs)
+
+    def run(self, inputDefects, camera):
+        # Docstring inherited.
+        if self.config.combinationMode != "OR" or self.config.edgesAsDefects:
+            return super().run(inputDefects, camera)
+        return self.mergeDefectsOr(inputDefects, camera)
+
+    def mergeDefectsOr(self, inputDefects, camera):
+        """Combine defects with a logical OR.
+
+        Parameters
+        ----------
+        inputDefects : `list` [`lsst.ip.isr.Defects`]
+            Defects to combine.
+        camera : `lsst.afw.cameraGeom.Camera`
+            Camera geometry, used to fill in the calibration metadata.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            Results struct containing:
+
+            ``mergedDefects``
+                The combined defects (`lsst.ip.isr.Defects`).
+        """
+        detectorId = inputDefects[0].getMetadata().get("DETECTOR", None)
+        if detectorId is None:
+            raise RuntimeError("Cannot identify detector id.")
+        detector = camera[detectorId]
+
+        boxes = runsToBoxes(mergeRuns(*[
+            boxesToRuns((bbox.getMinX(), bbox.getMinY(), bbox.getMaxX(), bbox.getMaxY())
+                        for bbox in (defect.getBBox() for defect in defects))
+            for defects in inputDefects
+        ]))
+
+        # The boxes are already disjoint, so do not rasterize again.
+        merged = Defects([geom.Box2I(geom.Point2I(x0, y0), geom.Point2I(x1, y1))
+                          for x0, y0, x1, y1 in boxes],
+                         normalize_on_init=False)
+        self.log.info("Merged %s defects into %d.",
+                      ", ".join(str(len(defects)) for defects in inputDefects), len(merged))
+
+        merged.updateMetadataFromExposures(inputDefects)
+        merged.updateMetadata(camera=camera, detector=detector, filterName=None,
+                              setCalibId=True, setDate=True)
+
+        return pipeBase.Struct(
+            mergedDefects=merged,
+        )
@@ -0,0 +1,273 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["CptFusedIsrTask", "CptFusedIsrTaskConfig", "CptIsrBranchConfig"]
+
+import lsst.pex.config as pexConfig
+import lsst.pipe.base as pipeBase
+import lsst.pipe.base.connectionTypes as cT
+
+from lsst.ip.isr import isrFunctions
+
+from .isr import CptIsrTask, CptIsrTaskConfig, CptIsrTaskConnections
+
+
+class CptFusedIsrTaskConnections(CptIsrTaskConnections,
+                                 dimensions=("instrument", "exposure", "detector")):
+    def __init__(self, *, config=None):
+        super().__init__(config=config)
+
+        # The single-output connections are replaced by one output per
+        # configured branch.
+        for name in ("outputExposure", "preInterpExposure",
+                     "outputOssThumbnail", "outputFlattenedThumbnail"):
+            if name in self.outputs:
+                delattr(self, name)
+
+        for branchName, branch in config.branches.items():
+            setattr(self, branchName, cT.Output(
+                name=branch.outputName,
+                doc=f"Output ISR processed exposure for the {branchName} branch.",
+                storageClass="Exposure",
+                dimensions=["instrument", "exposure", "detector"],
+            ))
+
+
+class CptIsrBranchConfig(pexConfig.Config):
+    """Final-stage configuration for one output of CptFusedIsrTask.
+    """
+
+    outputName = pexConfig.Field(
+        dtype=str,
+        doc="Dataset type name for this output.",
+        default="",
+    )
+    doInterpolate = pexConfig.Field(
+        dtype=bool,
+        doc="Interpolate over masked pixels for this output?",
+        default=True,
+    )
+    maskListToInterpolate = pexConfig.ListField(
+        dtype=str,
+        doc="List of mask planes that should be interpolated.",
+        default=["SAT", "BAD"],
+    )
+    growSaturationFootprintSize = pexConfig.Field(
+        dtype=int,
+        doc="Number of pixels by which to grow the saturation footprints before interpolation.",
+        default=1,
+    )
+    maskPlanesToClear = pexConfig.ListField(
+        dtype=str,
+        doc="Mask planes to clear in this output, for outputs that should not carry "
+            "masks set by the shared stages (for example, SAT for PTC measurement).",
+        default=[],
+    )
+
+    def validate(self):
+        super().validate()
+        if self.outputName == "":
+            raise ValueError("Each branch must define an outputName.")
+
+
+class CptFusedIsrTaskConfig(CptIsrTaskConfig,
+                            pipelineConnections=CptFusedIsrTaskConnections):
+    """Configuration for ISR producing multiple outputs from one read.
+
+    The parent configuration defines the shared processing.  Each entry
+    in ``branches`` defines the final stages applied to produce one
+    output dataset.
+    """
+
+    branches = pexConfig.ConfigDictField(
+        keytype=str,
+        itemtype=CptIsrBranchConfig,
+        doc="Named output configurations.  The key is used as the output connection name.",
+        default={},
+    )
+    statisticsBranch = pexConfig.Field(
+        dtype=str,
+        doc="Branch whose final image is measured if doMeasureStatistics is set.  This "
+            "should be the branch producing the input of lsst.cp.pipe.CpFlatMeasureTask.",
+        default="",
+    )
+
+    def setDefaults(self):
+        super().setDefaults()
+        # Interpolation is applied per-branch.
+        self.doInterpolate = False
+        self.doSaturationInterpolation = False
+        self.doSaveInterpPixels = False
+
+    def validate(self):
+        super().validate()
+
+        if len(self.branches) == 0:
+            raise ValueError("At least one output branch must be configured.")
+        for branchName in self.branches:
+            if not branchName.isidentifier():
+                raise ValueError(f"Branch name {branchName} is not a valid connection name.")
+        if self.doMeasureStatistics and self.statisticsBranch not in self.branches:
+            raise ValueError(f"The statistics branch {self.statisticsBranch} is not a configured "
+                             "branch.")
+        if self.doInterpolate or self.doSaturationInterpolation:
+            raise ValueError("Interpolation must be configured per-branch, not in the shared stages.")
+
+
+class _StreamedOutputQuantumContext:
+    """Wrapper around a quantum context that allows outputs to be written
+    before the task returns.
+
+    Outputs written with `putBranch` are skipped when the results of the
+    task are written.
+
+    Parameters
+    ----------
+    butlerQC : `lsst.pipe.base.QuantumContext`
+        Quantum context to wrap.
+    outputRefs : `lsst.pipe.base.OutputQuantizedConnection`
+        References for the task outputs.
+    """
+
+    def __init__(self, butlerQC, outputRefs):
+        self._butlerQC = butlerQC
+        self._outputRefs = outputRefs
+        self._written = set()
+
+    def __getattr__(self, name):
+        return getattr(self._butlerQC, name)
+
+    def putBranch(self, branchName, exposure):
+        self._butlerQC.put(exposure, getattr(self._outputRefs, branchName))
+        self._written.add(branchName)
+
+    def put(self, values, dataset):
+        if isinstance(dataset, pipeBase.OutputQuantizedConnection):
+            remaining = pipeBase.OutputQuantizedConnection()
+            for name, refs in dataset:
+                if name not in self._written:
+                    setattr(remaining, name, refs)
+            dataset = remaining
+        self._butlerQC.put(values, dataset)
+
+
+class CptFusedIsrTask(CptIsrTask):
+    """ISR producing several differently configured outputs.
+
+    The shared processing is run once, with the exposure kept in memory,
+    and only the final stages that differ between the outputs are
+    repeated.  This allows, for example, ``cptFlatIsrExp`` and
+    ``cptPtcIsrExp`` to be produced from a single read of each flat.
+    """
+
+    ConfigClass = CptFusedIsrTaskConfig
+    _DefaultName = "cptFusedIsrTask"
+    _measureStatisticsInRun = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._streamedOutput = None
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        # Docstring inherited.
+        self._streamedOutput = _StreamedOutputQuantumContext(butlerQC, outputRefs)
+        try:
+            return super().runQuantum(self._streamedOutput, inputRefs, outputRefs)
+        finally:
+            self._streamedOutput = None
+
+    def run(self, ccdExposure, **kwargs):
+        """Run the shared ISR stages, and then each branch.
+
+        Parameters
+        ----------
+        ccdExposure : `lsst.afw.image.Exposure`
+            The raw or preprocessed exposure to process.
+        **kwargs
+            Additional calibration inputs, passed to
+            `lsst.ip.isr.IsrTask.run`.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            Result struct with one exposure per configured branch,
+            keyed by the branch name, and ``outputStatistics`` and
+            ``outputMoments`` if ``doMeasureStatistics`` and
+            ``doMeasureMoments`` are set.  The statistics are measured
+            from the final image of ``statisticsBranch``.  When run from
+            `runQuantum`, only the final branch is returned, and the
+            others are written as soon as they are complete.
+        """
+        shared = super().run(ccdExposure, **kwargs)
+        exposure = shared.exposure
+
+        outputs = {}
+        branchNames = list(self.config.branches.keys())
+        if self._streamedOutput is not None:
+            # Each branch is written before the next is processed, so the
+            # branches without interpolation can share the image, and the
+            # interpolating branches follow them.
+            branchNames.sort(key=lambda name: self.config.branches[name].doInterpolate)
+        for i, branchName in enumerate(branchNames):
+            branch = self.config.branches[branchName]
+            # The final branch can modify the shared exposure in place.
+            # Earlier branches need a copy if they are kept until the task
+            # returns, or if they interpolate, which would modify the image
+            # used by the following branches.
+            if i == len(branchNames) - 1:
+                branchExposure = exposure
+            elif self._streamedOutput is None or branch.doInterpolate:
+                branchExposure = exposure.clone()
+            else:
+                branchExposure = exposure
+
+            savedMask = None
+            if branch.maskPlanesToClear:
+                if branchExposure is exposure and i < len(branchNames) - 1:
+                    # Later branches share this mask.
+                    savedMask = exposure.mask.array.copy()
+                maskPlanes = branchExposure.mask.getMaskPlaneDict()
+                planes = [name for name in branch.maskPlanesToClear if name in maskPlanes]
+                if planes:
+                    branchExposure.mask.array &= ~branchExposure.mask.getPlaneBitMask(planes)
+
+            if branch.doInterpolate:
+                self.log.info("Interpolating masked pixels for branch %s.", branchName)
+                isrFunctions.interpolateFromMask(
+                    maskedImage=branchExposure.getMaskedImage(),
+                    fwhm=self.config.fwhm,
+                    growSaturatedFootprints=branch.growSaturationFootprintSize,
+                    maskNameList=list(branch.maskListToInterpolate),
+                )
+            if self.config.doMeasureStatistics and branchName == self.config.statisticsBranch:
+                outputs["outputStatistics"] = self.measureStatistics(branchExposure)
+            if self._streamedOutput is not None and i < len(branchNames) - 1:
+                with self.instrumentStep("write"):
+                    self._streamedOutput.putBranch(branchName, branchExposure)
+            else:
+                outputs[branchName] = branchExposure
+            if savedMask is not None:
+                exposure.mask.array[:, :] = savedMask
+
+        if self.config.doMeasureMoments:
+            outputs["outputMoments"] = shared.outputMoments
+
+        return pipeBase.Struct(**outputs)
@@ -0,0 +1,162 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["CptInstrumentationMixin"]
+
+import contextlib
+import functools
+import resource
+import threading
+import time
+
+
+def _ioBytes():
+    """Return the bytes read and written by this process.
+
+    Returns
+    -------
+    bytesRead : `int`
+        Bytes read from storage.
+    bytesWritten : `int`
+        Bytes written to storage.
+    """
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(":") for line in f if ":" in line)
+        return int(counters["read_bytes"]), int(counters["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        # Fall back to the block counts, which are in 512 byte units.
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return 512*usage.ru_inblock, 512*usage.ru_oublock
+
+
+def _maxRss():
+    """Return the peak resident set size of this process, in bytes.
+    """
+    # ru_maxrss is in kilobytes on Linux.
+    return 1024*resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class _InstrumentedQuantumContext:
+    """Wrapper around a quantum context that records the time spent
+    reading and writing datasets.
+
+    Parameters
+    ----------
+    butlerQC : `lsst.pipe.base.QuantumContext`
+        Quantum context to wrap.
+    task : `CptInstrumentationMixin`
+        Task to record the measurements in.
+    """
+
+    def __init__(self, butlerQC, task):
+        self._butlerQC = butlerQC
+        self._task = task
+
+    def __getattr__(self, name):
+        return getattr(self._butlerQC, name)
+
+    def get(self, *args, **kwargs):
+        with self._task.instrumentStep("read"):
+            return self._butlerQC.get(*args, **kwargs)
+
+    def put(self, *args, **kwargs):
+        with self._task.instrumentStep("write"):
+            return self._butlerQC.put(*args, **kwargs)
+
+
+class CptInstrumentationMixin:
+    """Mixin recording timing and resource use of task sub-steps.
+
+    For each step, the total wall and CPU time, the number of calls,
+    the bytes read and written, and the largest increase of the peak
+    resident set size of the process during a call are written to the
+    task metadata under ``instrumentation.<step>``.  Reading inputs
+    through `runQuantum`, running, and writing outputs are recorded as
+    the ``read``, ``run``, and ``write`` steps, including when a
+    subclass overrides ``run``; methods named in
+    ``_instrumentedMethods`` are recorded as additional steps.
+
+    The byte counts and the resident set size are measured for the
+    whole process, so they include other threads running at the same
+    time, such as the workers of a threaded step.  The increase of the
+    resident set size is zero for steps that stay below the peak
+    reached earlier in the process.
+    """
+
+    _instrumentedMethods = ()
+    """Names of methods to record as individual steps."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._instrumentationLock = threading.Lock()
+        self._instrumentation = {}
+        # ``run`` is wrapped on the instance, so that the step is recorded
+        # even if a subclass does not call the parent ``run``.
+        for name in ("run", ) + tuple(self._instrumentedMethods):
+            method = getattr(self, name, None)
+            if method is not None:
+                setattr(self, name, self._instrumentMethod(name, method))
+
+    def _instrumentMethod(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.instrumentStep(name):
+                return method(*args, **kwargs)
+        return wrapper
+
+    @contextlib.contextmanager
+    def instrumentStep(self, name):
+        """Record the resource use of a step.
+
+        Repeated calls for the same step are accumulated.
+
+        Parameters
+        ----------
+        name : `str`
+            Name of the step.
+        """
+        startWall = time.perf_counter()
+        startCpu = time.process_time()
+        startRead, startWritten = _ioBytes()
+        startMaxRss = _maxRss()
+        try:
+            yield
+        finally:
+            endRead, endWritten = _ioBytes()
+            values = {
+                "wallTime": time.perf_counter() - startWall,
+                "cpuTime": time.process_time() - startCpu,
+                "bytesRead": endRead - startRead,
+                "bytesWritten": endWritten - startWritten,
+                "calls": 1,
+            }
+            with self._instrumentationLock:
+                totals = self._instrumentation.setdefault(name, dict.fromkeys(values, 0))
+                for key, value in values.items():
+                    totals[key] += value
+                totals["peakRssIncrease"] = max(totals.get("peakRssIncrease", 0), _maxRss() - startMaxRss)
+                for key, value in totals.items():
+                    self.metadata[f"instrumentation.{name}.{key}"] = value
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        # Docstring inherited.
+        return super().runQuantum(_InstrumentedQuantumContext(butlerQC, self), inputRefs, outputRefs)
@@ -19,13 +19,313 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-__all__ = ["CptIsrTask", "CptIsrTaskConfig"]
+__all__ = ["CptCrosstalkTask", "CptIsrTask", "CptIsrTaskConfig",
+           "CptOverscanTask", "CptOverscanTaskConfig",
+           "makeExposureSelectionQuery"]
 
+import copy
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import lsst.afw.image as afwImage
+import lsst.afw.math as afwMath
 import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
 import lsst.pipe.base.connectionTypes as cT
+from lsst.daf.base import PropertyList
+
+from lsst.ip.isr import CrosstalkTask, IsrTask, IsrTaskConfig
+from lsst.ip.isr.vignette import maskVignettedRegion
+
+from .instrumentation import CptInstrumentationMixin
+
+
+def makeExposureSelectionQuery(config):
+    """Construct a butler query expression matching a task's selection.
+
+    This is the intended way to apply the exposure selection: supplying
+    the expression as the data query when building the quantum graph
+    (``pipetask qgraph -d``, or the ``cptExposureQuery.py`` script for
+    a full pipeline) prevents rejected exposures from becoming quanta
+    at all.  `CptIsrTaskConnections.adjustQuantum` applies the same
+    selection to each quantum, so graphs built without the query are
+    still correct, but contain a quantum for every raw.  The
+    ``observationReasonPattern`` and ``minCrosstalkSources`` selections
+    cannot be expressed in the query language, and are only applied in
+    ``adjustQuantum``.
+
+    Parameters
+    ----------
+    config : `CptIsrTaskConfig`
+        Configuration defining the exposure selection.
+
+    Returns
+    -------
+    query : `str`
+        Butler query expression.  An empty string is returned if the
+        configuration does not restrict the exposures.
+    """
+    clauses = []
+    if config.expectedExposureType != "":
+        clauses.append(f"exposure.observation_type = '{config.expectedExposureType.lower()}'")
+    if config.expectedObservationReason != "":
+        clauses.append(f"exposure.observation_reason = '{config.expectedObservationReason.lower()}'")
+    if config.minExposureTime is not None:
+        clauses.append(f"exposure.exposure_time >= {config.minExposureTime}")
+    if config.maxExposureTime is not None:
+        clauses.append(f"exposure.exposure_time <= {config.maxExposureTime}")
+    if len(config.exposureBlockList) > 0:
+        clauses.append(f"exposure NOT IN ({', '.join(str(e) for e in config.exposureBlockList)})")
+    return " AND ".join(clauses)
+
+
+def _rejectExposure(record, config):
+    """Apply the configurable exposure predicates.
+
+    Parameters
+    ----------
+    record : `lsst.daf.butler.DimensionRecord`
+        Exposure record to check.
+    config : `CptIsrTaskConfig`
+        Configuration defining the predicates.
+
+    Returns
+    -------
+    reason : `str` or `None`
+        Reason the exposure is rejected, or `None` if it is accepted.
+    """
+    if (config.expectedExposureType != ""
+            and record.observation_type != config.expectedExposureType.lower()):
+        return "Input exposure is not requested type."
+    if (config.expectedObservationReason != ""
+            and record.observation_reason != config.expectedObservationReason.lower()):
+        return "Input exposure is not requested observation reason."
+    if record.id in config.exposureBlockList:
+        return f"Exposure {record.id} is in the block list."
+    if config.minExposureTime is not None and record.exposure_time < config.minExposureTime:
+        return f"Exposure time {record.exposure_time} is below {config.minExposureTime}."
+    if config.maxExposureTime is not None and record.exposure_time > config.maxExposureTime:
+        return f"Exposure time {record.exposure_time} is above {config.maxExposureTime}."
+    if (config.observationReasonPattern != ""
+            and re.fullmatch(config.observationReasonPattern, record.observation_reason) is None):
+        return (f"Observation reason {record.observation_reason} does not match "
+                f"{config.observationReasonPattern}.")
+    return None
+
+
+def _estimateSize(obj, depth=2):
+    """Estimate the memory used by a calibration product.
+
+    Parameters
+    ----------
+    obj : `object`
+        Object to measure.
+    depth : `int`, optional
+        Number of levels of containers and attributes to descend into.
+
+    Returns
+    -------
+    size : `int`
+        Approximate size, in bytes.
+    """
+    if isinstance(obj, (afwImage.Exposure, afwImage.MaskedImage)):
+        maskedImage = obj.getMaskedImage() if isinstance(obj, afwImage.Exposure) else obj
+        return (maskedImage.image.array.nbytes + maskedImage.mask.array.nbytes
+                + maskedImage.variance.array.nbytes)
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if depth > 0:
+        if isinstance(obj, dict):
+            size += sum(_estimateSize(value, depth - 1) for value in obj.values())
+        elif isinstance(obj, (list, tuple)):
+            size += sum(_estimateSize(value, depth - 1) for value in obj)
+        elif hasattr(obj, "__dict__"):
+            size += sum(_estimateSize(value, depth - 1) for value in vars(obj).values())
+    return size
+
+
+class _CalibrationCache:
+    """Size-bounded, least-recently-used cache of calibration products.
+
+    The cache is shared by all tasks in a process, so that a worker
+    executing many quanta for the same detector reads each calibration
+    from the butler only once.  Cached objects are shared between
+    quanta, and must not be modified.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, ref, loader, maxBytes):
+        """Return a cached dataset, loading it if needed.
+
+        Parameters
+        ----------
+        ref : `lsst.daf.butler.DatasetRef`
+            Reference to the dataset.
+        loader : `callable`
+            Function returning the dataset if it is not cached.
+        maxBytes : `int`
+            Maximum total size of the cache.  Least recently used
+            entries are evicted to respect this limit.
+
+        Returns
+        -------
+        value : `object`
+            The dataset.
+        hit : `bool`
+            True if the dataset was found in the cache.
+        """
+        with self._lock:
+            if ref.id in self._entries:
+                self._entries.move_to_end(ref.id)
+                return self._entries[ref.id][0], True
+
+        value = loader()
+        size = _estimateSize(value)
+        with self._lock:
+            if size <= maxBytes and ref.id not in self._entries:
+                self._entries[ref.id] = (value, size)
+                self._size += size
+            while self._size > maxBytes:
+                _, (_, evictedSize) = self._entries.popitem(last=False)
+                self._size -= evictedSize
+        return value, False
+
+    def clear(self):
+        """Remove all entries from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_calibrationCache = _CalibrationCache()
+
 
-from lsst.ip.isr import IsrTask, IsrTaskConfig
+class _CachedCalibrationQuantumContext:
+    """Wrapper around a quantum context that reads the calibration
+    connections through the process-wide calibration cache.
+
+    Parameters
+    ----------
+    butlerQC : `lsst.pipe.base.QuantumContext`
+        Quantum context to wrap.
+    connectionNames : `set` [`str`]
+        Connections to read through the cache.
+    maxBytes : `int`
+        Maximum total size of the cache.
+    """
+
+    def __init__(self, butlerQC, connectionNames, maxBytes):
+        self._butlerQC = butlerQC
+        self._connectionNames = connectionNames
+        self._maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self._butlerQC, name)
+
+    def get(self, dataset):
+        if not isinstance(dataset, pipeBase.InputQuantizedConnection):
+            return self._butlerQC.get(dataset)
+
+        result = {}
+        for name, refs in dataset:
+            if refs is None:
+                continue
+            if name in self._connectionNames and not isinstance(refs, list):
+                result[name], hit = _calibrationCache.get(refs, lambda: self._butlerQC.get(refs),
+                                                          self._maxBytes)
+                if hit:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            else:
+                result[name] = self._butlerQC.get(refs)
+        return result
+
+
+class _CrosstalkSourceCutout:
+    """The amplifiers of one inter-detector crosstalk source that are
+    used by the crosstalk calibration.
+
+    Parameters
+    ----------
+    detector : `lsst.afw.cameraGeom.Detector`
+        Source detector.
+    ampImages : `dict` [`str`, `lsst.afw.image.MaskedImage`]
+        Image of each used amplifier, keyed by amplifier name, with the
+        origin of the full source exposure.
+    """
+
+    def __init__(self, detector, ampImages):
+        self.detector = detector
+        self.ampImages = ampImages
+
+
+class CptCrosstalkTask(CrosstalkTask):
+    """Crosstalk correction accepting inter-detector sources read as
+    amplifier cutouts.
+
+    Sources that are not cutouts are passed to
+    `lsst.ip.isr.CrosstalkTask` unchanged.
+    """
+
+    def run(self, exposure, crosstalk=None, crosstalkSources=None, isTrimmed=False, **kwargs):
+        # Docstring inherited.
+        cutouts = [source for source in crosstalkSources or []
+                   if isinstance(source, _CrosstalkSourceCutout)]
+        if not cutouts:
+            return super().run(exposure, crosstalk=crosstalk, crosstalkSources=crosstalkSources,
+                               isTrimmed=isTrimmed, **kwargs)
+
+        # The intra-detector correction is applied by the parent, from a
+        # shallow copy so that the (possibly cached) calibration is not
+        # modified.
+        intraChip = copy.copy(crosstalk)
+        intraChip.interChip = {}
+        super().run(exposure, crosstalk=intraChip, crosstalkSources=None, isTrimmed=isTrimmed, **kwargs)
+
+        for cutout in cutouts:
+            coeffs = np.asarray(crosstalk.interChip[cutout.detector.getName()])
+            self.subtractCutout(exposure, cutout, coeffs, crosstalk, isTrimmed)
+
+    def subtractCutout(self, exposure, cutout, coeffs, crosstalk, isTrimmed):
+        """Subtract the crosstalk from one inter-detector source.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Exposure to correct.  Modified in place.
+        cutout : `_CrosstalkSourceCutout`
+            Used amplifiers of the source detector.
+        coeffs : `numpy.ndarray`
+            Coefficients from each source amplifier (columns) into each
+            amplifier of ``exposure`` (rows).
+        crosstalk : `lsst.ip.isr.CrosstalkCalib`
+            Crosstalk calibration, used to orient the source amplifiers.
+        isTrimmed : `bool`
+            Have the exposure and source been trimmed?
+        """
+        detector = exposure.getDetector()
+        for tt, targetAmp in enumerate(detector):
+            targetBBox = targetAmp.getBBox() if isTrimmed else targetAmp.getRawDataBBox()
+            targetImage = exposure.image[targetBBox].array
+            for ss, sourceAmp in enumerate(cutout.detector):
+                if coeffs[tt, ss] == 0.0:
+                    continue
+                sourceImage = crosstalk.extractAmp(cutout.ampImages[sourceAmp.getName()], sourceAmp,
+                                                   targetAmp, isTrimmed)
+                targetImage -= coeffs[tt, ss]*sourceImage.image.array
 
 
 class CptIsrTaskConnections(pipeBase.PipelineTaskConnections,
@@ -192,6 +492,20 @@ class CptIsrTaskConnections(pipeBase.PipelineTaskConnections,
         storageClass="Thumbnail",
         dimensions=["instrument", "exposure", "detector"],
     )
+    outputStatistics = cT.Output(
+        name="cptIsrStatistics",
+        doc="Output clipped detector and amplifier statistics, in the format "
+            "produced by lsst.cp.pipe.CpFlatMeasureTask.",
+        storageClass="PropertyList",
+        dimensions=["instrument", "exposure", "detector"],
+    )
+
+    outputMoments = cT.Output(
+        name="cptIsrMoments",
+        doc="Output per-amplifier pixel moments.",
+        storageClass="StructuredDataDict",
+        dimensions=["instrument", "exposure", "detector"],
+    )
 
     def __init__(self, *, config=None):
         super().__init__(config=config)
@@ -240,6 +554,10 @@ class CptIsrTaskConnections(pipeBase.PipelineTaskConnections,
             del self.preInterpExposure
             del self.outputFlattenedThumbnail
             del self.outputOssThumbnail
+        if not config.doMeasureStatistics:
+            del self.outputStatistics
+        if not config.doMeasureMoments:
+            del self.outputMoments
         if not config.doSaveInterpPixels:
             if "preInterpExposure" in self.outputs:
                 del self.preInterpExposure
@@ -278,24 +596,18 @@ class CptIsrTaskConnections(pipeBase.PipelineTaskConnections,
         """
         inputConnection, inputExpRefs = inputs['ccdExposure']
         inputExpRef = inputExpRefs[0]
-        doWork = True
-
-        if self.config.expectedExposureType != "":
-            expected = self.config.expectedExposureType.lower()
-            observationType = inputExpRef.dataId.exposure.observation_type
-            if observationType != expected:
-                doWork = False
-
-        if self.config.expectedObservationReason != "":
-            expected = self.config.expectedObservationReason.lower()
-            observationReason = inputExpRef.dataId.exposure.observation_reason
-            if observationReason != expected:
-                doWork = False
-
-        if not doWork:
-            raise pipeBase.NoWorkFound("Input exposure is not requested type.")
-        else:
-            return super().adjustQuantum(inputs, outputs, label, data_id)
+
+        reason = _rejectExposure(inputExpRef.dataId.records["exposure"], self.config)
+        if reason is not None:
+            raise pipeBase.NoWorkFound(reason)
+
+        if "crosstalkSources" in inputs and self.config.minCrosstalkSources > 0:
+            _, sourceRefs = inputs["crosstalkSources"]
+            if len(sourceRefs) < self.config.minCrosstalkSources:
+                raise pipeBase.NoWorkFound(f"Only {len(sourceRefs)} crosstalk sources are available; "
+                                           f"{self.config.minCrosstalkSources} are required.")
+
+        return super().adjustQuantum(inputs, outputs, label, data_id)
 
 
 class CptIsrTaskConfig(IsrTaskConfig,
@@ -315,9 +627,147 @@ class CptIsrTaskConfig(IsrTaskConfig,
         doc="Further restrict processed exposures by observation_reason.",
         default="",
     )
+    minExposureTime = pexConfig.Field(
+        dtype=float,
+        doc="Minimum exposure time of exposures that should be processed.",
+        default=None,
+        optional=True,
+    )
+    maxExposureTime = pexConfig.Field(
+        dtype=float,
+        doc="Maximum exposure time of exposures that should be processed.",
+        default=None,
+        optional=True,
+    )
+    observationReasonPattern = pexConfig.Field(
+        dtype=str,
+        doc="Regular expression that the observation_reason of processed exposures must "
+            "fully match.  Not applied if empty.",
+        default="",
+    )
+    exposureBlockList = pexConfig.ListField(
+        dtype=int,
+        doc="Exposures that should not be processed.",
+        default=[],
+    )
+    minCrosstalkSources = pexConfig.Field(
+        dtype=int,
+        doc="Minimum number of inter-detector crosstalk sources required to process an "
+            "exposure.  Only used if doCrosstalk is set.",
+        default=0,
+    )
+    usePreprocessedInput = pexConfig.Field(
+        dtype=bool,
+        doc="Is the input exposure an overscan-corrected, assembled image "
+            "from CptOverscanTask?  If True, the amplifier-level steps are "
+            "skipped, as they have already been applied, and the saturation "
+            "and suspect masks are taken from the input.  The variance uses "
+            "the camera or PTC read noise, as it does for raw input unless "
+            "doEmpiricalReadNoise is set.",
+        default=False,
+    )
+    doCrosstalkSourceCutouts = pexConfig.Field(
+        dtype=bool,
+        doc="Read only the amplifiers of each inter-detector crosstalk source that have "
+            "non-zero coefficients, rather than the full exposure?  This is only used "
+            "if the crosstalk background method is 'None', and requires the crosstalk "
+            "subtask to be CptCrosstalkTask.",
+        default=True,
+    )
+    calibrationCacheSize = pexConfig.RangeField(
+        dtype=float,
+        doc="Size, in MB, of the in-process cache of calibration products shared between "
+            "quanta.  Least recently used products are evicted.  If zero, the cache is not used.",
+        default=0.0,
+        min=0.0,
+    )
+    calibrationCacheConnections = pexConfig.ListField(
+        dtype=str,
+        doc="Input connections to read through the calibration cache.",
+        default=["bias", "dark", "flat", "ptc", "defects", "linearizer", "crosstalk"],
+    )
+    outputQuantizeLevel = pexConfig.RangeField(
+        dtype=float,
+        doc="If non-zero, round the output image to steps of the per-amplifier noise divided "
+            "by this value, so that it can be efficiently compressed when written.  This "
+            "is lossy, and should only be used for outputs consumed by combines.",
+        default=0.0,
+        min=0.0,
+    )
+    doMeasureStatistics = pexConfig.Field(
+        dtype=bool,
+        doc="Measure clipped detector and amplifier statistics from the processed exposure "
+            "while it is in memory?  The output can be used in place of running "
+            "lsst.cp.pipe.CpFlatMeasureTask on the written exposure.",
+        default=False,
+    )
+    statisticsMaskNameList = pexConfig.ListField(
+        dtype=str,
+        doc="Mask planes to exclude from the statistics, as in the maskNameList of "
+            "lsst.cp.pipe.CpFlatMeasureTask.  Planes not present in the exposure mask are "
+            "ignored.",
+        default=["DETECTED", "BAD", "NO_DATA"],
+    )
+    statisticsDoVignette = pexConfig.Field(
+        dtype=bool,
+        doc="Exclude the region outside the valid polygon of the exposure from the "
+            "statistics, as in the doVignette of lsst.cp.pipe.CpFlatMeasureTask?",
+        default=True,
+    )
+    statisticsNumSigmaClip = pexConfig.Field(
+        dtype=float,
+        doc="Sigma clipping threshold for the statistics.",
+        default=3.0,
+    )
+    statisticsClipMaxIter = pexConfig.Field(
+        dtype=int,
+        doc="Maximum number of clipping iterations for the statistics.",
+        default=3,
+    )
+
+    doMeasureMoments = pexConfig.Field(
+        dtype=bool,
+        doc="Measure the per-amplifier pixel count and sum of the processed exposure, "
+            "for the PTC moments preselection?",
+        default=False,
+    )
+    momentsMaskNameList = pexConfig.ListField(
+        dtype=str,
+        doc="Mask planes to exclude from the moments.  Planes not present in the "
+            "exposure mask are ignored.",
+        default=["BAD", "SAT", "NO_DATA", "SUSPECT"],
+    )
+
+    def setDefaults(self):
+        super().setDefaults()
+        # Required for doCrosstalkSourceCutouts; other sources are passed
+        # to the ip_isr crosstalk task unchanged.
+        self.crosstalk.retarget(CptCrosstalkTask)
+
+    def validate(self):
+        super().validate()
 
+        if self.usePreprocessedInput:
+            if self.doOverscan or self.doAssembleCcd or self.doCrosstalk:
+                raise ValueError("Preprocessed input already has overscan, crosstalk, and assembly "
+                                 "applied; doOverscan, doCrosstalk, and doAssembleCcd must be False.")
+            if self.doSaturation or self.doSuspect:
+                raise ValueError("Saturation and suspect detection require unassembled input; "
+                                 "apply these in CptOverscanTask instead.")
+            if self.doEmpiricalReadNoise:
+                raise ValueError("The empirical read noise is measured from the overscan, which "
+                                 "preprocessed input no longer has.")
+        if self.observationReasonPattern != "":
+            try:
+                re.compile(self.observationReasonPattern)
+            except re.error as e:
+                raise ValueError(f"Invalid observationReasonPattern: {e}") from e
+        if (self.doCrosstalk and self.doCrosstalkSourceCutouts
+                and not issubclass(self.crosstalk.target, CptCrosstalkTask)):
+            raise ValueError("Crosstalk source cutouts can only be applied by CptCrosstalkTask.")
 
-class CptIsrTask(IsrTask):
+
+class CptIsrTask(CptInstrumentationMixin, IsrTask):
     """Alternate no-prerequisite input ISR Task.
 
     Regular processing should not use this task.
@@ -325,5 +775,277 @@ class CptIsrTask(IsrTask):
 
     ConfigClass = CptIsrTaskConfig
     _DefaultName = "cptIsrTask"
+    _instrumentedMethods = ("overscanCorrection", "saturationDetection", "maskDefect", "darkCorrection",
+                            "updateVariance", "maskNan", "loadCrosstalkSourceCutouts",
+                            "measureStatistics", "measureMoments", "quantizeImage")
+
+    _measureStatisticsInRun = True
+    """Measure the statistics of the exposure returned by `run`?  Subclasses
+    producing the measured image later set this to False.
+    """
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        # Docstring inherited.
+        if self.config.calibrationCacheSize == 0.0:
+            return super().runQuantum(butlerQC, inputRefs, outputRefs)
+
+        butlerQC = _CachedCalibrationQuantumContext(butlerQC,
+                                                    set(self.config.calibrationCacheConnections),
+                                                    int(self.config.calibrationCacheSize*1024**2))
+        try:
+            return super().runQuantum(butlerQC, inputRefs, outputRefs)
+        finally:
+            with self._instrumentationLock:
+                for key, value in (("hits", butlerQC.hits), ("misses", butlerQC.misses)):
+                    key = f"calibrationCache.{key}"
+                    self.metadata[key] = self.metadata.get(key, 0) + value
+
+    def run(self, ccdExposure, *, camera=None, crosstalk=None, crosstalkSources=None, **kwargs):
+        # Docstring inherited.
+        if (self.config.doCrosstalk and self.config.doCrosstalkSourceCutouts
+                and self.config.crosstalk.crosstalkBackgroundMethod == "None"):
+            crosstalkSources = self.loadCrosstalkSourceCutouts(crosstalk, crosstalkSources, camera)
+
+        result = super().run(ccdExposure, camera=camera, crosstalk=crosstalk,
+                             crosstalkSources=crosstalkSources, **kwargs)
+        if self.config.doMeasureStatistics and self._measureStatisticsInRun:
+            result.outputStatistics = self.measureStatistics(result.exposure)
+        if self.config.doMeasureMoments:
+            result.outputMoments = self.measureMoments(result.exposure)
+        if self.config.outputQuantizeLevel > 0.0:
+            self.quantizeImage(result.exposure)
+        return result
+
+    def measureMoments(self, exposure):
+        """Measure the pixel moments of each amplifier.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Processed exposure to measure.
+
+        Returns
+        -------
+        moments : `dict` [`str`, `dict`]
+            Moments for each amplifier, keyed by amplifier name.  Each
+            entry contains the number of unmasked pixels (``n``) and
+            their sum (``sum``).
+        """
+        maskPlanes = exposure.mask.getMaskPlaneDict()
+        maskVal = exposure.mask.getPlaneBitMask(
+            [name for name in self.config.momentsMaskNameList if name in maskPlanes]
+        )
+
+        moments = {}
+        for amp in exposure.getDetector():
+            ampImage = exposure.getMaskedImage()[amp.getBBox()]
+            image = ampImage.image.array
+            good = ((ampImage.mask.array & maskVal) == 0) & np.isfinite(image)
+
+            moments[amp.getName()] = {
+                "n": int(np.sum(good)),
+                "sum": float(np.sum(image[good], dtype=np.float64)),
+            }
+        return moments
+
+    def quantizeImage(self, exposure):
+        """Round the image to a fraction of the per-amplifier noise.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Exposure to quantize.  Modified in place.
+        """
+        maskVal = exposure.mask.getPlaneBitMask(
+            [name for name in ("BAD", "SAT", "NO_DATA") if name in exposure.mask.getMaskPlaneDict()]
+        )
+        statsControl = afwMath.StatisticsControl()
+        statsControl.setAndMask(maskVal)
+        for amp in exposure.getDetector():
+            ampImage = exposure.getMaskedImage()[amp.getBBox()]
+            sigma = afwMath.makeStatistics(ampImage, afwMath.STDEVCLIP, statsControl).getValue()
+            if not np.isfinite(sigma) or sigma <= 0.0:
+                self.log.warning("Not quantizing amplifier %s with noise %f.", amp.getName(), sigma)
+                continue
+            step = sigma/self.config.outputQuantizeLevel
+            array = ampImage.image.array
+            np.divide(array, step, out=array)
+            np.round(array, out=array)
+            np.multiply(array, step, out=array)
+
+    def measureStatistics(self, exposure):
+        """Measure clipped statistics of the processed exposure.
+
+        The detector and each amplifier are measured through views of
+        the in-memory image, so the exposure does not need to be
+        written and re-read to produce the flat statistics.  The
+        statistics should be measured from the image that
+        `lsst.cp.pipe.CpFlatMeasureTask` would read.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Processed exposure to measure.
+
+        Returns
+        -------
+        outputStats : `lsst.daf.base.PropertyList`
+            Clipped mean, standard deviation, and number of pixels for
+            the detector (``DETECTOR_MEDIAN``, ``DETECTOR_SIGMA``,
+            ``DETECTOR_N``) and each amplifier (``AMP_NAME_i``,
+            ``AMP_MEDIAN_i``, ``AMP_SIGMA_i``, ``AMP_N_i``), matching
+            the output of `lsst.cp.pipe.CpFlatMeasureTask`.
+        """
+        maskedImage = exposure.getMaskedImage()
+        polygon = exposure.getInfo().getValidPolygon()
+        if self.config.statisticsDoVignette and polygon is not None:
+            # The vignetted region is masked in a copy of the mask, so
+            # that the output exposure is unchanged.
+            maskedImage = afwImage.makeMaskedImage(maskedImage.image,
+                                                   afwImage.Mask(maskedImage.mask, deep=True),
+                                                   maskedImage.variance)
+            maskVignettedRegion(afwImage.makeExposure(maskedImage), polygon, vignetteValue=None,
+                                log=self.log)
+
+        maskPlanes = maskedImage.mask.getMaskPlaneDict()
+        maskVal = maskedImage.mask.getPlaneBitMask(
+            [name for name in self.config.statisticsMaskNameList if name in maskPlanes]
+        )
+        statsControl = afwMath.StatisticsControl(self.config.statisticsNumSigmaClip,
+                                                 self.config.statisticsClipMaxIter,
+                                                 maskVal)
+        statsFlags = afwMath.MEANCLIP | afwMath.STDEVCLIP | afwMath.NPOINT
+
+        outputStats = PropertyList()
+        stats = afwMath.makeStatistics(maskedImage, statsFlags, statsControl)
+        outputStats["DETECTOR_MEDIAN"] = stats.getValue(afwMath.MEANCLIP)
+        outputStats["DETECTOR_SIGMA"] = stats.getValue(afwMath.STDEVCLIP)
+        outputStats["DETECTOR_N"] = stats.getValue(afwMath.NPOINT)
+
+        for ampIdx, amp in enumerate(exposure.getDetector()):
+            ampImage = maskedImage[amp.getBBox()]
+            stats = afwMath.makeStatistics(ampImage, statsFlags, statsControl)
+            outputStats[f"AMP_NAME_{ampIdx}"] = amp.getName()
+            outputStats[f"AMP_MEDIAN_{ampIdx}"] = stats.getValue(afwMath.MEANCLIP)
+            outputStats[f"AMP_SIGMA_{ampIdx}"] = stats.getValue(afwMath.STDEVCLIP)
+            outputStats[f"AMP_N_{ampIdx}"] = stats.getValue(afwMath.NPOINT)
+        self.log.debug("Detector clipped mean: %f.", outputStats["DETECTOR_MEDIAN"])
+
+        return outputStats
+
+    def loadCrosstalkSourceCutouts(self, crosstalk, crosstalkSources, camera):
+        """Read only the crosstalk source amplifiers that are used.
+
+        Parameters
+        ----------
+        crosstalk : `lsst.ip.isr.CrosstalkCalib`
+            Crosstalk calibration containing the inter-detector
+            coefficients.
+        crosstalkSources : `list` [`lsst.daf.butler.DeferredDatasetHandle`]
+            Deferred handles to the overscan corrected source exposures.
+        camera : `lsst.afw.cameraGeom.Camera`
+            Camera used to identify the source detectors.
+
+        Returns
+        -------
+        sources : `list` [`_CrosstalkSourceCutout`]
+            Cutouts of the amplifiers of each source with non-zero
+            coefficients, applied by `CptCrosstalkTask`.  Sources that
+            are not used by the crosstalk calibration are dropped.
+        """
+        if not crosstalkSources or crosstalk is None or not crosstalk.interChip or camera is None:
+            return crosstalkSources
+
+        sources = []
+        for source in crosstalkSources:
+            if isinstance(source, afwImage.Exposure):
+                detector = source.getDetector()
+                bbox = source.getBBox()
+            else:
+                detector = camera[source.dataId["detector"]]
+                bbox = source.get(component="bbox")
+            coeffs = crosstalk.interChip.get(detector.getName())
+            if coeffs is None:
+                continue
+            # Columns are the source amplifiers.
+            used = np.any(np.asarray(coeffs) != 0.0, axis=0)
+
+            # Only the data region of each amplifier is used by the
+            # correction.
+            isTrimmed = (bbox == detector.getBBox())
+            ampImages = {}
+            for amp, isUsed in zip(detector, used):
+                if not isUsed:
+                    continue
+                ampBBox = amp.getBBox() if isTrimmed else amp.getRawDataBBox()
+                if isinstance(source, afwImage.Exposure):
+                    ampImages[amp.getName()] = source.getMaskedImage()[ampBBox]
+                else:
+                    ampImages[amp.getName()] = source.get(parameters={"bbox": ampBBox}).getMaskedImage()
+            self.log.debug("Read %d of %d amplifiers for crosstalk source %s.",
+                           len(ampImages), len(detector), detector.getName())
+            sources.append(_CrosstalkSourceCutout(detector, ampImages))
+
+        return sources
+
+
+class CptOverscanTaskConfig(CptIsrTaskConfig):
+    """Configuration for the shared overscan and assembly stage.
+    """
+
+    def setDefaults(self):
+        super().setDefaults()
+        self.connections.outputExposure = "cptOverscanExp"
+
+        self.doWrite = True
+        self.doOverscan = True
+        self.doAssembleCcd = True
+        # Saturation and suspect detection need the raw amplifier
+        # geometry, so they are done here, with the IsrTask defaults,
+        # and the masks are carried by the assembled exposure.
+
+        self.doBias = False
+        self.doVariance = False
+        self.doLinearize = False
+        self.doCrosstalk = False
+        self.doDefect = False
+        self.doNanMasking = False
+        self.doWidenSaturationTrails = False
+        self.doBrighterFatter = False
+        self.doDark = False
+        self.doStrayLight = False
+        self.doFlat = False
+        self.doFringe = False
+        self.doApplyGains = False
+        self.doInterpolate = False
+        self.doSaturationInterpolation = False
+        self.doSetBadRegions = False
+        self.doMeasureStatistics = False
+        self.doMeasureMoments = False
+        self.doMeasureBackground = False
+        self.doAttachTransmissionCurve = False
+        self.doIlluminationCorrection = False
+
+    def validate(self):
+        super().validate()
+
+        if self.usePreprocessedInput:
+            raise ValueError("CptOverscanTask must be run on raw input.")
+        if not self.doOverscan or not self.doAssembleCcd:
+            raise ValueError("CptOverscanTask requires doOverscan and doAssembleCcd.")
+
+
+class CptOverscanTask(CptIsrTask):
+    """Shared overscan correction and assembly stage.
+
+    This writes an overscan-corrected, assembled exposure once per raw,
+    which can then be used as the input to each `CptIsrTask` configured
+    with ``usePreprocessedInput=True``.  This avoids reading the raw and
+    repeating the amplifier-level processing for every calibration type
+    that uses the same exposure.
+    """
+
+    ConfigClass = CptOverscanTaskConfig
+    _DefaultName = "cptOverscanTask"
 
     pass
@@ -0,0 +1,79 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["solvePoisson"]
+
+import functools
+
+import numpy as np
+import scipy.fft
+
+
+@functools.lru_cache(maxsize=16)
+def _laplacianEigenvalues(shape):
+    """Eigenvalues of the 5-point discrete Laplacian with zero boundaries.
+
+    These are cached, as the same grid shape is used for every
+    amplifier and flux level.
+
+    Parameters
+    ----------
+    shape : `tuple` [`int`, `int`]
+        Shape of the interior grid.
+
+    Returns
+    -------
+    eigenvalues : `numpy.ndarray`
+        Eigenvalues in the basis of the type-I discrete sine transform.
+    """
+    ny, nx = shape
+    ky = 2.0*np.cos(np.pi*np.arange(1, ny + 1)/(ny + 1))
+    kx = 2.0*np.cos(np.pi*np.arange(1, nx + 1)/(nx + 1))
+    eigenvalues = ky[:, np.newaxis] + kx[np.newaxis, :] - 4.0
+    eigenvalues.flags.writeable = False
+    return eigenvalues
+
+
+def solvePoisson(source, workers=1):
+    """Solve the discrete Poisson equation with zero boundary conditions.
+
+    This solves the same system as the successive over-relaxation in
+    `lsst.cp.pipe.BrighterFatterKernelSolveTask.successiveOverRelax`,
+    the 5-point Laplacian of the solution equal to ``source`` with the
+    solution zero outside the grid, but does so directly with discrete
+    sine transforms.
+
+    Parameters
+    ----------
+    source : `numpy.ndarray`, (N, M)
+        Source term of the equation.
+    workers : `int`, optional
+        Number of threads to use for the transforms.
+
+    Returns
+    -------
+    solution : `numpy.ndarray`, (N, M)
+        Solution to the equation.
+    """
+    source = np.asarray(source, dtype=float)
+    eigenvalues = _laplacianEigenvalues(source.shape)
+    transformed = scipy.fft.dstn(source, type=1, workers=workers)
+    return scipy.fft.idstn(transformed/eigenvalues, type=1, workers=workers)
@@ -0,0 +1,282 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["evaluateAkimaBatched", "fitLinesBatched", "fitSplinesBatched"]
+
+import numpy as np
+
+
+def _solveBatched(design, ordinate, weights):
+    """Solve a stack of independent weighted least-squares problems.
+
+    Parameters
+    ----------
+    design : `numpy.ndarray`, (nAmp, nPoints, nParams)
+        Design matrix for each problem.
+    ordinate : `numpy.ndarray`, (nAmp, nPoints)
+        Values to fit.
+    weights : `numpy.ndarray`, (nAmp, nPoints)
+        Weights; zero for points that should not be used.
+
+    Returns
+    -------
+    params : `numpy.ndarray`, (nAmp, nParams)
+        Best-fit parameters.  Parameters that are not constrained by any
+        points are returned as zero.
+    """
+    weighted = design*weights[:, :, np.newaxis]
+    normal = np.einsum("apk,apl->akl", weighted, design)
+    vector = np.einsum("apk,ap->ak", weighted, ordinate)
+
+    # A small ridge term regularizes parameters without support.
+    diagonal = np.diagonal(normal, axis1=1, axis2=2)
+    scale = np.where(diagonal.max(axis=1) > 0, diagonal.max(axis=1), 1.0)
+    normal = normal + (1e-12*scale)[:, np.newaxis, np.newaxis]*np.eye(normal.shape[1])
+
+    return np.linalg.solve(normal, vector[:, :, np.newaxis])[:, :, 0]
+
+
+def fitLinesBatched(abscissa, ordinate, mask):
+    """Fit a straight line to each row of a stack of measurements.
+
+    Parameters
+    ----------
+    abscissa : `numpy.ndarray`, (nAmp, nPoints)
+        Independent variable (exposure time or photodiode charge).
+    ordinate : `numpy.ndarray`, (nAmp, nPoints)
+        Measured means.
+    mask : `numpy.ndarray`, (nAmp, nPoints)
+        Boolean mask, True for points to use.
+
+    Returns
+    -------
+    params : `numpy.ndarray`, (nAmp, 2)
+        Intercept and slope for each amplifier.
+    """
+    design = np.stack([np.ones_like(abscissa), abscissa], axis=-1)
+    ordinate = np.where(mask, ordinate, 0.0)
+    design = np.where(mask[:, :, np.newaxis], design, 0.0)
+    return _solveBatched(design, ordinate, mask.astype(float))
+
+
+def _hatDesign(values, nodes):
+    """Construct the linear interpolation basis for a set of nodes.
+
+    Parameters
+    ----------
+    values : `numpy.ndarray`, (nAmp, nPoints)
+        Positions at which to evaluate the basis.
+    nodes : `numpy.ndarray`, (nNodes,)
+        Increasing node positions, shared by all amplifiers.
+
+    Returns
+    -------
+    design : `numpy.ndarray`, (nAmp, nPoints, nNodes)
+        Design matrix.
+    """
+    index = np.clip(np.searchsorted(nodes, values, side="right") - 1, 0, len(nodes) - 2)
+    lower = nodes[index]
+    upper = nodes[index + 1]
+    fraction = np.clip((values - lower)/(upper - lower), 0.0, 1.0)
+
+    design = np.zeros(values.shape + (len(nodes), ))
+    np.put_along_axis(design, index[:, :, np.newaxis], (1.0 - fraction)[:, :, np.newaxis], axis=2)
+    np.put_along_axis(design, (index + 1)[:, :, np.newaxis], fraction[:, :, np.newaxis], axis=2)
+    return design
+
+
+def evaluateAkimaBatched(values, nodes, nodeValues):
+    """Evaluate an Akima spline for every amplifier at once.
+
+    This is the interpolant that `lsst.ip.isr.Linearizer` applies for
+    the ``Spline`` linearity type, using the same end conditions as the
+    GSL Akima spline.  Outside of the nodes the spline is extrapolated
+    linearly with the end-point slopes.
+
+    Parameters
+    ----------
+    values : `numpy.ndarray`, (nAmp, nPoints)
+        Positions at which to evaluate the spline.
+    nodes : `numpy.ndarray`, (nNodes,)
+        Increasing node positions, shared by all amplifiers.
+    nodeValues : `numpy.ndarray`, (nAmp, nNodes)
+        Spline values at each node.
+
+    Returns
+    -------
+    spline : `numpy.ndarray`, (nAmp, nPoints)
+        Spline evaluated at ``values``.
+    """
+    nNodes = len(nodes)
+    width = np.diff(nodes)
+    slope = np.diff(nodeValues, axis=1)/width
+
+    # Extend the segment slopes by two on each side, as in Akima (1970).
+    first = slope[:, 0:1]
+    second = slope[:, 1:2] if nNodes > 2 else first
+    last = slope[:, -1:]
+    penultimate = slope[:, -2:-1] if nNodes > 2 else last
+    extended = np.concatenate([3.0*first - 2.0*second, 2.0*first - second, slope,
+                               2.0*last - penultimate, 3.0*last - 2.0*penultimate], axis=1)
+    change = np.abs(np.diff(extended, axis=1))
+    weightBefore = change[:, 2:]
+    weightAfter = change[:, :nNodes]
+    totalWeight = weightBefore + weightAfter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tangent = np.where(totalWeight > 0,
+                           (weightBefore*extended[:, 1:nNodes + 1] + weightAfter*extended[:, 2:nNodes + 2])
+                           / totalWeight,
+                           0.5*(extended[:, 1:nNodes + 1] + extended[:, 2:nNodes + 2]))
+
+    index = np.clip(np.searchsorted(nodes, values, side="right") - 1, 0, nNodes - 2)
+    step = np.clip(values, nodes[0], nodes[-1]) - nodes[index]
+    h = width[index]
+    y0 = np.take_along_axis(nodeValues, index, axis=1)
+    m = np.take_along_axis(slope, index, axis=1)
+    t0 = np.take_along_axis(tangent, index, axis=1)
+    t1 = np.take_along_axis(tangent, index + 1, axis=1)
+    spline = (y0 + t0*step + (3.0*m - 2.0*t0 - t1)/h*step**2 + (t0 + t1 - 2.0*m)/h**2*step**3)
+
+    below = values < nodes[0]
+    above = values > nodes[-1]
+    spline = np.where(below, nodeValues[:, 0:1] + tangent[:, 0:1]*(values - nodes[0]), spline)
+    spline = np.where(above, nodeValues[:, -1:] + tangent[:, -1:]*(values - nodes[-1]), spline)
+    return spline
+
+
+def _akimaDesign(values, nodes, nodeValues):
+    """Linearize the Akima spline about a set of node values.
+
+    Parameters
+    ----------
+    values : `numpy.ndarray`, (nAmp, nPoints)
+        Positions at which to evaluate the spline.
+    nodes : `numpy.ndarray`, (nNodes,)
+        Increasing node positions, shared by all amplifiers.
+    nodeValues : `numpy.ndarray`, (nAmp, nNodes)
+        Node values to linearize about.
+
+    Returns
+    -------
+    design : `numpy.ndarray`, (nAmp, nPoints, nNodes)
+        Derivative of the spline with respect to each node value.
+    """
+    base = evaluateAkimaBatched(values, nodes, nodeValues)
+    delta = 1e-6*np.maximum(np.abs(nodeValues).max(axis=1), 1.0)
+
+    design = np.empty(values.shape + (len(nodes), ))
+    for k in range(len(nodes)):
+        shifted = nodeValues.copy()
+        shifted[:, k] += delta
+        design[:, :, k] = (evaluateAkimaBatched(values, nodes, shifted) - base)/delta[:, np.newaxis]
+    return design
+
+
+def fitSplinesBatched(positions, residuals, mask, nodes, nSigmaClip=3.0, maxIter=5, maxStepIter=10,
+                      stepTolerance=1e-8):
+    """Fit node values of an Akima spline to every amplifier at once.
+
+    All amplifiers share the same nodes, so the fit is a single
+    block-diagonal least-squares problem, which is solved for all
+    amplifiers together.  The Akima spline is not linear in its node
+    values, so the fit starts from the linear interpolation solution
+    and is refined with Gauss-Newton steps.  Outliers are rejected with
+    iterative sigma clipping applied to all amplifiers as array
+    operations.
+
+    Parameters
+    ----------
+    positions : `numpy.ndarray`, (nAmp, nPoints)
+        Positions (measured means) of the data.
+    residuals : `numpy.ndarray`, (nAmp, nPoints)
+        Residuals from the linear model to fit.
+    mask : `numpy.ndarray`, (nAmp, nPoints)
+        Boolean mask, True for points to use.
+    nodes : `numpy.ndarray`, (nNodes,)
+        Increasing node positions.
+    nSigmaClip : `float`, optional
+        Clipping threshold, in units of the robust standard deviation
+        of the fit residuals.
+    maxIter : `int`, optional
+        Maximum number of clipping iterations.
+    maxStepIter : `int`, optional
+        Maximum number of Gauss-Newton steps per clipping iteration.
+    stepTolerance : `float`, optional
+        Relative change in the node values below which the
+        Gauss-Newton steps are considered converged.
+
+    Returns
+    -------
+    values : `numpy.ndarray`, (nAmp, nNodes)
+        Fitted spline values at each node.
+    valueErrors : `numpy.ndarray`, (nAmp, nNodes)
+        Uncertainties on the node values, from the normal matrix scaled
+        by the reduced chi-squared of the fit.  Node values without
+        support are given NaN uncertainties.
+    mask : `numpy.ndarray`, (nAmp, nPoints)
+        Final mask of points used in the fit.
+    fitResiduals : `numpy.ndarray`, (nAmp, nPoints)
+        Residuals of the data from the fitted spline.
+    """
+    positions = np.where(mask, positions, nodes[0])
+    residuals = np.where(mask, residuals, 0.0)
+    hatDesign = _hatDesign(positions, nodes)
+    inputMask = mask
+    mask = mask.copy()
+
+    for _ in range(maxIter + 1):
+        # Start each iteration from the linear interpolation solution,
+        # which is robust to the clipping of the previous iteration.
+        values = _solveBatched(hatDesign, residuals, mask.astype(float))
+        for _ in range(maxStepIter):
+            design = _akimaDesign(positions, nodes, values)
+            model = evaluateAkimaBatched(positions, nodes, values)
+            step = _solveBatched(design, residuals - model, mask.astype(float))
+            values = values + step
+            scale = np.maximum(np.abs(values).max(axis=1), 1.0)
+            if np.all(np.abs(step).max(axis=1) <= stepTolerance*scale):
+                break
+        fitResiduals = residuals - evaluateAkimaBatched(positions, nodes, values)
+
+        masked = np.where(mask, fitResiduals, np.nan)
+        median = np.nanmedian(masked, axis=1, keepdims=True)
+        sigma = 1.4826*np.nanmedian(np.abs(masked - median), axis=1, keepdims=True)
+        # Clipped points may be restored as the fit improves.
+        newMask = inputMask & ((np.abs(fitResiduals - median) <= nSigmaClip*sigma) | ~(sigma > 0))
+        if np.array_equal(newMask, mask):
+            break
+        mask = newMask
+
+    design = _akimaDesign(positions, nodes, values)
+    weighted = design*mask[:, :, np.newaxis]
+    normal = np.einsum("apk,apl->akl", weighted, design)
+    nGood = mask.sum(axis=1)
+    chiSq = np.sum(np.where(mask, fitResiduals, 0.0)**2, axis=1)/np.maximum(nGood - len(nodes), 1)
+    supported = np.diagonal(normal, axis1=1, axis2=2) > 0
+    valueErrors = np.full(values.shape, np.nan)
+    for i in range(len(values)):
+        if not supported[i].any():
+            continue
+        block = normal[i][np.ix_(supported[i], supported[i])]
+        covariance = np.linalg.pinv(block)*chiSq[i]
+        valueErrors[i, supported[i]] = np.sqrt(np.clip(np.diagonal(covariance), 0.0, None))
+
+    return values, valueErrors, mask, fitResiduals
@@ -0,0 +1,174 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["makeLabelExposureQueries", "makePipelineExposureQuery", "main"]
+
+import argparse
+
+from lsst.pipe.base import Pipeline
+
+from .isr import CptIsrTaskConfig, makeExposureSelectionQuery
+
+
+def makeLabelExposureQueries(pipelineGraph):
+    """Construct the exposure selection query for each ISR label.
+
+    Parameters
+    ----------
+    pipelineGraph : `lsst.pipe.base.PipelineGraph`
+        Pipeline to inspect.
+
+    Returns
+    -------
+    queries : `dict` [`str`, `str`]
+        Butler query expression for each `CptIsrTask` label that
+        restricts its exposures, keyed by label.
+    """
+    queries = {}
+    for label, taskNode in pipelineGraph.tasks.items():
+        if isinstance(taskNode.config, CptIsrTaskConfig):
+            query = makeExposureSelectionQuery(taskNode.config)
+            if query != "":
+                queries[label] = query
+    return queries
+
+
+def _getConnections(taskNode):
+    """Construct the connections of a task.
+
+    Parameters
+    ----------
+    taskNode : `lsst.pipe.base.pipeline_graph.TaskNode`
+        Task to inspect.
+
+    Returns
+    -------
+    connections : `lsst.pipe.base.PipelineTaskConnections`
+        Connections for the task's configuration.
+    """
+    return taskNode.config.connections.ConnectionsClass(config=taskNode.config)
+
+
+def makePipelineExposureQuery(pipelineGraph):
+    """Construct a query restricting a pipeline to the exposures it uses.
+
+    The result is the union of the exposure selections of every
+    `CptIsrTask` label in the pipeline.  Supplying it as the data query
+    when building the quantum graph means the graph only contains the
+    exposures that at least one label will process, rather than every
+    raw for every label.
+
+    Every label that reads exposure-level datasets from outside the
+    pipeline, such as the raws, must be restricted for the query to be
+    safe.  A label is restricted if it has its own exposure selection;
+    if all of its outputs are only read by restricted labels, as for
+    the shared overscan stage and the exposure summary; or if all of
+    its exposure-level inputs are produced by restricted labels, as for
+    the PTC extraction.  Outputs include the metadata and log datasets
+    of each label.  If any label reading exposures from outside the
+    pipeline is unrestricted, such as the exposure summary run on its
+    own, no query is returned, as it would remove exposures that label
+    needs.
+
+    Parameters
+    ----------
+    pipelineGraph : `lsst.pipe.base.PipelineGraph`
+        Pipeline to inspect.
+
+    Returns
+    -------
+    query : `str`
+        Butler query expression.  An empty string is returned if no
+        label restricts its exposures, or if any label reading
+        exposures is unrestricted.
+    """
+    labelQueries = makeLabelExposureQueries(pipelineGraph)
+    if len(labelQueries) == 0:
+        return ""
+
+    inputs = {}
+    for label, taskNode in pipelineGraph.tasks.items():
+        connections = _getConnections(taskNode)
+        inputs[label] = {getattr(connections, name).name: getattr(connections, name).dimensions
+                         for name in connections.inputs}
+
+    # The producers include the metadata and log outputs, which are not
+    # in the task connections.
+    produced = {}
+    for datasetTypeName in pipelineGraph.dataset_types.keys():
+        producer = pipelineGraph.producer_of(datasetTypeName)
+        if producer is not None:
+            produced[datasetTypeName] = producer.label
+    outputs = {label: set() for label in inputs}
+    for datasetTypeName, label in produced.items():
+        outputs[label].add(datasetTypeName)
+
+    consumers = {}
+    for label, labelInputs in inputs.items():
+        for datasetTypeName in labelInputs:
+            consumers.setdefault(datasetTypeName, set()).add(label)
+
+    restricted = set(labelQueries)
+    changed = True
+    while changed:
+        changed = False
+        for label in inputs.keys() - restricted:
+            labelConsumers = set().union(*[consumers.get(name, set()) for name in outputs[label]])
+            exposureProducers = {produced.get(name) for name, dimensions in inputs[label].items()
+                                 if "exposure" in dimensions}
+            if ((len(labelConsumers) > 0 and labelConsumers <= restricted)
+                    or (len(exposureProducers) > 0 and exposureProducers <= restricted)):
+                restricted.add(label)
+                changed = True
+
+    for label in inputs.keys() - restricted:
+        for datasetTypeName, dimensions in inputs[label].items():
+            if "exposure" in dimensions and datasetTypeName not in produced:
+                return ""
+
+    queries = sorted(set(labelQueries.values()))
+    if len(queries) == 1:
+        return queries[0]
+    return " OR ".join(f"({query})" for query in queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print the exposure query for a cp_testing pipeline, for use with "
+                    "``pipetask qgraph -d``.",
+    )
+    parser.add_argument("pipeline", help="Pipeline file, optionally with a #subset.")
+    parser.add_argument("--where", default="", help="Additional query to combine with.")
+    parser.add_argument("--labels", action="store_true", help="Print the query for each label.")
+    args = parser.parse_args()
+
+    pipelineGraph = Pipeline.from_uri(args.pipeline).to_graph()
+    if args.labels:
+        for label, query in makeLabelExposureQueries(pipelineGraph).items():
+            print(f"{label}: {query}")
+        return
+
+    query = makePipelineExposureQuery(pipelineGraph)
+    if args.where and query:
+        query = f"({args.where}) AND ({query})"
+    elif args.where:
+        query = args.where
+    print(query)
@@ -0,0 +1,111 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["collectProfile", "formatProfile", "main"]
+
+import argparse
+from collections import defaultdict
+
+from lsst.daf.butler import Butler
+
+
+# Instrumentation quantities, and how they are combined across quanta.
+_SUMMED = ("calls", "wallTime", "cpuTime", "bytesRead", "bytesWritten")
+_MAXIMUM = ("peakRssIncrease", )
+
+
+def collectProfile(butler, collections, labels=None):
+    """Aggregate the instrumentation of every task quantum in a run.
+
+    Parameters
+    ----------
+    butler : `lsst.daf.butler.Butler`
+        Butler to read the metadata with.
+    collections : `str` or `list` [`str`]
+        Collections to search for ``<label>_metadata`` datasets.
+    labels : `list` [`str`], optional
+        Task labels to include.  All labels with metadata are included
+        if not set.
+
+    Returns
+    -------
+    profile : `dict` [`tuple` [`str`, `str`], `dict` [`str`, `float`]]
+        Aggregated values, keyed by (label, step).  Each entry also
+        contains the number of quanta as ``quanta``.
+    """
+    profile = defaultdict(lambda: dict.fromkeys(_SUMMED + _MAXIMUM + ("quanta", ), 0))
+    for datasetType in butler.registry.queryDatasetTypes("*_metadata"):
+        label = datasetType.name[:-len("_metadata")]
+        if labels and label not in labels:
+            continue
+        refs = butler.registry.queryDatasets(datasetType, collections=collections, findFirst=True)
+        for ref in refs:
+            metadata = butler.get(ref)
+            if label not in metadata or "instrumentation" not in metadata[label]:
+                continue
+            instrumentation = metadata[label]["instrumentation"]
+            for step in instrumentation.keys():
+                entry = profile[(label, step)]
+                entry["quanta"] += 1
+                for key in _SUMMED:
+                    entry[key] += instrumentation[step].get(key, 0)
+                for key in _MAXIMUM:
+                    entry[key] = max(entry[key], instrumentation[step].get(key, 0))
+    return dict(profile)
+
+
+def formatProfile(profile):
+    """Format an aggregated profile as a table.
+
+    Parameters
+    ----------
+    profile : `dict` [`tuple` [`str`, `str`], `dict` [`str`, `float`]]
+        Aggregated values, as returned by `collectProfile`.
+
+    Returns
+    -------
+    table : `str`
+        The formatted table, sorted by label and decreasing wall time.
+    """
+    header = (f"{'label':<28} {'step':<28} {'quanta':>7} {'calls':>9} {'wall [s]':>11} "
+              f"{'cpu [s]':>11} {'read [MB]':>11} {'written [MB]':>12} {'RSS incr [MB]':>13}")
+    lines = [header, "-"*len(header)]
+    order = sorted(profile.items(), key=lambda item: (item[0][0], -item[1]["wallTime"]))
+    for (label, step), entry in order:
+        lines.append(f"{label:<28} {step:<28} {entry['quanta']:>7d} {entry['calls']:>9d} "
+                     f"{entry['wallTime']:>11.2f} {entry['cpuTime']:>11.2f} "
+                     f"{entry['bytesRead']/2**20:>11.1f} {entry['bytesWritten']/2**20:>12.1f} "
+                     f"{entry['peakRssIncrease']/2**20:>13.1f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summarize the per-step instrumentation recorded by cp_testing tasks.",
+    )
+    parser.add_argument("repo", help="Butler repository to read.")
+    parser.add_argument("collections", nargs="+", help="Collections containing the task metadata.")
+    parser.add_argument("--labels", nargs="+", default=None, help="Task labels to include.")
+    args = parser.parse_args()
+
+    butler = Butler(args.repo)
+    profile = collectProfile(butler, args.collections, labels=args.labels)
+    print(formatProfile(profile))
@@ -0,0 +1,245 @@
+# This file is part of cp_testing.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["CptExposureSummaryTask", "CptExposureSummaryConfig"]
+
+import numpy as np
+from astropy.table import Table
+
+import lsst.pex.config as pexConfig
+import lsst.pipe.base as pipeBase
+import lsst.pipe.base.connectionTypes as cT
+
+from .instrumentation import CptInstrumentationMixin
+
+
+class CptExposureSummaryConnections(pipeBase.PipelineTaskConnections,
+                                    dimensions=("instrument", )):
+    inputExposures = cT.Input(
+        name="raw",
+        doc="Input exposures to summarize.  These are not read; only their data ids are used.",
+        storageClass="Exposure",
+        dimensions=("instrument", "exposure", "detector"),
+        multiple=True,
+        deferLoad=True,
+    )
+    inputPhotodiodeData = cT.Input(
+        name="photodiode",
+        doc="Photodiode readings data.",
+        storageClass="IsrCalib",
+        dimensions=("instrument", "exposure"),
+        multiple=True,
+        deferLoad=True,
+        minimum=0,
+    )
+
+    outputSummary = cT.Output(
+        name="cptExposureSummary",
+        doc="Per-exposure summary table.",
+        storageClass="ArrowAstropy",
+        dimensions=("instrument", ),
+    )
+
+    def __init__(self, *, config=None):
+        super().__init__(config=config)
+
+        if not config.doPhotodiode:
+            del self.inputPhotodiodeData
+
+    def adjustQuantum(self, inputs, outputs, label, data_id):
+        """Keep a single input exposure reference for each exposure.
+
+        Only the exposure records attached to the data ids are used, so
+        one detector's raw is sufficient for each exposure, and the
+        quantum does not carry a reference to every raw of every
+        detector.
+
+        Parameters
+        ----------
+        inputs : `dict`
+            Dictionary of input connections.
+        outputs : `Mapping`
+            Mapping of output datasets.
+        label : `str`
+            Task label.
+        data_id : `lsst.daf.butler.DataCoordinate`
+            Data id for this task execution.
+
+        Returns
+        -------
+        adjustedInputs : `Mapping`
+            Adjusted set of inputs.
+        adjustedOutputs : `Mapping`
+            Adjusted set of outputs.
+        """
+        connection, refs = inputs["inputExposures"]
+        byExposure = {}
+        for ref in sorted(refs, key=lambda ref: ref.dataId["detector"]):
+            byExposure.setdefault(ref.dataId["exposure"], ref)
+        adjusted = dict(inputs)
+        adjusted["inputExposures"] = (connection, list(byExposure.values()))
+        adjustedInputs, adjustedOutputs = super().adjustQuantum(adjusted, outputs, label, data_id)
+        # Connections that are not returned are left unchanged.
+        adjustedInputs = dict(adjustedInputs)
+        adjustedInputs["inputExposures"] = adjusted["inputExposures"]
+        return adjustedInputs, adjustedOutputs
+
+
+class CptExposureSummaryConfig(pipeBase.PipelineTaskConfig,
+                               pipelineConnections=CptExposureSummaryConnections):
+    doPhotodiode = pexConfig.Field(
+        dtype=bool,
+        doc="Include the integrated photodiode charge for each exposure?",
+        default=False,
+    )
+    photodiodeIntegrationMethod = pexConfig.ChoiceField(
+        dtype=str,
+        doc="Integration method for photodiode monitoring data.  This should match the "
+            "photodiodeIntegrationMethod of the PTC extraction reading the summary.",
+        default="DIRECT_SUM",
+        allowed={
+            "DIRECT_SUM": ("Use numpy's trapezoid integrator on all photodiode "
+                           "readout entries"),
+            "TRIMMED_SUM": ("Use numpy's trapezoid integrator, clipping the "
+                            "leading and trailing entries, which are "
+                            "nominally at zero baseline level."),
+            "CHARGE_SUM": ("Treat the current values as integrated charge "
+                           "over the sampling interval and simply sum "
+                           "the values, after subtracting a baseline level."),
+            "MEAN": ("Take the average of the photodiode measurements and "
+                     "multiply by the exposure time."),
+        },
+    )
+    photodiodeCurrentScale = pexConfig.Field(
+        dtype=float,
+        doc="Scale factor to apply to the photodiode current values for the CHARGE_SUM "
+            "integration method.  This should match the photodiodeCurrentScale of the PTC "
+            "extraction reading the summary.",
+        default=-1.0,
+    )
+
+
+class CptExposureSummaryTask(CptInstrumentationMixin, pipeBase.PipelineTask):
+    """Summarize the metadata of every exposure in a single table.
+
+    The exposure metadata is taken from the dimension records attached
+    to the input data ids, so no raw files are opened, and only one raw
+    reference is kept for each exposure.  The resulting table is used
+    by `lsst.cp.testing.CptExtractPtcTask` to take the photodiode charge
+    of each exposure pair without reading the photodiode data again.
+    """
+
+    ConfigClass = CptExposureSummaryConfig
+    _DefaultName = "cptExposureSummary"
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        records = {}
+        for ref in inputRefs.inputExposures:
+            exposureId = ref.dataId["exposure"]
+            if exposureId not in records:
+                records[exposureId] = ref.dataId.records["exposure"]
+
+        photodiodeCharges = {}
+        if self.config.doPhotodiode:
+            for ref in inputRefs.inputPhotodiodeData:
+                with self.instrumentStep("read"):
+                    photodiode = butlerQC.get(ref)
+                photodiodeCharges[ref.dataId["exposure"]] = self.integratePhotodiode(photodiode)
+
+        outputs = self.run(records, photodiodeCharges)
+        with self.instrumentStep("write"):
+            butlerQC.put(outputs, outputRefs)
+
+    def integratePhotodiode(self, photodiode):
+        """Integrate the photodiode data of one exposure.
+
+        The integration is configured as in
+        `lsst.cp.pipe.PhotonTransferCurveExtractTask`, so that the charges
+        in the summary match those the extraction would measure.
+
+        Parameters
+        ----------
+        photodiode : `lsst.ip.isr.PhotodiodeCalib`
+            Photodiode readings for the exposure.
+
+        Returns
+        -------
+        charge : `float`
+            Integrated photodiode charge.
+        """
+        photodiode.integrationMethod = self.config.photodiodeIntegrationMethod
+        photodiode.currentScale = self.config.photodiodeCurrentScale
+        return photodiode.integrate()
+
+    def run(self, exposureRecords, photodiodeCharges=None):
+        """Build the exposure summary table.
+
+        Parameters
+        ----------
+        exposureRecords : `dict` [`int`, `lsst.daf.butler.DimensionRecord`]
+            Exposure dimension records, keyed by exposure id.
+        photodiodeCharges : `dict` [`int`, `float`], optional
+            Integrated photodiode charge, keyed by exposure id.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            The results struct containing:
+
+            ``outputSummary``
+                Table with one row per exposure, sorted by exposure id
+                (`astropy.table.Table`).
+        """
+        if photodiodeCharges is None:
+            photodiodeCharges = {}
+
+        exposureIds = sorted(exposureRecords)
+        rows = []
+        for exposureId in exposureIds:
+            record = exposureRecords[exposureId]
+            rows.append((
+                exposureId,
+                record.observation_type,
+                record.observation_reason,
+                record.physical_filter,
+                record.exposure_time,
+                record.dark_time,
+                record.day_obs,
+                record.seq_num,
+                # The name of this field has changed between dimension
+                # universe versions.
+                getattr(record, "group", getattr(record, "group_name", "")),
+                photodiodeCharges.get(exposureId, np.nan),
+            ))
+
+        summary = Table(
+            rows=rows if rows else None,
+            names=("exposure", "observation_type", "observation_reason", "physical_filter",
+                   "exposure_time", "dark_time", "day_obs", "seq_num", "group",
+                   "photodiode_charge"),
+            dtype=(np.int64, str, str, str, np.float64, np.float64, np.int64, np.int64, str,
+                   np.float64),
+        )
+        self.log.info("Summarized %d exposures.", len(summary))
+
+        return pipeBase.Struct(
+            outputSummary=summary,
+        )
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Smoke test for the cp_testing protocolB benchmark."""
+
+import tempfile
+import unittest
+
+import lsst.utils.tests
+
+try:
+    import lsst.ctrl.mpexec  # noqa: F401
+    import lsst.obs.lsst  # noqa: F401
+    has_obs_lsst = True
+except ImportError:
+    has_obs_lsst = False
+
+
+@unittest.skipIf(not has_obs_lsst, reason="Cannot run the LSSTCam benchmark without obs_lsst")
+class BenchmarkTestCase(lsst.utils.tests.TestCase):
+    """Run the benchmark on a minimal synthetic repository."""
+
+    def test_benchmark(self):
+        from lsst.cp.testing.benchmark import makeSyntheticRepo, runBenchmark
+
+        with tempfile.TemporaryDirectory() as root:
+            butler = makeSyntheticRepo(root, detectors=[0], nBias=2, nDark=0, nFlat=0, nPtcPairs=0)
+            camera = butler.get("camera", instrument="LSSTCam", collections="LSSTCam/calib")
+            self.assertEqual(len(camera[0]), 2)
+
+            results = runBenchmark(root, detectors=[0], subsets=["summary", "bias"])
+
+        self.assertEqual(list(results), ["summary", "bias"])
+        self.assertEqual(results["summary"]["nQuanta"], 1)
+        # Overscan and batched ISR quanta for each bias, and one combine.
+        self.assertEqual(results["bias"]["nQuanta"], 5)
+        for result in results.values():
+            self.assertGreater(result["maxRss"], 0)
+        self.assertEqual(len(results["bias"]["quanta"]["cptBiasCombine"]), 1)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
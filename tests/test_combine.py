@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for cp_testing calibration combines."""
+
+import unittest
+
+import lsst.geom as geom
+import lsst.utils.tests
+
+from lsst.cp.testing import (CptCalibCombineByFilterConfig, CptCalibCombineByFilterTask,
+                             CptCalibCombineConfig, CptCalibCombineTask)
+
+
+class CptCalibCombineTestCase(lsst.utils.tests.TestCase):
+    """Test the memory budget of the combines."""
+
+    def test_subregion_rows(self):
+        bbox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(500, 1000))
+        subregionSize = geom.Extent2I(400, 200)
+        for ConfigClass, TaskClass in ((CptCalibCombineConfig, CptCalibCombineTask),
+                                       (CptCalibCombineByFilterConfig, CptCalibCombineByFilterTask)):
+            config = ConfigClass()
+            config.maxResidentMb = 1.0
+            task = TaskClass(config=config)
+
+            # 12 bytes per pixel for each of 10 inputs.
+            self.assertEqual(task.getSubregionRows(400, 10), 1024**2//(12*400*10))
+            self.assertEqual(task.getSubregionRows(400, 10**6), 1)
+
+            # Outside of run, subregionSize is used.
+            self.assertEqual({sub.getHeight() for sub in task._subBBoxIter(bbox, subregionSize)},
+                             {200})
+
+            task._nInputs = 10
+            rows = task.getSubregionRows(400, 10)
+            subBoxes = list(task._subBBoxIter(bbox, subregionSize))
+            self.assertTrue(all(sub.getHeight() <= rows for sub in subBoxes))
+            self.assertTrue(all(sub.getWidth() <= 400 for sub in subBoxes))
+            self.assertEqual(sum(sub.getArea() for sub in subBoxes), bbox.getArea())
+
+            # Without a budget, subregionSize is used.
+            task = TaskClass(config=ConfigClass())
+            task._nInputs = 10
+            self.assertEqual({sub.getHeight() for sub in task._subBBoxIter(bbox, subregionSize)},
+                             {200})
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for cp_testing covariance calculations."""
+
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+from lsst.cp.pipe.utils import CovFastFourierTransform
+
+from lsst.cp.testing.covariance import computeCovariancesFft
+
+
+def _directCovariance(image, weights, dx, dy):
+    """Direct calculation of the weighted covariance at a single lag."""
+    def _cov(dx, dy):
+        ny, nx = image.shape
+        y1 = slice(max(0, -dy), min(ny, ny - dy))
+        x1 = slice(max(0, -dx), min(nx, nx - dx))
+        y2 = slice(y1.start + dy, y1.stop + dy)
+        x2 = slice(x1.start + dx, x1.stop + dx)
+        w = weights[y1, x1]*weights[y2, x2]
+        nPix = w.sum()
+        a = image[y1, x1]*w
+        b = image[y2, x2]*w
+        return ((a*image[y2, x2]).sum() - a.sum()*b.sum()/nPix)/nPix, nPix
+
+    if dx == 0 or dy == 0:
+        return _cov(dx, dy)
+    cov1, nPix1 = _cov(dx, dy)
+    cov2, nPix2 = _cov(dx, -dy)
+    return 0.5*(cov1 + cov2), nPix1 + nPix2
+
+
+class CovarianceTestCase(lsst.utils.tests.TestCase):
+    """Test the vectorized FFT covariance calculation."""
+
+    def test_covariances(self):
+        rng = np.random.default_rng(12345)
+        image = rng.normal(size=(60, 50))
+        weights = (rng.random((60, 50)) > 0.1).astype(float)
+
+        covariances = computeCovariancesFft(image, weights, 3, workers=2)
+        self.assertEqual(len(covariances), 16)
+        for dx, dy, var, cov, nPix in covariances:
+            expectedCov, expectedNPix = _directCovariance(image, weights, dx, dy)
+            self.assertEqual(nPix, expectedNPix)
+            self.assertFloatsAlmostEqual(cov, expectedCov, atol=1e-10)
+            self.assertFloatsAlmostEqual(var, covariances[0][3], atol=1e-14)
+
+    def test_cp_pipe(self):
+        rng = np.random.default_rng(54321)
+        image = rng.normal(size=(70, 45))
+        weights = (rng.random((70, 45)) > 0.2).astype(float)
+        maxRange = 4
+
+        shape = np.array(image.shape) + maxRange
+        fftShape = tuple(2**(np.log2(shape).astype(int) + 1))
+        expected = CovFastFourierTransform(image, weights, fftShape, maxRange)
+        expected = expected.reportCovFastFourierTransform(maxRange)
+
+        covariances = computeCovariancesFft(image, weights, maxRange)
+        self.assertEqual(len(covariances), len(expected))
+        for measured, reference in zip(covariances, expected):
+            self.assertEqual(measured[0:2], tuple(reference[0:2]))
+            self.assertEqual(measured[4], reference[4])
+            self.assertFloatsAlmostEqual(np.array(measured[2:4]), np.array(reference[2:4]), atol=1e-10)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for cp_testing defect merging."""
+
+import unittest
+
+import numpy as np
+
+import lsst.afw.image as afwImage
+import lsst.cp.pipe as cpPipe
+import lsst.geom as geom
+import lsst.utils.tests
+from lsst.afw.cameraGeom.testUtils import CameraWrapper
+from lsst.ip.isr import Defects
+from lsst.pipe.base import InputQuantizedConnection, OutputQuantizedConnection
+
+from lsst.cp.testing import (CptMergeDefectsCombinedConfig, CptMergeDefectsCombinedTask,
+                             boxesToRuns, mergeRuns, runsToBoxes)
+
+
+def _rasterize(boxes, shape):
+    """Count the number of boxes covering each pixel."""
+    image = np.zeros(shape, dtype=int)
+    for x0, y0, x1, y1 in boxes:
+        image[y0:y1 + 1, x0:x1 + 1] += 1
+    return image
+
+
+class RunLengthDefectsTestCase(lsst.utils.tests.TestCase):
+    """Test the run-length encoded defect merging."""
+
+    def test_runs(self):
+        runs = boxesToRuns([(0, 0, 2, 1), (3, 1, 5, 1), (10, 0, 10, 0)])
+        self.assertEqual(runs, {0: [(0, 2), (10, 10)], 1: [(0, 5)]})
+        self.assertEqual(runsToBoxes(runs), [(0, 0, 2, 1), (10, 0, 10, 0), (3, 1, 5, 1)])
+
+    def test_merge(self):
+        rng = np.random.default_rng(2718)
+        shape = (40, 30)
+        for _ in range(50):
+            boxes = []
+            for _ in range(rng.integers(0, 15)):
+                x0 = int(rng.integers(0, shape[1]))
+                y0 = int(rng.integers(0, shape[0]))
+                x1 = min(shape[1] - 1, x0 + int(rng.integers(0, 6)))
+                y1 = min(shape[0] - 1, y0 + int(rng.integers(0, 6)))
+                boxes.append((x0, y0, x1, y1))
+            half = len(boxes)//2
+
+            merged = runsToBoxes(mergeRuns(boxesToRuns(boxes[:half]), boxesToRuns(boxes[half:])))
+
+            expected = _rasterize(boxes, shape) > 0
+            # The merged boxes cover the same pixels exactly once.
+            np.testing.assert_array_equal(_rasterize(merged, shape), expected.astype(int))
+
+
+class _FakeQuantumContext:
+    """Quantum context returning fixed inputs, and recording the outputs.
+    """
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.outputs = None
+
+    def get(self, dataset):
+        return self.inputs
+
+    def put(self, values, dataset):
+        self.outputs = values
+
+
+class CptMergeDefectsCombinedTestCase(lsst.utils.tests.TestCase):
+    """Test the defect merging task through runQuantum."""
+
+    def _makeDefects(self, detector, imageType, boxes):
+        defects = Defects([geom.Box2I(geom.Point2I(x0, y0), geom.Point2I(x1, y1))
+                           for x0, y0, x1, y1 in boxes])
+        defects.getMetadata()["DETECTOR"] = detector.getId()
+        defects.getMetadata()["cpDefectGenImageType"] = imageType
+        return defects
+
+    def _rasterizeDefects(self, defects, detector):
+        image = afwImage.MaskedImageF(detector.getBBox())
+        defects.maskPixels(image, "BAD")
+        return image.mask.array.copy()
+
+    def test_run_quantum(self):
+        camera = CameraWrapper().camera
+        detector = camera[0]
+        flatDefects = self._makeDefects(detector, "FLAT", [(0, 0, 4, 3), (10, 10, 12, 20)])
+        darkDefects = self._makeDefects(detector, "DARK", [(3, 2, 6, 5), (11, 15, 11, 30)])
+        emptyDefects = self._makeDefects(detector, "DARK", [])
+
+        inputs = {"inputFlatDefects": [flatDefects],
+                  "inputDarkDefects": [darkDefects, emptyDefects],
+                  "camera": camera}
+        config = CptMergeDefectsCombinedConfig()
+        config.combinationMode = "OR"
+        task = CptMergeDefectsCombinedTask(config=config)
+        butlerQC = _FakeQuantumContext(inputs)
+        task.runQuantum(butlerQC, InputQuantizedConnection(), OutputQuantizedConnection())
+        self.assertEqual(task.metadata["instrumentation.mergeDefectsOr.calls"], 1)
+        self.assertEqual(task.metadata["instrumentation.run.calls"], 1)
+
+        parentConfig = cpPipe.MergeDefectsCombinedConfig()
+        parentConfig.combinationMode = "OR"
+        parentTask = cpPipe.MergeDefectsCombinedTask(config=parentConfig)
+        expected = parentTask.run(inputDefects=[flatDefects, darkDefects], camera=camera)
+
+        np.testing.assert_array_equal(
+            self._rasterizeDefects(butlerQC.outputs.mergedDefects, detector),
+            self._rasterizeDefects(expected.mergedDefects, detector),
+        )
+
+        # The calibration metadata matches the parent task.
+        metadata = butlerQC.outputs.mergedDefects.getMetadata()
+        expectedMetadata = expected.mergedDefects.getMetadata()
+        for key in ("INSTRUME", "DETECTOR", "DET_NAME", "DET_SER", "CALIBID"):
+            self.assertEqual(metadata.get(key), expectedMetadata.get(key))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
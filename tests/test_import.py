@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test the lazy loading of the lsst.cp.testing package."""
+
+import importlib
+import json
+import subprocess
+import sys
+import unittest
+
+import lsst.utils.tests
+
+import lsst.cp.testing as cpTesting
+
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import lsst.cp.testing
+packageTime = time.perf_counter() - start
+getattr(lsst.cp.testing, {name!r})
+attributeTime = time.perf_counter() - start - packageTime
+print(json.dumps({{"packageTime": packageTime, "attributeTime": attributeTime,
+                  "modules": sorted(sys.modules)}}))
+"""
+
+
+def importInSubprocess(name):
+    """Import one attribute of lsst.cp.testing in a fresh interpreter.
+
+    Parameters
+    ----------
+    name : `str`
+        Attribute to access.
+
+    Returns
+    -------
+    result : `dict`
+        Import times, in seconds, and the loaded module names.
+    """
+    output = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT.format(name=name)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+class CptLazyImportTestCase(lsst.utils.tests.TestCase):
+    """Test that task modules are only imported when needed."""
+
+    def test_lazy_attributes(self):
+        for module, names in cpTesting._LAZY_MODULES.items():
+            self.assertEqual(sorted(names), sorted(importlib.import_module(
+                f"lsst.cp.testing.{module}").__all__))
+            for name in names:
+                self.assertIn(name, dir(cpTesting))
+        with self.assertRaises(AttributeError):
+            cpTesting.NotATask
+
+    def test_import_isolation(self):
+        result = importInSubprocess("CptIsrTask")
+        self.assertIn("lsst.cp.testing.isr", result["modules"])
+        self.assertNotIn("lsst.cp.testing.cp", result["modules"])
+        self.assertNotIn("lsst.cp.pipe", result["modules"],
+                         msg=f"CptIsrTask import took {result['attributeTime']:.2f}s")
+
+        result = importInSubprocess("solvePoisson")
+        self.assertNotIn("lsst.ip.isr", result["modules"],
+                         msg=f"solvePoisson import took {result['attributeTime']:.2f}s")
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for cp_testing task instrumentation."""
+
+import types
+import unittest
+
+import lsst.utils.tests
+from lsst.pipe.base import TaskMetadata
+
+from lsst.cp.testing import CptInstrumentationMixin
+from lsst.cp.testing.reportProfile import collectProfile, formatProfile
+
+
+class _BaseTask:
+    def __init__(self):
+        self.metadata = TaskMetadata()
+
+    def run(self, value):
+        return self.step(value) + 1
+
+    def step(self, value):
+        return 2*value
+
+
+class _InstrumentedTask(CptInstrumentationMixin, _BaseTask):
+    _instrumentedMethods = ("step", "missing")
+
+
+class _OverridingTask(CptInstrumentationMixin, _BaseTask):
+    def run(self, value):
+        # Does not call the parent run.
+        return value
+
+
+class InstrumentationTestCase(lsst.utils.tests.TestCase):
+    """Test the instrumentation recorded in the task metadata."""
+
+    def test_steps(self):
+        task = _InstrumentedTask()
+        self.assertEqual(task.run(3), 7)
+        self.assertEqual(task.step(1), 2)
+
+        self.assertEqual(task.metadata["instrumentation.run.calls"], 1)
+        self.assertEqual(task.metadata["instrumentation.step.calls"], 2)
+        for step in ("run", "step"):
+            for key in ("wallTime", "cpuTime", "bytesRead", "bytesWritten", "peakRssIncrease"):
+                self.assertGreaterEqual(task.metadata[f"instrumentation.{step}.{key}"], 0)
+        self.assertNotIn("instrumentation.missing.calls", task.metadata)
+        self.assertNotIn("missing", task.metadata["instrumentation"])
+
+        # An overriding run is recorded once.
+        task = _OverridingTask()
+        self.assertEqual(task.run(3), 3)
+        self.assertEqual(task.metadata["instrumentation.run.calls"], 1)
+
+        # The profile report reads the nested metadata of each quantum.
+        quantumMetadata = TaskMetadata()
+        quantumMetadata["instrumented"] = task.metadata
+        datasetType = types.SimpleNamespace(name="instrumented_metadata")
+        butler = types.SimpleNamespace(
+            registry=types.SimpleNamespace(
+                queryDatasetTypes=lambda expression: [datasetType],
+                queryDatasets=lambda datasetType, collections, findFirst: [None, None],
+            ),
+            get=lambda ref: quantumMetadata,
+        )
+        profile = collectProfile(butler, "run")
+        self.assertEqual(set(profile), {("instrumented", "run"), ("instrumented", "step")})
+        self.assertEqual(profile[("instrumented", "step")]["quanta"], 2)
+        self.assertEqual(profile[("instrumented", "step")]["calls"], 4)
+        self.assertEqual(profile[("instrumented", "run")]["peakRssIncrease"],
+                         task.metadata["instrumentation.run.peakRssIncrease"])
+        self.assertIn("RSS incr", formatProfile(profile))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,551 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for cp_testing ISR tasks."""
+
+import gc
+import types
+import unittest
+import unittest.mock
+import uuid
+
+import numpy as np
+
+import lsst.afw.geom as afwGeom
+import lsst.afw.image as afwImage
+import lsst.cp.pipe as cpPipe
+import lsst.geom
+import lsst.utils.tests
+from lsst.afw.cameraGeom.testUtils import DetectorWrapper
+from lsst.ip.isr import CrosstalkCalib, CrosstalkTask, isrMock
+from lsst.cp.testing.isr import _CalibrationCache, _rejectExposure
+from lsst.pipe.base import InputQuantizedConnection, OutputQuantizedConnection
+
+from lsst.cp.testing import (CptBatchedIsrTask, CptBatchedIsrTaskConfig, CptCrosstalkTask,
+                             CptFusedIsrTask, CptFusedIsrTaskConfig, CptIsrBranchConfig, CptIsrTask,
+                             CptIsrTaskConfig, CptOverscanTask, CptOverscanTaskConfig,
+                             makeExposureSelectionQuery)
+
+
+class CptIsrSelectionTestCase(lsst.utils.tests.TestCase):
+    """Test the exposure selection used by CptIsrTask."""
+
+    def test_selection_query(self):
+        config = CptIsrTaskConfig()
+        self.assertEqual(makeExposureSelectionQuery(config), "")
+
+        config.expectedExposureType = "FLAT"
+        self.assertEqual(makeExposureSelectionQuery(config),
+                         "exposure.observation_type = 'flat'")
+
+        config.expectedObservationReason = "ptc"
+        self.assertEqual(makeExposureSelectionQuery(config),
+                         "exposure.observation_type = 'flat' AND exposure.observation_reason = 'ptc'")
+
+        config.minExposureTime = 1.0
+        config.exposureBlockList = [2024010100012, 2024010100013]
+        self.assertEqual(makeExposureSelectionQuery(config),
+                         "exposure.observation_type = 'flat' AND exposure.observation_reason = 'ptc' "
+                         "AND exposure.exposure_time >= 1.0 "
+                         "AND exposure NOT IN (2024010100012, 2024010100013)")
+
+    def test_predicates(self):
+        config = CptIsrTaskConfig()
+        record = types.SimpleNamespace(id=2024010100012, exposure_time=15.0, observation_type="flat",
+                                       observation_reason="ptc_run")
+        self.assertIsNone(_rejectExposure(record, config))
+
+        config.expectedExposureType = "BIAS"
+        self.assertIsNotNone(_rejectExposure(record, config))
+        config.expectedExposureType = "FLAT"
+        self.assertIsNone(_rejectExposure(record, config))
+
+        config.observationReasonPattern = "ptc.*"
+        config.minExposureTime = 1.0
+        config.maxExposureTime = 30.0
+        self.assertIsNone(_rejectExposure(record, config))
+
+        config.maxExposureTime = 10.0
+        self.assertIsNotNone(_rejectExposure(record, config))
+        config.maxExposureTime = None
+
+        config.observationReasonPattern = "ptc"
+        self.assertIsNotNone(_rejectExposure(record, config))
+        config.observationReasonPattern = "["
+        with self.assertRaises(ValueError):
+            config.validate()
+        config.observationReasonPattern = ""
+
+        config.exposureBlockList = [2024010100012]
+        self.assertIsNotNone(_rejectExposure(record, config))
+
+
+class CptOverscanTestCase(lsst.utils.tests.TestCase):
+    """Test the shared overscan stage configuration."""
+
+    def test_overscan_config(self):
+        config = CptOverscanTaskConfig()
+        config.validate()
+        self.assertEqual(config.connections.outputExposure, "cptOverscanExp")
+
+        config.usePreprocessedInput = True
+        with self.assertRaises(ValueError):
+            config.validate()
+
+    @staticmethod
+    def _setCalibrationSteps(config):
+        # Only the steps that differ between the split and unsplit paths
+        # are run.
+        for name in ("doBias", "doDark", "doFlat", "doFringe", "doDefect", "doLinearize",
+                     "doCrosstalk", "doBrighterFatter", "doApplyGains", "doInterpolate",
+                     "doSaturationInterpolation", "doWrite"):
+            setattr(config, name, False)
+        config.doVariance = True
+
+    def test_split_matches_unsplit(self):
+        raw = isrMock.RawMock().run()
+        amp = raw.getDetector()[0]
+        self.assertTrue(np.isfinite(amp.getSaturation()))
+        raw.image[amp.getRawDataBBox()].array[10:20, 10:20] = 2.0*amp.getSaturation()
+
+        config = CptIsrTaskConfig()
+        self._setCalibrationSteps(config)
+        config.doOverscan = True
+        config.doAssembleCcd = True
+        unsplit = CptIsrTask(config=config).run(raw.clone()).exposure
+
+        overscanConfig = CptOverscanTaskConfig()
+        overscanConfig.doWrite = False
+        preprocessed = CptOverscanTask(config=overscanConfig).run(raw.clone()).exposure
+
+        config = CptIsrTaskConfig()
+        self._setCalibrationSteps(config)
+        config.usePreprocessedInput = True
+        config.doOverscan = False
+        config.doAssembleCcd = False
+        config.doSaturation = False
+        config.doSuspect = False
+        config.validate()
+        split = CptIsrTask(config=config).run(preprocessed).exposure
+
+        self.assertGreater(np.sum(split.mask.array & split.mask.getPlaneBitMask("SAT") > 0), 0)
+        np.testing.assert_array_equal(split.mask.array, unsplit.mask.array)
+        self.assertFloatsAlmostEqual(split.variance.array, unsplit.variance.array, rtol=1e-6)
+        self.assertFloatsAlmostEqual(split.image.array, unsplit.image.array, rtol=1e-6)
+
+    def test_preprocessed_input(self):
+        config = CptIsrTaskConfig()
+        config.usePreprocessedInput = True
+        with self.assertRaises(ValueError):
+            config.validate()
+
+        config.doOverscan = False
+        config.doAssembleCcd = False
+        config.doCrosstalk = False
+        config.doSaturation = False
+        config.doSuspect = False
+        config.doSaturationInterpolation = False
+        config.validate()
+
+
+class CptFusedIsrTestCase(lsst.utils.tests.TestCase):
+    """Test the multiple-output ISR configuration."""
+
+    def test_branches(self):
+        config = CptFusedIsrTaskConfig()
+        with self.assertRaises(ValueError):
+            config.validate()
+
+        config.branches["flatIsrExp"] = CptIsrBranchConfig()
+        config.branches["flatIsrExp"].outputName = "cptFlatIsrExp"
+        config.branches["ptcIsrExp"] = CptIsrBranchConfig()
+        config.branches["ptcIsrExp"].outputName = "cptPtcIsrExp"
+        config.branches["ptcIsrExp"].doInterpolate = False
+        config.validate()
+
+        connections = config.connections.ConnectionsClass(config=config)
+        self.assertEqual(set(connections.outputs), {"flatIsrExp", "ptcIsrExp"})
+        self.assertEqual(connections.ptcIsrExp.name, "cptPtcIsrExp")
+
+        config.doInterpolate = True
+        with self.assertRaises(ValueError):
+            config.validate()
+
+        config.doInterpolate = False
+
+        config.doMeasureStatistics = True
+        connections = config.connections.ConnectionsClass(config=config)
+        self.assertIn("outputStatistics", connections.outputs)
+        with self.assertRaises(ValueError):
+            config.validate()
+        config.statisticsBranch = "flatIsrExp"
+        config.validate()
+
+    @staticmethod
+    def _setSharedSteps(config):
+        for name in ("doBias", "doDark", "doFlat", "doFringe", "doDefect", "doLinearize",
+                     "doCrosstalk", "doBrighterFatter", "doApplyGains", "doSetBadRegions",
+                     "doSaturationInterpolation", "doWrite"):
+            setattr(config, name, False)
+        config.doOverscan = True
+        config.doAssembleCcd = True
+        config.doVariance = True
+
+    def test_branches_match_separate(self):
+        raw = isrMock.RawMock().run()
+        amp = raw.getDetector()[0]
+        raw.image[amp.getRawDataBBox()].array[10:20, 10:20] = 2.0*amp.getSaturation()
+
+        config = CptFusedIsrTaskConfig()
+        self._setSharedSteps(config)
+        config.branches["flatIsrExp"] = CptIsrBranchConfig()
+        config.branches["flatIsrExp"].outputName = "cptFlatIsrExp"
+        config.branches["ptcIsrExp"] = CptIsrBranchConfig()
+        config.branches["ptcIsrExp"].outputName = "cptPtcIsrExp"
+        config.branches["ptcIsrExp"].doInterpolate = False
+        config.branches["ptcIsrExp"].maskPlanesToClear = ["SAT"]
+        config.validate()
+        task = CptFusedIsrTask(config=config)
+        fused = task.run(raw.clone()).getDict()
+
+        # When run from runQuantum, the branches share the image, and
+        # each is written before the next is processed.
+        streamed = {}
+        task._streamedOutput = types.SimpleNamespace(
+            putBranch=lambda name, exposure: streamed.__setitem__(name, exposure.clone())
+        )
+        result = task.run(raw.clone()).getDict()
+        task._streamedOutput = None
+        self.assertEqual(set(streamed), {"ptcIsrExp"})
+        self.assertEqual(set(result), {"flatIsrExp"})
+        streamed.update(result)
+
+        flatConfig = CptIsrTaskConfig()
+        self._setSharedSteps(flatConfig)
+        flatConfig.doInterpolate = True
+        flatConfig.maskListToInterpolate = ["SAT", "BAD"]
+        flatConfig.growSaturationFootprintSize = 1
+        flat = CptIsrTask(config=flatConfig).run(raw.clone()).exposure
+
+        ptcConfig = CptIsrTaskConfig()
+        self._setSharedSteps(ptcConfig)
+        ptcConfig.doInterpolate = False
+        ptc = CptIsrTask(config=ptcConfig).run(raw.clone()).exposure
+        ptc.mask.array &= ~ptc.mask.getPlaneBitMask("SAT")
+
+        self.assertGreater(np.sum(flat.mask.array & flat.mask.getPlaneBitMask("INTRP") > 0), 0)
+        for outputs in (fused, streamed):
+            for branchName, separate in (("flatIsrExp", flat), ("ptcIsrExp", ptc)):
+                exposure = outputs[branchName]
+                np.testing.assert_array_equal(exposure.mask.array, separate.mask.array)
+                np.testing.assert_array_equal(exposure.image.array, separate.image.array)
+                np.testing.assert_array_equal(exposure.variance.array, separate.variance.array)
+
+    def test_statistics_match_flat_measure(self):
+        raw = isrMock.RawMock().run()
+        amp = raw.getDetector()[0]
+        raw.image[amp.getRawDataBBox()].array[10:20, 10:20] = 2.0*amp.getSaturation()
+
+        config = CptFusedIsrTaskConfig()
+        self._setSharedSteps(config)
+        config.doMeasureStatistics = True
+        config.statisticsBranch = "flatIsrExp"
+        config.branches["ptcIsrExp"] = CptIsrBranchConfig()
+        config.branches["ptcIsrExp"].outputName = "cptPtcIsrExp"
+        config.branches["ptcIsrExp"].doInterpolate = False
+        config.branches["ptcIsrExp"].maskPlanesToClear = ["SAT"]
+        config.branches["flatIsrExp"] = CptIsrBranchConfig()
+        config.branches["flatIsrExp"].outputName = "cptFlatIsrExp"
+        config.validate()
+        task = CptFusedIsrTask(config=config)
+
+        # CpFlatMeasureTask reads the written flat branch.
+        for streamed in (False, True):
+            outputs = {}
+            if streamed:
+                task._streamedOutput = types.SimpleNamespace(
+                    putBranch=lambda name, exposure: outputs.__setitem__(name, exposure.clone())
+                )
+            outputs.update(task.run(raw.clone()).getDict())
+            task._streamedOutput = None
+
+            expected = cpPipe.CpFlatMeasureTask().run(outputs["flatIsrExp"].clone()).outputStats
+            stats = outputs["outputStatistics"]
+            self.assertEqual(set(stats.names()), set(expected.names()))
+            for key in expected.names():
+                if key.startswith("AMP_NAME"):
+                    self.assertEqual(stats[key], expected[key])
+                else:
+                    self.assertFloatsAlmostEqual(stats[key], expected[key], rtol=1e-12)
+
+
+class CptCrosstalkCutoutTestCase(lsst.utils.tests.TestCase):
+    """Test the inter-detector crosstalk from source amplifier cutouts."""
+
+    class _Handle:
+        def __init__(self, exposure, detectorId):
+            self.exposure = exposure
+            self.dataId = {"detector": detectorId}
+            self.reads = []
+
+        def get(self, component=None, parameters=None):
+            if component == "bbox":
+                return self.exposure.getBBox()
+            self.reads.append(parameters["bbox"])
+            return self.exposure[parameters["bbox"]]
+
+    def test_cutouts_match_full(self):
+        detector = DetectorWrapper(name="target", id=0, numAmps=2).detector
+        sourceDetector = DetectorWrapper(name="source", id=1, numAmps=2).detector
+        rng = np.random.default_rng(12345)
+
+        exposure = afwImage.ExposureF(detector.getBBox())
+        exposure.setDetector(detector)
+        exposure.image.array[:, :] = rng.normal(1000.0, 10.0, exposure.image.array.shape)
+        source = afwImage.ExposureF(sourceDetector.getBBox())
+        source.setDetector(sourceDetector)
+        source.image.array[:, :] = rng.normal(20000.0, 100.0, source.image.array.shape)
+
+        # Only the first source amplifier is used.
+        crosstalk = CrosstalkCalib(detector=detector)
+        crosstalk.hasCrosstalk = True
+        crosstalk.interChip = {"source": np.array([[0.0, 0.0], [1e-3, 0.0]])}
+
+        expected = exposure.clone()
+        CrosstalkTask().run(expected, crosstalk=crosstalk, crosstalkSources=[source], isTrimmed=True)
+        self.assertGreater(np.max(np.abs(expected.image.array - exposure.image.array)), 1.0)
+
+        config = CptIsrTaskConfig()
+        config.doCrosstalk = True
+        config.validate()
+        task = CptIsrTask(config=config)
+        handle = self._Handle(source, 1)
+        sources = task.loadCrosstalkSourceCutouts(crosstalk, [handle], {1: sourceDetector})
+        self.assertEqual(handle.reads, [sourceDetector[0].getBBox()])
+        self.assertEqual(list(sources[0].ampImages), [sourceDetector[0].getName()])
+
+        task.crosstalk.run(exposure, crosstalk=crosstalk, crosstalkSources=sources, isTrimmed=True)
+        self.assertIsInstance(task.crosstalk, CptCrosstalkTask)
+        self.assertFloatsAlmostEqual(exposure.image.array, expected.image.array, rtol=1e-6)
+
+        config.crosstalk.retarget(CrosstalkTask)
+        with self.assertRaises(ValueError):
+            config.validate()
+
+
+class CptBatchedIsrTestCase(lsst.utils.tests.TestCase):
+    """Test the exposure-level ISR connections."""
+
+    def test_connections(self):
+        config = CptBatchedIsrTaskConfig()
+        config.doDark = True
+        config.doBrighterFatter = True
+        connections = config.connections.ConnectionsClass(config=config)
+        self.assertEqual(set(connections.dimensions), {"instrument", "exposure"})
+
+        self.assertTrue(connections.ccdExposure.multiple)
+        self.assertTrue(connections.dark.multiple)
+        self.assertTrue(connections.outputExposure.multiple)
+        self.assertFalse(connections.bfKernel.multiple)
+        self.assertFalse(connections.camera.multiple)
+        self.assertIn("dark", connections.batchedConnections)
+        self.assertNotIn("crosstalkSources", connections.batchedConnections)
+
+    def test_detector_tasks(self):
+        class DataId(dict):
+            dimensions = types.SimpleNamespace(names={"instrument", "exposure", "detector"})
+
+        def makeRef(detector):
+            return types.SimpleNamespace(dataId=DataId(instrument="Cam", exposure=1, detector=detector))
+
+        inputRefs = InputQuantizedConnection()
+        inputRefs.ccdExposure = [makeRef(detector) for detector in (0, 1, 2)]
+        outputRefs = OutputQuantizedConnection()
+        outputRefs.outputExposure = [makeRef(detector) for detector in (0, 1, 2)]
+
+        calls = {}
+
+        def runQuantum(task, butlerQC, detectorInputRefs, detectorOutputRefs):
+            detector = detectorInputRefs.ccdExposure.dataId["detector"]
+            self.assertEqual(detectorOutputRefs.outputExposure.dataId["detector"], detector)
+            # Only the identity is kept, so that the tasks are not kept
+            # alive by the test.
+            calls[detector] = id(task)
+            task.metadata["detector"] = detector
+            if detector == 1:
+                raise RuntimeError("Failed detector.")
+
+        config = CptBatchedIsrTaskConfig()
+        config.numThreads = 2
+        task = CptBatchedIsrTask(config=config)
+        with unittest.mock.patch.object(CptIsrTask, "runQuantum", runQuantum):
+            task.runQuantum(None, inputRefs, outputRefs)
+
+        # Each detector has its own task and metadata, and the failure of
+        # one detector does not stop the others.
+        self.assertEqual(len(set(calls.values())), 3)
+        self.assertEqual(list(task.metadata["failedDetectors"]), [1])
+        gc.collect()
+        fullMetadata = task.getFullMetadata()
+        for detector in calls:
+            self.assertEqual(fullMetadata[f"cptBatchedIsrTask:detector{detector}"]["detector"], detector)
+
+        # The per-detector tasks are reused by later quanta.
+        firstCalls = dict(calls)
+        with unittest.mock.patch.object(CptIsrTask, "runQuantum", runQuantum):
+            task.runQuantum(None, inputRefs, outputRefs)
+        self.assertEqual(calls, firstCalls)
+
+
+class CptCalibrationCacheTestCase(lsst.utils.tests.TestCase):
+    """Test the in-process calibration cache."""
+
+    def test_cache(self):
+        cache = _CalibrationCache()
+        refs = [types.SimpleNamespace(id=uuid.uuid4()) for _ in range(3)]
+        loads = []
+
+        def loader(i):
+            loads.append(i)
+            return np.zeros(1000, dtype=np.float64)
+
+        maxBytes = 20000
+        for i in (0, 1, 0):
+            value, hit = cache.get(refs[i], lambda: loader(i), maxBytes)
+            self.assertEqual(value.size, 1000)
+        self.assertEqual(loads, [0, 1])
+        self.assertTrue(cache.get(refs[0], lambda: loader(0), maxBytes)[1])
+
+        # Adding a third entry evicts the least recently used.
+        cache.get(refs[2], lambda: loader(2), maxBytes)
+        self.assertFalse(cache.get(refs[1], lambda: loader(1), maxBytes)[1])
+        self.assertEqual(loads, [0, 1, 2, 1])
+
+        # Entries larger than the cache are not kept.
+        cache.clear()
+        self.assertFalse(cache.get(refs[0], lambda: loader(0), 1000)[1])
+        self.assertFalse(cache.get(refs[0], lambda: loader(0), 1000)[1])
+
+
+class CptIsrStatisticsTestCase(lsst.utils.tests.TestCase):
+    """Test the in-memory flat statistics."""
+
+    def test_statistics(self):
+        detector = DetectorWrapper(numAmps=2).detector
+        exposure = afwImage.ExposureF(detector.getBBox())
+        exposure.setDetector(detector)
+        rng = np.random.default_rng(12345)
+        exposure.image.array[:, :] = rng.normal(1000.0, 10.0, exposure.image.array.shape)
+        exposure.image.array[0, :5] = 1e6
+        exposure.mask.array[0, :5] = exposure.mask.getPlaneBitMask("SAT")
+
+        config = CptIsrTaskConfig()
+        config.doMeasureStatistics = True
+        connections = config.connections.ConnectionsClass(config=config)
+        self.assertIn("outputStatistics", connections.outputs)
+
+        task = CptIsrTask(config=config)
+        stats = task.measureStatistics(exposure)
+        self.assertFloatsAlmostEqual(stats["DETECTOR_MEDIAN"], 1000.0, atol=1.0)
+        self.assertFloatsAlmostEqual(stats["DETECTOR_SIGMA"], 10.0, rtol=0.1)
+        self.assertLess(stats["DETECTOR_N"], exposure.image.array.size - 4)
+        for ampIdx, amp in enumerate(detector):
+            self.assertEqual(stats[f"AMP_NAME_{ampIdx}"], amp.getName())
+            self.assertFloatsAlmostEqual(stats[f"AMP_MEDIAN_{ampIdx}"], 1000.0, atol=2.0)
+
+        # The statistics match CpFlatMeasureTask, including the detected
+        # and vignetted pixels, without changing the exposure mask.
+        exposure.mask.addMaskPlane("DETECTED")
+        exposure.mask.array[5:10, 5:10] |= exposure.mask.getPlaneBitMask("DETECTED")
+        exposure.image.array[5:10, 5:10] = 1100.0
+        bbox = detector.getBBox()
+        exposure.getInfo().setValidPolygon(afwGeom.Polygon(lsst.geom.Box2D(
+            lsst.geom.Point2D(bbox.getMinX(), bbox.getMinY()),
+            lsst.geom.Point2D(bbox.getMaxX() - 10, bbox.getMaxY() + 1),
+        )))
+        mask = exposure.mask.array.copy()
+        nUnmasked = stats["DETECTOR_N"]
+        stats = task.measureStatistics(exposure)
+        np.testing.assert_array_equal(exposure.mask.array, mask)
+        self.assertLess(stats["DETECTOR_N"], nUnmasked - 25)
+        expected = cpPipe.CpFlatMeasureTask().run(exposure.clone()).outputStats
+        for key in expected.names():
+            if key.startswith("AMP_NAME"):
+                self.assertEqual(stats[key], expected[key])
+            else:
+                self.assertFloatsAlmostEqual(stats[key], expected[key], rtol=1e-12)
+
+    def test_moments(self):
+        detector = DetectorWrapper(numAmps=2).detector
+        exposure = afwImage.ExposureF(detector.getBBox())
+        exposure.setDetector(detector)
+        rng = np.random.default_rng(12345)
+        exposure.image.array[:, :] = rng.normal(1000.0, 10.0, exposure.image.array.shape)
+        exposure.mask.array[0, :5] = exposure.mask.getPlaneBitMask("SAT")
+
+        config = CptIsrTaskConfig()
+        config.doMeasureMoments = True
+        connections = config.connections.ConnectionsClass(config=config)
+        self.assertIn("outputMoments", connections.outputs)
+
+        task = CptIsrTask(config=config)
+        moments = task.measureMoments(exposure)
+        for amp in detector:
+            ampImage = exposure.getMaskedImage()[amp.getBBox()]
+            image = ampImage.image.array.astype(np.float64)
+            good = ampImage.mask.array == 0
+            ampMoments = moments[amp.getName()]
+            self.assertEqual(ampMoments["n"], np.sum(good))
+            self.assertFloatsAlmostEqual(ampMoments["sum"], np.sum(image[good]), rtol=1e-12)
+            self.assertEqual(set(ampMoments), {"n", "sum"})
+
+    def test_quantize(self):
+        detector = DetectorWrapper(numAmps=2).detector
+        exposure = afwImage.ExposureF(detector.getBBox())
+        exposure.setDetector(detector)
+        rng = np.random.default_rng(12345)
+        exposure.image.array[:, :] = rng.normal(1000.0, 10.0, exposure.image.array.shape)
+        original = exposure.image.array.copy()
+
+        config = CptIsrTaskConfig()
+        config.outputQuantizeLevel = 4.0
+        task = CptIsrTask(config=config)
+        task.quantizeImage(exposure)
+
+        # Values are rounded to steps of about 10/4, changing the noise by
+        # a small fraction.
+        self.assertLessEqual(np.max(np.abs(exposure.image.array - original)), 1.5)
+        self.assertLess(len(np.unique(exposure.image.array)), original.size/10)
+        self.assertFloatsAlmostEqual(np.std(exposure.image.array), np.std(original), rtol=0.01)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
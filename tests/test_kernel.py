@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for cp_testing kernel solutions."""
+
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+
+from lsst.cp.testing import solvePoisson
+
+
+class PoissonSolveTestCase(lsst.utils.tests.TestCase):
+    """Test the direct Poisson solution used for kernels."""
+
+    def test_solve(self):
+        rng = np.random.default_rng(31415)
+        for shape in [(17, 17), (9, 13)]:
+            source = rng.normal(size=shape)
+            solution = solvePoisson(source, workers=2)
+
+            # Apply the 5-point Laplacian with zero boundaries.
+            padded = np.pad(solution, 1)
+            laplacian = (padded[1:-1, :-2] + padded[1:-1, 2:] + padded[:-2, 1:-1]
+                         + padded[2:, 1:-1] - 4.0*padded[1:-1, 1:-1])
+            self.assertFloatsAlmostEqual(laplacian, source, atol=1e-12)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for cp_testing batched linearity fits."""
+
+import unittest
+
+import numpy as np
+
+import lsst.afw.math as afwMath
+import lsst.cp.pipe as cpPipe
+import lsst.utils.tests
+from lsst.ip.isr import PhotonTransferCurveDataset, isrMock
+
+from lsst.cp.testing import (CptLinearitySolveTask, CptPhotodiodeCorrectionTask, evaluateAkimaBatched,
+                             fitLinesBatched, fitSplinesBatched)
+
+
+class BatchedLinearityTestCase(lsst.utils.tests.TestCase):
+    """Test the batched line and spline fits."""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(54321)
+        self.nAmp = 4
+        self.nPoints = 200
+        self.positions = np.sort(self.rng.uniform(0.0, 100.0, (self.nAmp, self.nPoints)), axis=1)
+        self.nodes = np.linspace(0.0, 100.0, 6)
+
+    def test_lines(self):
+        ordinate = 3.0 + 2.0*self.positions
+        mask = np.ones_like(ordinate, dtype=bool)
+        mask[1, ::2] = False
+        ordinate[1, ::2] = 1e6
+
+        params = fitLinesBatched(self.positions, ordinate, mask)
+        self.assertFloatsAlmostEqual(params[:, 0], 3.0, atol=1e-6)
+        self.assertFloatsAlmostEqual(params[:, 1], 2.0, atol=1e-8)
+
+    def test_akima(self):
+        values = np.vstack([np.sin(self.nodes/(20.0 + i)) for i in range(self.nAmp)])
+        spline = evaluateAkimaBatched(self.positions, self.nodes, values)
+
+        # This is the interpolant applied by the Spline linearizer.
+        for i in range(self.nAmp):
+            interp = afwMath.makeInterpolate(self.nodes.tolist(), values[i].tolist(),
+                                             afwMath.stringToInterpStyle("AKIMA_SPLINE"))
+            expected = np.array(interp.interpolate(self.positions[i].tolist()))
+            self.assertFloatsAlmostEqual(spline[i], expected, atol=1e-12)
+
+    def test_splines(self):
+        truth = np.vstack([np.sin(self.nodes/(20.0 + i)) for i in range(self.nAmp)])
+        residuals = evaluateAkimaBatched(self.positions, self.nodes, truth)
+        residuals += self.rng.normal(0.0, 1e-3, residuals.shape)
+        # Add an outlier to each amplifier.
+        residuals[:, 10] += 10.0
+        mask = np.ones_like(residuals, dtype=bool)
+
+        values, valueErrors, fitMask, fitResiduals = fitSplinesBatched(self.positions, residuals, mask,
+                                                                       self.nodes)
+
+        self.assertFloatsAlmostEqual(values, truth, atol=5e-3)
+        self.assertTrue(np.all(valueErrors > 0))
+        self.assertTrue(np.all(valueErrors < 5e-3))
+        self.assertFalse(np.any(fitMask[:, 10]))
+        self.assertGreater(fitMask.sum(), 0.95*mask.sum())
+        self.assertEqual(fitResiduals.shape, residuals.shape)
+
+
+class PhotodiodeCorrectionTestCase(lsst.utils.tests.TestCase):
+    """Test the photodiode correction against the cp_pipe consumer."""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(12345)
+        self.camera = isrMock.IsrMock().getCamera()
+        self.detector = list(self.camera)[0]
+        self.inputDims = {"instrument": "fakeCam", "detector": self.detector.getId()}
+        self.ampNames = [amp.getName() for amp in self.detector]
+
+        nPairs = 20
+        charges = np.linspace(100.0, 1000.0, nPairs)
+        # The photodiode error is shared by every amplifier.
+        self.photoCharges = charges*(1.0 + self.rng.normal(0.0, 0.01, nPairs))
+        self.rawMeans = 50.0*charges
+        self.pairs = [(2*i, 2*i + 1) for i in range(nPairs)]
+
+    def _makePtc(self):
+        """Construct a PTC dataset and pass it through FITS I/O."""
+        ptc = PhotonTransferCurveDataset(self.ampNames, "FULLCOVARIANCE", covMatrixSide=1)
+        for ampName in self.ampNames:
+            ptc.inputExpIdPairs[ampName] = list(self.pairs)
+            ptc.rawExpTimes[ampName] = np.ones(len(self.pairs))
+            ptc.rawMeans[ampName] = self.rawMeans.copy()
+            ptc.rawVars[ampName] = self.rawMeans.copy()
+            ptc.photoCharges[ampName] = self.photoCharges.copy()
+            ptc.expIdMask[ampName] = np.ones(len(self.pairs), dtype=bool)
+            ptc.gain[ampName] = 1.0
+            ptc.noise[ampName] = 5.0
+        with lsst.utils.tests.getTempFilePath(".fits") as filename:
+            ptc.writeFits(filename)
+            return PhotonTransferCurveDataset.readFits(filename)
+
+    def _solveLinearity(self, inputPtc, photodiodeCorrection=None):
+        config = cpPipe.LinearitySolveTask.ConfigClass()
+        config.linearityType = "Polynomial"
+        config.polynomialOrder = 2
+        config.usePhotodiode = True
+        config.applyPhotodiodeCorrection = photodiodeCorrection is not None
+        task = cpPipe.LinearitySolveTask(config=config)
+        return task.run(inputPtc, None, self.camera, self.inputDims,
+                        inputPhotodiodeCorrection=photodiodeCorrection).outputLinearizer
+
+    def test_linearity_round_trip(self):
+        inputPtc = self._makePtc()
+        task = CptPhotodiodeCorrectionTask()
+        correction = task.run([inputPtc, self._makePtc()]).outputPhotodiodeCorrection
+        self.assertEqual(task.metadata["instrumentation.run.calls"], 1)
+
+        # Every pair that the linearity solve looks up has a correction.
+        for ampName in self.ampNames:
+            for pair in inputPtc.inputExpIdPairs[ampName]:
+                self.assertIn(str(pair), correction.abscissaCorrections)
+        self.assertEqual(len(correction.abscissaCorrections), len(self.pairs))
+
+        # Applying the correction removes the photodiode error.
+        uncorrected = self._solveLinearity(inputPtc)
+        corrected = self._solveLinearity(inputPtc, photodiodeCorrection=correction)
+        for ampName in self.ampNames:
+            self.assertLess(np.nanstd(corrected.fitResiduals[ampName]),
+                            0.1*np.nanstd(uncorrected.fitResiduals[ampName]))
+
+
+class BatchedSplineSolveTestCase(lsst.utils.tests.TestCase):
+    """Test the batched spline solve against the cp_pipe Spline solve."""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(24680)
+        self.camera = isrMock.IsrMock().getCamera()
+        self.detector = list(self.camera)[0]
+        self.inputDims = {"instrument": "fakeCam", "detector": self.detector.getId()}
+        self.ampNames = [amp.getName() for amp in self.detector]
+
+        nPairs = 40
+        self.pairs = [(2*i, 2*i + 1) for i in range(nPairs)]
+        self.photoCharges = np.linspace(20.0, 1000.0, nPairs)
+
+    def _makePtc(self):
+        """Construct a PTC dataset with a quadratic non-linearity, and
+        pass it through FITS I/O.
+        """
+        ptc = PhotonTransferCurveDataset(self.ampNames, "FULLCOVARIANCE", covMatrixSide=1)
+        for i, ampName in enumerate(self.ampNames):
+            flux = 50.0*self.photoCharges
+            means = flux - (1.0 + 0.1*i)*1e-6*flux**2
+            means += self.rng.normal(0.0, 0.5, len(means))
+            ptc.inputExpIdPairs[ampName] = list(self.pairs)
+            ptc.rawExpTimes[ampName] = np.ones(len(self.pairs))
+            ptc.rawMeans[ampName] = means
+            ptc.rawVars[ampName] = means.copy()
+            ptc.photoCharges[ampName] = self.photoCharges.copy()
+            ptc.expIdMask[ampName] = np.ones(len(self.pairs), dtype=bool)
+            ptc.gain[ampName] = 1.0
+            ptc.noise[ampName] = 5.0
+        with lsst.utils.tests.getTempFilePath(".fits") as filename:
+            ptc.writeFits(filename)
+            return PhotonTransferCurveDataset.readFits(filename)
+
+    def _solveLinearity(self, inputPtc, doBatchedSplineFit):
+        config = CptLinearitySolveTask.ConfigClass()
+        config.linearityType = "Spline"
+        config.usePhotodiode = True
+        config.doBatchedSplineFit = doBatchedSplineFit
+        task = CptLinearitySolveTask(config=config)
+        return task.run(inputPtc, self.camera, self.inputDims).outputLinearizer
+
+    @staticmethod
+    def _evaluate(linearizer, ampName, positions):
+        coeffs = np.asarray(linearizer.linearityCoeffs[ampName])
+        nNodes = len(coeffs)//2
+        interp = afwMath.makeInterpolate(coeffs[:nNodes].tolist(), coeffs[nNodes:].tolist(),
+                                         afwMath.stringToInterpStyle("AKIMA_SPLINE"))
+        return np.array(interp.interpolate(positions.tolist()))
+
+    def test_batched_spline(self):
+        inputPtc = self._makePtc()
+        batched = self._solveLinearity(inputPtc, True)
+        single = self._solveLinearity(inputPtc, False)
+
+        for ampName in self.ampNames:
+            self.assertEqual(batched.linearityType[ampName], "Spline")
+            self.assertEqual(single.linearityType[ampName], "Spline")
+
+            # The node placement may differ, so the corrections are
+            # compared where they are applied, over the measured range.
+            means = np.asarray(inputPtc.rawMeans[ampName])
+            positions = np.linspace(means.min(), means.max(), 100)
+            batchedCorrection = self._evaluate(batched, ampName, positions)
+            singleCorrection = self._evaluate(single, ampName, positions)
+            scale = np.max(np.abs(singleCorrection))
+            self.assertGreater(scale, 0.0)
+            self.assertFloatsAlmostEqual(batchedCorrection, singleCorrection, atol=0.02*scale)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -27,6 +27,7 @@ import unittest
 
 from lsst.pipe.base import Pipeline, PipelineGraph
 import lsst.utils
+from lsst.cp.testing.query import makePipelineExposureQuery
 
 try:
     import lsst.obs.lsst
@@ -60,6 +61,41 @@ class CalibrationPipelinesTestingTestCase(lsst.utils.tests.TestCase):
         for pipeline in ["protocolB.yaml"]:
             self._check_pipeline(os.path.join(self.pipeline_path, pipeline))
 
+    @unittest.skipIf(not has_obs_lsst, reason="Cannot test LSSTCam pipelines without obs_lsst")
+    def test_exposure_query(self):
+        pipeline_file = os.path.join(self.pipeline_path, "protocolB.yaml")
+        graph = Pipeline.fromFile(f"{pipeline_file}#bias").to_graph()
+        self.assertEqual(makePipelineExposureQuery(graph), "exposure.observation_type = 'bias'")
+
+        graph = Pipeline.fromFile(f"{pipeline_file}#bias,dark").to_graph()
+        self.assertEqual(makePipelineExposureQuery(graph),
+                         "(exposure.observation_type = 'bias') OR (exposure.observation_type = 'dark')")
+
+        # The PTC extraction reads the ISR metadata, which is produced in
+        # the pipeline.
+        graph = Pipeline.fromFile(f"{pipeline_file}#ptc").to_graph()
+        self.assertEqual(makePipelineExposureQuery(graph), "exposure.observation_type = 'flat'")
+
+        # The summary is only read by the PTC extraction, which only uses
+        # the selected flats.
+        graph = Pipeline.fromFile(pipeline_file).to_graph()
+        self.assertEqual(makePipelineExposureQuery(graph),
+                         "(exposure.observation_type = 'bias') OR (exposure.observation_type = 'dark') "
+                         "OR (exposure.observation_type = 'flat')")
+
+        graph = Pipeline.fromFile(f"{pipeline_file}#summary").to_graph()
+        self.assertEqual(makePipelineExposureQuery(graph), "")
+
+        # The summary reads every exposure, so the query would remove
+        # exposures it needs.
+        graph = Pipeline.fromFile(f"{pipeline_file}#summary,bias").to_graph()
+        self.assertEqual(makePipelineExposureQuery(graph), "")
+
+        # An ISR label without a selection reads every raw.
+        pipeline = Pipeline.fromFile(f"{pipeline_file}#bias")
+        pipeline.addConfigOverride("cptBiasIsr", "expectedExposureType", "")
+        self.assertEqual(makePipelineExposureQuery(pipeline.to_graph()), "")
+
 
 class TestMemory(lsst.utils.tests.MemoryTestCase):
     pass
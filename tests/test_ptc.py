@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for cp_testing PTC tasks."""
+
+import types
+import unittest
+import unittest.mock
+
+import numpy as np
+
+import lsst.afw.image as afwImage
+import lsst.cp.pipe as cpPipe
+import lsst.geom as geom
+import lsst.utils.tests
+from lsst.afw.cameraGeom.testUtils import DetectorWrapper
+from lsst.ip.isr import PhotonTransferCurveDataset
+from lsst.pipe.base import InputQuantizedConnection, OutputQuantizedConnection, TaskMetadata
+
+from lsst.cp.testing import CptExtractPtcTask, CptExtractPtcTaskConfig, CptSolvePtcTask, CptSolvePtcTaskConfig
+from lsst.cp.testing.cp import _ampAttributes
+
+
+class _DataId(dict):
+    dimensions = types.SimpleNamespace(names={"instrument", "exposure", "detector"})
+
+
+def _makeRef(exposure, name="ref"):
+    ref = types.SimpleNamespace(name=name, dataId=_DataId(instrument="Cam", exposure=exposure, detector=0))
+    # Deferred handles and references are both accepted.
+    ref.datasetRef = ref
+    return ref
+
+
+class _QuantumContext:
+    """Quantum context reading from and writing to dictionaries keyed by
+    exposure.
+
+    Parameters
+    ----------
+    priors : `dict` [`int`, `object`], optional
+        Prior partial datasets, keyed by exposure.
+    exposures : `dict` [`int`, `lsst.afw.image.Exposure`], optional
+        Input exposures, keyed by exposure.
+    """
+
+    def __init__(self, priors=None, exposures=None):
+        self.priors = priors if priors is not None else {}
+        self.exposures = exposures if exposures is not None else {}
+        self.outputs = {}
+
+    def get(self, dataset, **kwargs):
+        if isinstance(dataset, InputQuantizedConnection):
+            return {name: [self.get(ref) for ref in refs] for name, refs in dataset}
+        exposure = dataset.dataId["exposure"]
+        if dataset.name == "inputExp":
+            return _Handle(self.exposures[exposure], dataset.dataId)
+        if dataset.name == "taskMetadata":
+            return TaskMetadata()
+        return self.priors[exposure]
+
+    def put(self, values, dataset):
+        if isinstance(dataset, OutputQuantizedConnection):
+            for name, refs in dataset:
+                for value, ref in zip(getattr(values, name), refs):
+                    self.put(value, ref)
+            return
+        self.outputs[dataset.dataId["exposure"]] = values
+
+
+class _Handle:
+    """Deferred dataset handle for an in-memory exposure.
+    """
+
+    def __init__(self, exposure, dataId):
+        self.exposure = exposure
+        self.dataId = dataId
+
+    def get(self, component=None, **kwargs):
+        if component == "visitInfo":
+            return self.exposure.getInfo().getVisitInfo()
+        if component == "metadata":
+            return self.exposure.getMetadata()
+        if component == "detector":
+            return self.exposure.getDetector()
+        return self.exposure
+
+
+def _extract(task, butlerQC, inputRefs, outputRefs):
+    """Stand-in for the cp_pipe extraction, pairing sequential exposures.
+
+    As for cp_pipe, the pair is written to the second exposure, and a
+    dummy to the first and to an unpaired exposure.
+    """
+    exposures = sorted(ref.dataId["exposure"] for ref in inputRefs.inputExp)
+    pairs = dict(zip(exposures[1::2], exposures[::2]))
+    for ref in outputRefs.outputCovariances:
+        exposure = ref.dataId["exposure"]
+        if exposure in pairs:
+            butlerQC.put(types.SimpleNamespace(ptcFitType="PARTIAL",
+                                               inputExpIdPairs={"C00": [(pairs[exposure], exposure)]}), ref)
+        else:
+            butlerQC.put(types.SimpleNamespace(ptcFitType="DUMMY", exposure=exposure), ref)
+
+
+class CptExtractPtcIncrementalTestCase(lsst.utils.tests.TestCase):
+    """Test the incremental PTC extraction."""
+
+    @staticmethod
+    def _makeRefs(exposures, priors=None, withMetadata=False):
+        inputRefs = InputQuantizedConnection()
+        inputRefs.inputExp = [_makeRef(exposure, "inputExp") for exposure in exposures]
+        if withMetadata:
+            inputRefs.taskMetadata = [_makeRef(exposure, "taskMetadata") for exposure in exposures]
+        if priors is not None:
+            inputRefs.inputPriorCovariances = [_makeRef(exposure) for exposure in priors]
+        outputRefs = OutputQuantizedConnection()
+        outputRefs.outputCovariances = [_makeRef(exposure) for exposure in exposures]
+        return inputRefs, outputRefs
+
+    def _run(self, exposures, priors=None):
+        config = CptExtractPtcTaskConfig()
+        config.doIncremental = priors is not None
+        task = CptExtractPtcTask(config=config)
+
+        inputRefs, outputRefs = self._makeRefs(exposures, priors)
+        butlerQC = _QuantumContext(priors)
+        with unittest.mock.patch.object(cpPipe.PhotonTransferCurveExtractTask, "runQuantum",
+                                        side_effect=_extract, autospec=True) as extract:
+            task.runQuantum(butlerQC, inputRefs, outputRefs)
+        return butlerQC.outputs, extract.call_count
+
+    def test_incremental(self):
+        exposures = list(range(1, 10))
+        full, _ = self._run(exposures)
+
+        # Exposure 5 is unpaired in the prior run, and is paired with
+        # exposure 6 once it is available.
+        prior, _ = self._run(exposures[:5])
+        self.assertEqual(prior[5].ptcFitType, "DUMMY")
+        incremental, nCalls = self._run(exposures, priors=prior)
+        self.assertEqual(incremental, full)
+        self.assertEqual(nCalls, 1)
+
+        # With no new exposures the extraction is not run at all.
+        even, _ = self._run(exposures[:8])
+        repeated, nCalls = self._run(exposures[:8], priors=even)
+        self.assertEqual(repeated, even)
+        self.assertEqual(nCalls, 0)
+
+        # An unpaired exposure is extracted again.
+        repeated, nCalls = self._run(exposures, priors=full)
+        self.assertEqual(repeated, full)
+        self.assertEqual(nCalls, 1)
+
+    @staticmethod
+    def _makeFlats(exposures):
+        """Construct a flat pair for every two exposures, with the signal
+        increasing with the exposure time.
+        """
+        rng = np.random.default_rng(1357)
+        detector = DetectorWrapper(bbox=geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(150, 150)),
+                                   numAmps=1).detector
+        flats = {}
+        for exposure in exposures:
+            expTime = float((exposure + 1)//2)
+            flat = afwImage.ExposureF(detector.getBBox())
+            flat.setDetector(detector)
+            flat.getInfo().setVisitInfo(afwImage.VisitInfo(exposureTime=expTime, darkTime=expTime))
+            signal = 1000.0*expTime
+            flat.image.array[:, :] = rng.normal(signal, np.sqrt(signal + 25.0), flat.image.array.shape)
+            flats[exposure] = flat
+        return flats
+
+    def _runExtract(self, flats, exposures, priors=None):
+        config = CptExtractPtcTaskConfig()
+        config.doIncremental = priors is not None
+        config.matchExposuresType = "EXPID"
+        config.maximumRangeCovariancesAstier = 3
+        config.minNumberGoodPixelsForCovariance = 1000
+        task = CptExtractPtcTask(config=config)
+
+        inputRefs, outputRefs = self._makeRefs(exposures, priors, withMetadata=True)
+        butlerQC = _QuantumContext(priors, flats)
+        task.runQuantum(butlerQC, inputRefs, outputRefs)
+        return butlerQC.outputs
+
+    def test_incremental_extract(self):
+        exposures = list(range(1, 10))
+        flats = self._makeFlats(exposures)
+        full = self._runExtract(flats, exposures)
+        prior = self._runExtract(flats, exposures[:5])
+        incremental = self._runExtract(flats, exposures, priors=prior)
+
+        self.assertEqual(set(incremental), set(full))
+        for exposure, dataset in full.items():
+            merged = incremental[exposure]
+            self.assertEqual(merged.ptcFitType, dataset.ptcFitType)
+            for ampName in dataset.ampNames:
+                np.testing.assert_array_equal(merged.inputExpIdPairs[ampName],
+                                              dataset.inputExpIdPairs[ampName])
+                for attribute in ("rawExpTimes", "rawMeans", "rawVars", "covariances"):
+                    np.testing.assert_array_equal(getattr(merged, attribute)[ampName],
+                                                  getattr(dataset, attribute)[ampName],
+                                                  err_msg=f"{exposure} {attribute} {ampName}")
+
+        # The merged partial datasets give the same PTC as a full run.
+        solveConfig = CptSolvePtcTaskConfig()
+        solveConfig.ptcFitType = "EXPAPPROXIMATION"
+        solveTask = CptSolvePtcTask(config=solveConfig)
+        fullPtc = solveTask.run([full[exposure] for exposure in exposures]).outputPtcDataset
+        mergedPtc = solveTask.run([incremental[exposure] for exposure in exposures]).outputPtcDataset
+        for ampName in fullPtc.ampNames:
+            np.testing.assert_array_equal(mergedPtc.gain[ampName], fullPtc.gain[ampName])
+            np.testing.assert_array_equal(mergedPtc.finalMeans[ampName], fullPtc.finalMeans[ampName])
+
+
+class CptSolvePtcTestCase(lsst.utils.tests.TestCase):
+    """Test the parallel PTC fit."""
+
+    def _makeDataset(self):
+        rng = np.random.default_rng(2468)
+        ampNames = ["C00", "C01", "C02", "C03"]
+        dataset = PhotonTransferCurveDataset(ampNames, "EXPAPPROXIMATION", covMatrixSide=1)
+        expTimes = np.geomspace(0.1, 100.0, 30)
+        for i, ampName in enumerate(ampNames):
+            gain = 1.2 + 0.1*i
+            means = 800.0*expTimes
+            variances = means/gain + 25.0 + 1e-6*means**2
+            variances *= 1.0 + rng.normal(0.0, 0.01, len(means))
+            dataset.inputExpIdPairs[ampName] = [(2*j, 2*j + 1) for j in range(len(expTimes))]
+            dataset.rawExpTimes[ampName] = expTimes.copy()
+            dataset.rawMeans[ampName] = means
+            dataset.rawVars[ampName] = variances
+            dataset.expIdMask[ampName] = np.ones(len(expTimes), dtype=bool)
+            dataset.covariances[ampName] = variances[:, np.newaxis, np.newaxis]
+            dataset.covariancesSqrtWeights[ampName] = np.ones((len(expTimes), 1, 1))
+        return dataset
+
+    def _fit(self, nWorkers, workerType="PROCESS"):
+        config = CptSolvePtcTaskConfig()
+        config.ptcFitType = "EXPAPPROXIMATION"
+        config.nWorkers = nWorkers
+        config.workerType = workerType
+        return CptSolvePtcTask(config=config).fitPtc(self._makeDataset())
+
+    def test_parallel(self):
+        serial = self._fit(1)
+        for workerType in ("PROCESS", "THREAD"):
+            parallel = self._fit(2, workerType=workerType)
+            self.assertEqual(parallel.badAmps, serial.badAmps)
+            for ampName in serial.ampNames:
+                # Every per-amplifier attribute of the serial fit is
+                # carried through the parallel fit.
+                attributes = _ampAttributes(serial, ampName)
+                self.assertEqual(set(_ampAttributes(parallel, ampName)), set(attributes))
+                for attribute in ("gain", "noise", "ptcFitPars", "finalVars", "finalMeans"):
+                    self.assertIn(attribute, attributes)
+                for attribute in attributes:
+                    np.testing.assert_array_equal(getattr(parallel, attribute)[ampName],
+                                                  getattr(serial, attribute)[ampName],
+                                                  err_msg=f"{workerType} {attribute} {ampName}")
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for cp_testing exposure summaries."""
+
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+import lsst.cp.pipe as cpPipe
+import lsst.utils.tests
+from lsst.ip.isr import PhotodiodeCalib
+
+from lsst.cp.testing import CptExposureSummaryConfig, CptExposureSummaryTask
+from lsst.cp.testing.cp import _setPhotoCharges
+from lsst.cp.testing.summary import CptExposureSummaryConnections
+
+
+class ExposureSummaryTestCase(lsst.utils.tests.TestCase):
+    """Test the exposure summary table."""
+
+    def _makeRecord(self, observationType, exposureTime, seqNum):
+        return SimpleNamespace(
+            observation_type=observationType,
+            observation_reason=observationType,
+            physical_filter="r",
+            exposure_time=exposureTime,
+            dark_time=exposureTime + 0.1,
+            day_obs=20240101,
+            seq_num=seqNum,
+            group=f"group{seqNum//2}",
+        )
+
+    def test_summary(self):
+        records = {
+            3: self._makeRecord("flat", 2.0, 3),
+            1: self._makeRecord("bias", 0.0, 1),
+            2: self._makeRecord("flat", 2.0, 2),
+        }
+        task = CptExposureSummaryTask()
+        summary = task.run(records, {2: 100.0, 3: 101.0}).outputSummary
+
+        self.assertEqual(len(summary), 3)
+        self.assertEqual(list(summary["exposure"]), [1, 2, 3])
+        self.assertEqual(list(summary["observation_type"]), ["bias", "flat", "flat"])
+        self.assertTrue(np.isnan(summary["photodiode_charge"][0]))
+        self.assertEqual(summary["photodiode_charge"][2], 101.0)
+        self.assertEqual(summary["group"][2], "group1")
+
+        summary = task.run({}).outputSummary
+        self.assertEqual(len(summary), 0)
+
+    def test_integrate_photodiode(self):
+        timeSamples = np.linspace(0.0, 10.0, 101)
+        currentSamples = np.where((timeSamples > 1.0) & (timeSamples < 9.0), -2e-9, -1e-11)
+
+        extractConfig = cpPipe.PhotonTransferCurveExtractConfig()
+        extractConfig.photodiodeIntegrationMethod = "CHARGE_SUM"
+        extractConfig.photodiodeCurrentScale = -2.0
+        config = CptExposureSummaryConfig()
+        config.photodiodeIntegrationMethod = extractConfig.photodiodeIntegrationMethod
+        config.photodiodeCurrentScale = extractConfig.photodiodeCurrentScale
+        task = CptExposureSummaryTask(config=config)
+        charge = task.integratePhotodiode(PhotodiodeCalib(timeSamples=timeSamples,
+                                                          currentSamples=currentSamples))
+
+        # This is how the PTC extraction integrates the photodiode data.
+        expected = PhotodiodeCalib(timeSamples=timeSamples, currentSamples=currentSamples)
+        expected.integrationMethod = extractConfig.photodiodeIntegrationMethod
+        expected.currentScale = extractConfig.photodiodeCurrentScale
+        self.assertFloatsAlmostEqual(charge, expected.integrate(), rtol=1e-12)
+
+        # The default integration gives a different charge.
+        default = PhotodiodeCalib(timeSamples=timeSamples, currentSamples=currentSamples)
+        self.assertGreater(abs(charge - default.integrate()), 0.1*abs(charge))
+
+    def test_adjust_quantum(self):
+        connections = CptExposureSummaryConnections(config=CptExposureSummaryConfig())
+        refs = [SimpleNamespace(dataId={"exposure": exposure, "detector": detector})
+                for exposure in (1, 2) for detector in (5, 3, 4)]
+        adjusted, _ = connections.adjustQuantum(
+            {"inputExposures": (connections.inputExposures, refs)}, {}, "cptExposureSummary", {}
+        )
+
+        _, adjustedRefs = adjusted["inputExposures"]
+        self.assertEqual([(ref.dataId["exposure"], ref.dataId["detector"]) for ref in adjustedRefs],
+                         [(1, 3), (2, 3)])
+
+    def test_photo_charges(self):
+        partial = SimpleNamespace(
+            ptcFitType="PARTIAL",
+            inputExpIdPairs={"C00": [(1, 2)], "C01": [[(1, 2)]]},
+            photoCharges={"C00": [np.nan], "C01": [np.nan]},
+        )
+        _setPhotoCharges(partial, {1: 100.0, 2: 102.0})
+        self.assertEqual(list(partial.photoCharges["C00"]), [101.0])
+        self.assertEqual(list(partial.photoCharges["C01"]), [101.0])
+
+        _setPhotoCharges(partial, {1: 100.0})
+        self.assertEqual(list(partial.photoCharges["C00"]), [100.0])
+        _setPhotoCharges(partial, {})
+        self.assertTrue(np.isnan(partial.photoCharges["C00"][0]))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()